@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Solver backends of the QIP: the docplex model is built once and solved either with CPLEX (default docplex engine)
+or with the open-source OR-Tools CP-SAT solver, plugged into docplex as a custom engine.
+
+@author: jakob
+"""
+
+
+# Libs
+import os
+import time
+import docplex.mp.model as cpx
+from docplex.mp.engine import IndexerEngine
+from docplex.mp.constants import ComparisonType
+from docplex.mp.constr import LinearConstraint
+from docplex.mp.progress import ProgressData
+from docplex.mp.sdetails import SolveDetails
+from docplex.mp.solution import SolveSolution
+from docplex.util.status import JobSolveStatus
+try:
+    from ortools.sat.python import cp_model # optional: pip install ortools==9.7
+except ImportError:
+    cp_model = None
+
+BACKENDS = ['cplex', 'cpsat']
+
+# CPLEX status codes (and strings) reported in the solve details of a CP-SAT solve
+CPSAT_STATUS = {'optimal': (101, 'integer optimal solution'),
+                'infeasible': (103, 'integer infeasible'),
+                'time_limit_feasible': (107, 'time limit exceeded'),
+                'time_limit_infeasible': (108, 'time limit exceeded, no integer solution'),
+                'aborted_feasible': (113, 'aborted'),
+                'aborted_infeasible': (114, 'aborted, no integer solution')}
+
+
+# %%
+def create_model(name,
+                 backend='cplex'):
+    # docplex model which is solved with the given backend
+    if backend == 'cplex':
+        return cpx.Model(name=name)
+    if backend == 'cpsat':
+        if cp_model is None:
+            raise ImportError('Backend cpsat requires OR-Tools, install it with: pip install ortools==9.7')
+        return cpx.Model(name=name, agent=CPSATEngine)
+    raise ValueError(f'Backend:{backend} is not one of {BACKENDS}!')
+
+
+class CPSATSolutionCallback(cp_model.CpSolverSolutionCallback if cp_model is not None else object):
+
+    '''
+    This implements the class CPSATSolutionCallback.
+    Each new incumbent of CP-SAT is passed as ProgressData to the progress listeners of the docplex model and as
+    SolveSolution to its solution listeners.
+    '''
+
+    def __init__(self, engine, variables, objective_offset):
+        super().__init__()
+        self.engine = engine
+        self.variables = variables
+        self.objective_offset = objective_offset
+        self.n_solutions = 0
+
+    def make_solution(self, objective):
+        # incumbent as docplex solution, e.g., for solution listeners
+        var_value_map = {var: self.Value(cp_var) for var, cp_var in self.variables.items()}
+        return SolveSolution(self.engine._model, var_value_map=var_value_map, obj=objective, solved_by=self.engine.name)
+
+    def on_solution_callback(self):
+        if self.engine.aborted:
+            self.StopSearch()
+            return
+        self.n_solutions += 1
+        objective = self.ObjectiveValue() + self.objective_offset
+        bound = self.BestObjectiveBound() + self.objective_offset
+        progress_data = ProgressData(id=self.n_solutions,
+                                     has_incumbent=True,
+                                     current_objective=objective,
+                                     best_bound=bound,
+                                     mip_gap=abs(bound - objective)/(1e-10 + abs(objective)),
+                                     current_nb_iterations=self.NumConflicts(),
+                                     current_nb_nodes=self.NumBranches(),
+                                     remaining_nb_nodes=0,
+                                     time=self.WallTime(),
+                                     det_time=self.DeterministicTime())
+        for listener in self.engine.listeners:
+            if listener.accept(progress_data):
+                listener._set_current_progress_data(progress_data)
+                listener.notify_progress(progress_data)
+                if listener.requires_solution():
+                    listener.notify_solution(self.make_solution(objective))
+        if self.engine.aborted:
+            self.StopSearch()
+
+
+class CPSATEngine(IndexerEngine):
+
+    '''
+    This implements the class CPSATEngine.
+    This class is a docplex engine which translates the (pure binary/integer) docplex model to a CP-SAT model at
+    each solve: binary products in the objective are linearized, the time limit, number of threads and relative
+    MIP gap are taken from the docplex parameters, the last MIP start is passed as hint and each new incumbent
+    is reported to the progress listeners (which may abort the solve).
+    '''
+
+    def __init__(self, mdl, **kwargs):
+        IndexerEngine.__init__(self)
+        self._model = mdl
+        self.listeners = []
+        self.aborted = False
+        self.solve_status = JobSolveStatus.UNKNOWN
+        self.solve_details = None
+
+    @property
+    def name(self):
+        return 'cpsat'
+
+    def connect_progress_listeners(self, model, listeners, qlisteners):
+        # listeners call .abort() of their connected callback, i.e., of this engine
+        self.listeners = list(listeners)
+        for listener in self.listeners:
+            listener._connect_cb(self)
+
+    def abort(self):
+        self.aborted = True
+
+    def get_solve_status(self):
+        return self.solve_status
+
+    def get_solve_details(self):
+        return self.solve_details
+
+    def supports_logical_constraints(self):
+        return False, 'CP-SAT engine supports only linear constraints and products of binary variables in the objective'
+
+    @staticmethod
+    def _integral(coef, what):
+        if float(coef) != int(coef):
+            raise ValueError(f'CP-SAT backend requires integer coefficients, {what} has coefficient {coef}')
+        return int(coef)
+
+    def _translate(self, mdl):
+        # variables, linear constraints and objective of the docplex model as CP-SAT model
+        model = cp_model.CpModel()
+        variables = {}
+        for var in mdl.iter_variables():
+            lb, ub = var.lb, var.ub
+            if not var.is_discrete() and (lb != int(lb) or ub != int(ub)):
+                raise ValueError(f'CP-SAT backend requires integer variables, {var} is continuous with bounds [{lb},{ub}]')
+            if var.is_binary() or (lb == 0 and ub == 1):
+                variables[var] = model.NewBoolVar('')
+            else:
+                variables[var] = model.NewIntVar(int(lb), int(ub), '')
+
+        for ct in mdl.iter_constraints():
+            if not isinstance(ct, LinearConstraint):
+                raise ValueError(f'CP-SAT backend supports only linear constraints, not {ct}')
+            left, right = ct.left_expr, ct.right_expr
+            terms = [(variables[var], self._integral(coef, ct)) for var, coef in left.iter_terms()]
+            terms += [(variables[var], -self._integral(coef, ct)) for var, coef in right.iter_terms()]
+            expr = cp_model.LinearExpr.WeightedSum([v for v, _ in terms], [c for _, c in terms])
+            rhs = self._integral(right.get_constant() - left.get_constant(), ct)
+            if ct.sense == ComparisonType.LE:
+                model.Add(expr <= rhs)
+            elif ct.sense == ComparisonType.GE:
+                model.Add(expr >= rhs)
+            else:
+                model.Add(expr == rhs)
+
+        # objective: a product v1*v2 of binaries is replaced by w with w<=v1, w<=v2 if it is rewarded and by
+        # w>=v1+v2-1 if it is penalized, i.e., w takes the value v1*v2 in every optimal solution
+        objective = mdl.objective_expr
+        maximize = mdl.is_maximized()
+        linear = objective.linear_part if objective.is_quad_expr() else objective
+        objective_vars = [variables[var] for var, _ in linear.iter_terms()]
+        objective_coefs = [coef for _, coef in linear.iter_terms()]
+        self.products = []
+        if objective.is_quad_expr():
+            for pair, coef in objective.iter_quads():
+                v1, v2 = pair.first, pair.second
+                if not (v1.is_binary() and v2.is_binary()):
+                    raise ValueError(f'CP-SAT backend supports only products of binary variables, not {v1}*{v2}')
+                if v1 is v2:
+                    objective_vars.append(variables[v1])
+                else:
+                    w = model.NewBoolVar('')
+                    if (coef > 0) == maximize:
+                        model.AddImplication(w, variables[v1])
+                        model.AddImplication(w, variables[v2])
+                    else:
+                        model.AddBoolOr([w, variables[v1].Not(), variables[v2].Not()])
+                    self.products.append((w, v1, v2))
+                    objective_vars.append(w)
+                objective_coefs.append(coef)
+        if all(float(coef) == int(coef) for coef in objective_coefs):
+            objective_coefs = [int(coef) for coef in objective_coefs]
+        expr = cp_model.LinearExpr.WeightedSum(objective_vars, objective_coefs)
+        if maximize:
+            model.Maximize(expr)
+        else:
+            model.Minimize(expr)
+
+        # hint: the last MIP start, variables which are not in the MIP start are 0
+        mip_starts = list(mdl.iter_mip_starts())
+        if mip_starts:
+            values = dict(mip_starts[-1][0].iter_var_values())
+            for var, cp_var in variables.items():
+                model.AddHint(cp_var, int(round(values.get(var, 0))))
+            for w, v1, v2 in self.products:
+                model.AddHint(w, int(round(values.get(v1, 0)*values.get(v2, 0))))
+
+        return model, variables, objective.constant
+
+    def solve(self, mdl, parameters, **kwargs):
+        start = time.perf_counter()
+        self.aborted = False
+        model, variables, objective_offset = self._translate(mdl)
+
+        solver = cp_model.CpSolver()
+        if parameters is not None:
+            time_limit = parameters.timelimit.get()
+            if time_limit < 1e75: # CPLEX default: no limit
+                solver.parameters.max_time_in_seconds = time_limit
+            # 0 (CPLEX default): automatic, at least 8 workers since CP-SAT proves optimality with its portfolio of workers
+            solver.parameters.num_workers = parameters.threads.get() or max(8, os.cpu_count())
+            solver.parameters.relative_gap_limit = parameters.mip.tolerances.mipgap.get()
+            solver.parameters.random_seed = parameters.randomseed.get()
+        solver.parameters.log_search_progress = mdl.context.solver.log_output_as_stream is not None
+        callback = CPSATSolutionCallback(self, variables, objective_offset)
+        status = solver.Solve(model, callback)
+        solve_time = time.perf_counter() - start
+
+        feasible = status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+        if status == cp_model.OPTIMAL:
+            key = 'optimal'
+        elif status == cp_model.INFEASIBLE:
+            key = 'infeasible'
+        elif status in [cp_model.FEASIBLE, cp_model.UNKNOWN]:
+            key = ('aborted' if self.aborted else 'time_limit') + ('_feasible' if feasible else '_infeasible')
+        else:
+            raise RuntimeError(f'CP-SAT could not solve the model: {solver.StatusName(status)}')
+
+        objective = solver.ObjectiveValue() + objective_offset if feasible else None
+        bound = solver.BestObjectiveBound() + objective_offset
+        status_code, status_string = CPSAT_STATUS[key]
+        self.solve_details = SolveDetails(time=solve_time,
+                                          dettime=solver.ResponseProto().deterministic_time,
+                                          status_code=status_code,
+                                          status_string=status_string,
+                                          problem_type='MIQP' if mdl.objective_expr.is_quad_expr() else 'MILP',
+                                          ncolumns=len(variables),
+                                          miprelgap=abs(bound - objective)/(1e-10 + abs(objective)) if feasible else None,
+                                          best_bound=bound,
+                                          n_iterations=solver.NumConflicts(),
+                                          n_nodes_processed=solver.NumBranches())
+        if not feasible:
+            self.solve_status = JobSolveStatus.INFEASIBLE_SOLUTION if key == 'infeasible' else JobSolveStatus.UNKNOWN
+            return None
+        self.solve_status = JobSolveStatus.OPTIMAL_SOLUTION if key == 'optimal' else JobSolveStatus.FEASIBLE_SOLUTION
+        var_value_map = {var: solver.Value(cp_var) for var, cp_var in variables.items() if solver.Value(cp_var)}
+        return SolveSolution.make_engine_solution(model=mdl,
+                                                  var_value_map=var_value_map,
+                                                  obj=objective,
+                                                  blended_obj_by_priority=[objective],
+                                                  solved_by=self.name,
+                                                  solve_details=self.solve_details,
+                                                  job_solve_status=self.solve_status)
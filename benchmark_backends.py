@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Side-by-side benchmark of the solver backends (CPLEX and OR-Tools CP-SAT) on the same instance and QIP parameters.
+
+@author: jakob
+"""
+
+import pickle as pkl
+import os
+import time
+from datetime import datetime
+import pandas as pd
+
+# own modules
+from qip import QIP
+
+# %% Path
+save_data_path = os.path.join(os.getcwd(),'data_prepared')
+
+# %%  Set Input Parameters
+
+track_session_capacity = 4
+paper_distribution = 'exact' # 'exact' or 'upper_bound'
+bidder_cost = 5
+topic_cost = 25
+topic_utility = 100
+sparse_model = False # if True, only variables which can be nonzero are created
+formulation = 'quadratic' # 'quadratic' or 'linear'
+# (backend, threads), threads None: solver default
+runs = [('cplex', None), ('cpsat', None), ('cplex', 1), ('cpsat', 1)]
+
+# QIP parameters
+QIP_parameters = {'log_output': False,
+                  'time_limit': 60, # in seconds
+                  'mip_relative_gap': 0.01,
+                  'integrality_tol': None,
+                  'feasibility_tol': None,
+                  'mip_start': 'greedy', # None or 'greedy'
+                  }
+# %% Load Data Input
+
+data = {}
+for name in ['U','M','T','Q','session_ids','track_ids','paper_ids','bidder_ids','author_ids','topic_ids']:
+    with open(os.path.join(save_data_path,name+'.pkl'), 'rb') as f:
+        data[name] = pkl.load(f)
+
+# %% Benchmark
+
+results = []
+for backend, threads in runs:
+
+    QIP_instance = QIP(session_ids=data['session_ids'],
+                       track_ids=data['track_ids'],
+                       paper_ids=data['paper_ids'],
+                       bidder_ids=data['bidder_ids'],
+                       author_ids=data['author_ids'],
+                       topic_ids=data['topic_ids'],
+                       track_session_capacity=track_session_capacity,
+                       paper_distribution=paper_distribution,
+                       U=data['U'],
+                       M=data['M'],
+                       T=data['T'],
+                       Q=data['Q'],
+                       bidder_cost = bidder_cost,
+                       topic_cost = topic_cost,
+                       topic_utility = topic_utility,
+                       QIP_parameters = dict(QIP_parameters, threads=threads),
+                       save_results=False,
+                       sparse_model=sparse_model,
+                       formulation=formulation,
+                       backend=backend)
+
+    start = time.perf_counter()
+    QIP_instance.build()
+    build_time = time.perf_counter() - start
+
+    QIP_instance.solve()
+    details = QIP_instance.QIP.get_solve_details()
+    incumbents = [point[0] for point in QIP_instance.profiler.trajectory if point[1] is not None]
+
+    results.append({'Backend': backend,
+                    'Threads': threads if threads is not None else 'default',
+                    'Variables': QIP_instance.QIP.number_of_variables,
+                    'Constraints': QIP_instance.QIP.number_of_constraints,
+                    'Build_Time': build_time,
+                    'Solve_Time': details.time,
+                    'Time_To_First_Incumbent': incumbents[0] if incumbents else None,
+                    'Status': details.status,
+                    'Relative_Gap': details.mip_relative_gap,
+                    'Best_Bound': details.best_bound,
+                    'Objective_Value': QIP_instance.QIP.objective_value if QIP_instance.QIP.solution else None,
+                    'Attendance': sum(QIP_instance.attendance.values()),
+                    })
+
+df = pd.DataFrame(results).set_index(['Backend','Threads'])
+print(df.to_string())
+df.to_csv(os.path.join(os.getcwd(),'benchmark_backends_'+datetime.now().strftime("%d_%m_%Y_%H-%M-%S")+'.csv'))
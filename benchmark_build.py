@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the QIP build time (with and without variable and constraint names) on synthetic instances of increasing size.
+
+@author: jakob
+"""
+
+import os
+import time
+from datetime import datetime
+import pandas as pd
+
+# own modules
+from qip import QIP
+from create_random_instance import synthetic_instance
+
+# %%  Set Input Parameters
+
+track_session_capacity = 4
+paper_distribution = 'exact' # 'exact' or 'upper_bound'
+bidder_cost = 5
+topic_cost = 25
+topic_utility = 100
+formulations = ['quadratic', 'linear']
+model_names = [False, True]
+# (sessions, tracks, bidders, authors), papers = sessions*tracks*track_session_capacity
+sizes = [(4, 3, 200, 100),
+         (8, 4, 800, 300),
+         (12, 5, 2000, 600)]
+
+# QIP parameters (not used, the QIPs are only built)
+QIP_parameters = {'log_output': False,
+                  'time_limit': 60, # in seconds
+                  'mip_relative_gap': 0.01,
+                  'integrality_tol': None,
+                  'feasibility_tol': None,
+                  }
+
+# %% Benchmark
+
+results = []
+for n_sessions, n_tracks, n_bidders, n_authors in sizes:
+    data = synthetic_instance(n_sessions=n_sessions, n_tracks=n_tracks, track_session_capacity=track_session_capacity,
+                              n_bidders=n_bidders, n_authors=n_authors)
+    for formulation in formulations:
+        for names in model_names:
+
+            QIP_instance = QIP(session_ids=data['session_ids'],
+                               track_ids=data['track_ids'],
+                               paper_ids=data['paper_ids'],
+                               bidder_ids=data['bidder_ids'],
+                               author_ids=data['author_ids'],
+                               topic_ids=data['topic_ids'],
+                               track_session_capacity=track_session_capacity,
+                               paper_distribution=paper_distribution,
+                               U=data['U'],
+                               M=data['M'],
+                               T=data['T'],
+                               Q=data['Q'],
+                               bidder_cost = bidder_cost,
+                               topic_cost = topic_cost,
+                               topic_utility = topic_utility,
+                               QIP_parameters = QIP_parameters,
+                               save_results=False,
+                               formulation=formulation,
+                               model_names=names)
+
+            start = time.perf_counter()
+            QIP_instance.build()
+            build_time = time.perf_counter() - start
+
+            results.append({'Papers': len(data['paper_ids']),
+                            'Bidders': n_bidders,
+                            'Formulation': formulation,
+                            'Model_Names': names,
+                            'Variables': QIP_instance.QIP.number_of_variables,
+                            'Constraints': QIP_instance.QIP.number_of_constraints,
+                            'Build_Time': build_time,
+                            })
+            QIP_instance.QIP.end()
+
+df = pd.DataFrame(results).set_index(['Papers','Formulation','Model_Names'])
+print(df.to_string())
+df.to_csv(os.path.join(os.getcwd(),'benchmark_build_'+datetime.now().strftime("%d_%m_%Y_%H-%M-%S")+'.csv'))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Side-by-side benchmark of the quadratic (QIP) and the linearized (MILP) formulation on the same instance.
+
+@author: jakob
+"""
+
+import pickle as pkl
+import os
+import time
+from datetime import datetime
+import pandas as pd
+
+# own modules
+from qip import QIP
+
+# %% Path
+save_data_path = os.path.join(os.getcwd(),'data_prepared')
+
+# %%  Set Input Parameters
+
+track_session_capacity = 4
+paper_distribution = 'exact' # 'exact' or 'upper_bound'
+bidder_cost = 5
+topic_cost = 25
+topic_utility = 100
+sparse_model = False # if True, only variables which can be nonzero are created
+formulations = ['quadratic', 'linear']
+
+# QIP parameters
+QIP_parameters = {'log_output': False,
+                  'time_limit': 60, # in seconds
+                  'mip_relative_gap': 0.01,
+                  'integrality_tol': None,
+                  'feasibility_tol': None,
+                  }
+# %% Load Data Input
+
+data = {}
+for name in ['U','M','T','Q','session_ids','track_ids','paper_ids','bidder_ids','author_ids','topic_ids']:
+    with open(os.path.join(save_data_path,name+'.pkl'), 'rb') as f:
+        data[name] = pkl.load(f)
+
+# %% Benchmark
+
+results = []
+for formulation in formulations:
+
+    QIP_instance = QIP(session_ids=data['session_ids'],
+                       track_ids=data['track_ids'],
+                       paper_ids=data['paper_ids'],
+                       bidder_ids=data['bidder_ids'],
+                       author_ids=data['author_ids'],
+                       topic_ids=data['topic_ids'],
+                       track_session_capacity=track_session_capacity,
+                       paper_distribution=paper_distribution,
+                       U=data['U'],
+                       M=data['M'],
+                       T=data['T'],
+                       Q=data['Q'],
+                       bidder_cost = bidder_cost,
+                       topic_cost = topic_cost,
+                       topic_utility = topic_utility,
+                       QIP_parameters = QIP_parameters,
+                       save_results=False,
+                       sparse_model=sparse_model,
+                       formulation=formulation)
+
+    start = time.perf_counter()
+    QIP_instance.build()
+    build_time = time.perf_counter() - start
+
+    QIP_instance.solve()
+    details = QIP_instance.QIP.get_solve_details()
+
+    results.append({'Formulation': formulation,
+                    'Variables': QIP_instance.QIP.number_of_variables,
+                    'Constraints': QIP_instance.QIP.number_of_constraints,
+                    'Build_Time': build_time,
+                    'Solve_Time': details.time,
+                    'Status': details.status,
+                    'Relative_Gap': details.mip_relative_gap,
+                    'Objective_Value': QIP_instance.QIP.objective_value if QIP_instance.QIP.solution else None,
+                    'Attendance': sum(QIP_instance.attendance.values()),
+                    })
+
+df = pd.DataFrame(results).set_index('Formulation')
+print(df.to_string())
+df.to_csv(os.path.join(os.getcwd(),'benchmark_formulations_'+datetime.now().strftime("%d_%m_%Y_%H-%M-%S")+'.csv'))
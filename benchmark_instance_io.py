@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of load time and memory of the 13 pickle files vs. the single-file .npz bundle on synthetic instances of increasing size.
+
+@author: jakob
+"""
+
+import pickle as pkl
+import os
+import time
+import shutil
+import tempfile
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+
+# own modules
+from create_random_instance import synthetic_instance
+from instance_io import save_instance, load_instance, load_arrays
+
+# %%  Set Input Parameters
+
+track_session_capacity = 4
+# (sessions, tracks, bidders, authors), papers = sessions*tracks*track_session_capacity
+sizes = [(4, 3, 200, 100),
+         (12, 5, 2000, 600),
+         (30, 8, 20000, 3000),
+         (60, 10, 100000, 12000)]
+repetitions = 3
+
+# %% Loaders
+
+names = ['U','M','T','Q','session_ids','track_ids','paper_ids','bidder_ids','author_ids','topic_ids',
+         'paper_title_dict','paper_author_dict','paper_topic_dict']
+
+def load_pickles(path):
+    data = {}
+    for name in names:
+        with open(os.path.join(path,name+'.pkl'), 'rb') as f:
+            data[name] = pkl.load(f)
+    return data
+
+loaders = {'pickle': lambda path: load_pickles(path),
+           'npz': lambda path: load_instance(os.path.join(path,'instance.npz')),
+           'npz_mmap': lambda path: load_instance(os.path.join(path,'instance.npz'), mmap=True),
+           # only the (memory-mapped) arrays, i.e., without building the dicts with tuple keys
+           'npz_arrays_mmap': lambda path: load_arrays(os.path.join(path,'instance.npz'), mmap=True)}
+
+# %% Benchmark
+
+results = []
+folder = tempfile.mkdtemp()
+for n_sessions, n_tracks, n_bidders, n_authors in sizes:
+    data = synthetic_instance(n_sessions=n_sessions, n_tracks=n_tracks, track_session_capacity=track_session_capacity,
+                              n_bidders=n_bidders, n_authors=n_authors)
+    for name in names:
+        with open(os.path.join(folder,name+'.pkl'), 'wb') as f:
+            pkl.dump(data[name], f)
+    save_instance(os.path.join(folder,'instance.npz'), **{name: data[name] for name in names})
+    pickle_size = sum(os.path.getsize(os.path.join(folder,name+'.pkl')) for name in names)
+    bundle_size = os.path.getsize(os.path.join(folder,'instance.npz'))
+
+    for loader, load in loaders.items():
+        # load time (best of repetitions) and peak of the Python heap during a separate load
+        load_times = []
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            load(folder)
+            load_times.append(time.perf_counter() - start)
+        load_time = min(load_times)
+        tracemalloc.start()
+        loaded = load(folder)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if loader != 'npz_arrays_mmap':
+            assert loaded['U'] == data['U'] and loaded['M'] == data['M'] and loaded['T'] == data['T'] and loaded['Q'] == data['Q']
+        del loaded
+
+        results.append({'Papers': len(data['paper_ids']),
+                        'Bids': len(data['U']),
+                        'Loader': loader,
+                        'File_Size_MB': (pickle_size if loader == 'pickle' else bundle_size)/2**20,
+                        'Load_Time': load_time,
+                        'Peak_Memory_MB': peak_memory/2**20,
+                        })
+shutil.rmtree(folder)
+
+df = pd.DataFrame(results).set_index(['Papers','Loader'])
+print(df.to_string())
+df.to_csv(os.path.join(os.getcwd(),'benchmark_instance_io_'+datetime.now().strftime("%d_%m_%Y_%H-%M-%S")+'.csv'))
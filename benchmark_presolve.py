@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the presolve (bidders and topics merged into weighted classes) on the same instance: model size, build
+and solve time and the objective of the schedule with the original bidders and topics, without presolve, with exact
+presolve and with presolve after quantizing U.
+
+@author: jakob
+"""
+
+import os
+import time
+from datetime import datetime
+import pandas as pd
+
+# own modules
+from qip import QIP
+from instance_io import load_instance, load_pickles
+
+# %% Path
+save_data_path = os.path.join(os.getcwd(),'data_prepared')
+
+# %%  Set Input Parameters
+
+track_session_capacity = 4
+paper_distribution = 'exact' # 'exact' or 'upper_bound'
+bidder_cost = 5
+topic_cost = 25
+topic_utility = 100
+formulation = 'quadratic' # 'quadratic' or 'linear'
+backend = 'cplex' # 'cplex' or 'cpsat'
+# (presolve, bid_quantization)
+runs = [(False, None), (True, None), (True, 10), (True, 25)]
+
+# QIP parameters
+QIP_parameters = {'log_output': False,
+                  'time_limit': 60, # in seconds
+                  'mip_relative_gap': 0.01,
+                  'integrality_tol': None,
+                  'feasibility_tol': None,
+                  'mip_start': 'greedy', # None or 'greedy'
+                  }
+# %% Load Data Input
+
+if os.path.exists(os.path.join(save_data_path,'instance.npz')):
+    data = load_instance(os.path.join(save_data_path,'instance.npz'))
+else:
+    data = load_pickles(save_data_path)
+
+# %% Benchmark
+
+results = []
+for presolve, bid_quantization in runs:
+
+    QIP_instance = QIP(session_ids=data['session_ids'],
+                       track_ids=data['track_ids'],
+                       paper_ids=data['paper_ids'],
+                       bidder_ids=data['bidder_ids'],
+                       author_ids=data['author_ids'],
+                       topic_ids=data['topic_ids'],
+                       track_session_capacity=track_session_capacity,
+                       paper_distribution=paper_distribution,
+                       U=data['U'],
+                       M=data['M'],
+                       T=data['T'],
+                       Q=data['Q'],
+                       bidder_cost = bidder_cost,
+                       topic_cost = topic_cost,
+                       topic_utility = topic_utility,
+                       QIP_parameters = QIP_parameters,
+                       save_results=False,
+                       formulation=formulation,
+                       backend=backend,
+                       presolve=presolve,
+                       bid_quantization=bid_quantization)
+
+    start = time.perf_counter()
+    QIP_instance.build()
+    build_time = time.perf_counter() - start
+
+    QIP_instance.solve()
+    details = QIP_instance.QIP.get_solve_details()
+
+    results.append({'Presolve': presolve,
+                    'Bid_Quantization': bid_quantization,
+                    'Bidders': len(QIP_instance.bidder_ids),
+                    'Topics': len(QIP_instance.topic_ids),
+                    'Variables': QIP_instance.QIP.number_of_variables,
+                    'Constraints': QIP_instance.QIP.number_of_constraints,
+                    'Build_Time': build_time,
+                    'Solve_Time': details.time,
+                    'Status': details.status,
+                    'Relative_Gap': details.mip_relative_gap,
+                    'Model_Objective_Value': QIP_instance.QIP.objective_value if QIP_instance.QIP.solution else None,
+                    # objective of the schedule with the original bidders and topics
+                    'Objective_Value': QIP_instance.score()['Objective_Value'] if QIP_instance.allocation else None,
+                    'Attendance': sum(QIP_instance.attendance.values()),
+                    })
+
+df = pd.DataFrame(results)
+print(df.to_string())
+df.to_csv(os.path.join(os.getcwd(),'benchmark_presolve_'+datetime.now().strftime("%d_%m_%Y_%H-%M-%S")+'.csv'))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite: build and solve the QIP on a ladder of instances (toy -> 100 -> 500 -> 2000 papers) under fixed
+QIP parameters and compare build time, solve time, time to first incumbent, final gap, model size and peak memory
+against a stored baseline.
+
+@author: jakob
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import json
+import os
+import platform
+import sys
+import time
+import pandas as pd
+import docplex
+
+# own modules
+from qip import QIP
+from profiling import Profiler, peak_rss_mb
+from instance_io import load_instance, load_pickles
+from create_random_instance import synthetic_instance
+
+# %% Paths
+# baseline to compare against (a previous run saved with update_baseline=True)
+baseline_path = os.path.join(os.getcwd(),'benchmark_baseline.json')
+update_baseline = False
+
+# %%  Set Input Parameters
+
+track_session_capacity = 4
+paper_distribution = 'exact' # 'exact' or 'upper_bound'
+bidder_cost = 5
+topic_cost = 25
+topic_utility = 100
+formulation = 'quadratic' # 'quadratic' or 'linear'
+
+# instance ladder: name -> data folder or .npz bundle (e.g. of a real conference) or arguments of synthetic_instance
+instances = OrderedDict([('toy_32', os.path.join(os.getcwd(),'data_prepared')),
+                         ('synthetic_100', {'n_sessions': 5, 'n_tracks': 5, 'n_bidders': 300, 'seed': 1}),
+                         ('synthetic_500', {'n_sessions': 25, 'n_tracks': 5, 'n_bidders': 1500, 'seed': 1}),
+                         ('synthetic_2000', {'n_sessions': 50, 'n_tracks': 10, 'n_bidders': 6000, 'seed': 1}),
+                         ])
+
+# fixed QIP parameters, such that runs are comparable
+QIP_parameters = {'log_output': False,
+                  'time_limit': 300, # in seconds
+                  'mip_relative_gap': 0.01,
+                  'integrality_tol': None,
+                  'feasibility_tol': None,
+                  }
+
+# a metric is a regression if it is larger than (1+tolerance)*baseline and by more than the absolute threshold
+tolerance = 0.2
+thresholds = {'Build_Time': 0.5, 'Solve_Time': 1.0, 'Time_To_First_Incumbent': 1.0, 'Peak_RSS_MB': 20, 'Relative_Gap': 0.005}
+
+# %% Benchmark run of a single instance (in a fresh process, such that the peak RSS is the one of this instance)
+
+def load_data(source):
+    if isinstance(source, dict):
+        return synthetic_instance(track_session_capacity=track_session_capacity, **source)
+    if source.endswith('.npz'):
+        return load_instance(source)
+    if os.path.exists(os.path.join(source,'instance.npz')):
+        return load_instance(os.path.join(source,'instance.npz'))
+    return load_pickles(source)
+
+
+def run_instance(name, source):
+    result = OrderedDict([('Instance', name)])
+    profiler = Profiler()
+    with profiler.phase('data_load'):
+        data = load_data(source)
+    result['Papers'] = len(data['paper_ids'])
+    result['Bidders'] = len(data['bidder_ids'])
+    result['Bids'] = len(data['U'])
+
+    QIP_instance = QIP(session_ids=data['session_ids'],
+                       track_ids=data['track_ids'],
+                       paper_ids=data['paper_ids'],
+                       bidder_ids=data['bidder_ids'],
+                       author_ids=data['author_ids'],
+                       topic_ids=data['topic_ids'],
+                       track_session_capacity=track_session_capacity,
+                       paper_distribution=paper_distribution,
+                       U=data['U'],
+                       M=data['M'],
+                       T=data['T'],
+                       Q=data['Q'],
+                       bidder_cost = bidder_cost,
+                       topic_cost = topic_cost,
+                       topic_utility = topic_utility,
+                       QIP_parameters = QIP_parameters,
+                       save_results=False,
+                       formulation=formulation,
+                       profiler=profiler)
+
+    start = time.perf_counter()
+    QIP_instance.build()
+    result['Build_Time'] = time.perf_counter() - start
+    result['Variables'] = QIP_instance.QIP.number_of_variables
+    result['Constraints'] = QIP_instance.QIP.number_of_constraints
+
+    start = time.perf_counter()
+    try:
+        QIP_instance.solve()
+        result['Error'] = None
+    except Exception as error: # e.g. no solution within the time limit or a size limited CPLEX version
+        result['Error'] = str(error).splitlines()[0][:200] if str(error) else type(error).__name__
+    result['Solve_Time'] = time.perf_counter() - start
+    incumbents = [point[0] for point in profiler.trajectory if point[1] is not None]
+    result['Time_To_First_Incumbent'] = incumbents[0] if incumbents else None
+    details = QIP_instance.QIP.get_solve_details()
+    result['Status'] = details.status if details is not None else None
+    result['Relative_Gap'] = details.mip_relative_gap if details is not None and QIP_instance.allocation else None
+    result['Objective_Value'] = QIP_instance.QIP.objective_value if QIP_instance.allocation else None
+    result['Peak_RSS_MB'] = peak_rss_mb()
+    result['Phases'] = OrderedDict((phase['Phase'], phase['Wall_Time']) for phase in profiler.phases)
+    return result
+
+
+def compare(results, baseline):
+    # per instance and metric: baseline, current value, ratio and the list of regressions
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        row = OrderedDict([('Instance', name)])
+        regressions = []
+        for metric, threshold in thresholds.items():
+            current, previous = result.get(metric), baseline[name].get(metric)
+            row[metric+'_Baseline'] = previous
+            row[metric] = current
+            row[metric+'_Ratio'] = current/previous if current is not None and previous else None
+            if current is not None and previous is not None and current > (1+tolerance)*previous and current-previous > threshold:
+                regressions.append(metric)
+        if baseline[name].get('Variables') != result.get('Variables') or baseline[name].get('Constraints') != result.get('Constraints'):
+            regressions.append('Model_Size')
+        row['Regressions'] = ','.join(regressions)
+        rows.append(row)
+    return pd.DataFrame(rows).set_index('Instance') if rows else pd.DataFrame()
+
+
+# %% Benchmark
+
+if __name__ == '__main__':
+    results = OrderedDict()
+    for name, source in instances.items():
+        print(f'BENCHMARK {name}')
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                results[name] = pool.submit(run_instance, name, source).result()
+            except BrokenProcessPool: # e.g. out of memory
+                results[name] = OrderedDict([('Instance', name), ('Error', 'worker process terminated abruptly (out of memory?)')])
+
+    environment = OrderedDict([('Date', datetime.now().strftime("%d_%m_%Y_%H-%M-%S")),
+                               ('Python', sys.version.split()[0]),
+                               ('docplex', docplex.__version__),
+                               ('Platform', platform.platform()),
+                               ('CPUs', os.cpu_count()),
+                               ('Formulation', formulation),
+                               ('QIP_parameters', QIP_parameters)])
+    df = pd.DataFrame([{key: value for key, value in result.items() if key != 'Phases'} for result in results.values()]).set_index('Instance')
+    print(df.to_string())
+    df.to_csv(os.path.join(os.getcwd(),'benchmark_suite_'+environment['Date']+'.csv'))
+    json.dump({'Environment': environment, 'Results': results}, open(os.path.join(os.getcwd(),'benchmark_suite_'+environment['Date']+'.json'),'w'), indent=2, default=str)
+
+    regressions = False
+    if os.path.exists(baseline_path):
+        baseline = json.load(open(baseline_path))
+        comparison = compare(results, baseline['Results'])
+        print(f'COMPARISON WITH BASELINE {baseline_path} ({baseline["Environment"]["Date"]})')
+        print(comparison.to_string())
+        comparison.to_csv(os.path.join(os.getcwd(),'benchmark_suite_comparison_'+environment['Date']+'.csv'))
+        regressions = not comparison.empty and (comparison['Regressions'] != '').any()
+        if regressions:
+            print('REGRESSIONS: '+', '.join(f'{name}: {row}' for name, row in comparison['Regressions'].items() if row))
+    if update_baseline:
+        json.dump({'Environment': environment, 'Results': results}, open(baseline_path,'w'), indent=2, default=str)
+        print(f'Saved baseline: {baseline_path}')
+    sys.exit(1 if regressions else 0)
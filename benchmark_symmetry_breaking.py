@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the track-symmetry breaking constraints: node count, solve time and time to reach the relative gap
+for each symmetry breaking mode on data_prepared and on a ladder of larger synthetic instances.
+
+@author: jakob
+"""
+
+import os
+from datetime import datetime
+import pandas as pd
+
+# own modules
+from qip import QIP
+from instance_io import load_pickles
+from create_random_instance import synthetic_instance
+
+# %% Instances
+# folders of instances (same layout as data_prepared) and synthetic instances (see create_random_instance.py)
+instance_paths = [os.path.join(os.getcwd(),'data_prepared')]
+# (sessions, tracks, track_session_capacity, bidders), papers = sessions*tracks*track_session_capacity
+synthetic_sizes = [(4, 3, 3, 150),
+                   (6, 4, 4, 300),
+                   (8, 4, 4, 500)]
+
+# %%  Set Input Parameters
+
+track_session_capacity = 4 # of the instances in instance_paths
+paper_distribution = 'exact' # 'exact' or 'upper_bound'
+bidder_cost = 5
+topic_cost = 25
+topic_utility = 100
+sparse_model = False # if True, only variables which can be nonzero are created
+formulation = 'quadratic' # 'quadratic' or 'linear'
+symmetry_breaking_modes = [None, 'lowest_paper', 'weighted_order']
+backend = 'cplex' # 'cplex' or 'cpsat', the synthetic instances exceed the size limits of the CPLEX community edition
+
+# QIP parameters
+QIP_parameters = {'log_output': False,
+                  'time_limit': 60, # in seconds
+                  'mip_relative_gap': 0.01,
+                  'integrality_tol': None,
+                  'feasibility_tol': None,
+                  }
+
+# %% Benchmark
+
+instances = [(os.path.basename(instance_path), track_session_capacity, load_pickles(instance_path)) for instance_path in instance_paths]
+for n_sessions, n_tracks, capacity, n_bidders in synthetic_sizes:
+    instances.append((f'synthetic_{n_sessions}x{n_tracks}x{capacity}', capacity,
+                      synthetic_instance(n_sessions=n_sessions, n_tracks=n_tracks, track_session_capacity=capacity, n_bidders=n_bidders, seed=1)))
+
+results = []
+for instance, capacity, data in instances:
+    for symmetry_breaking in symmetry_breaking_modes:
+
+        QIP_instance = QIP(session_ids=data['session_ids'],
+                           track_ids=data['track_ids'],
+                           paper_ids=data['paper_ids'],
+                           bidder_ids=data['bidder_ids'],
+                           author_ids=data['author_ids'],
+                           topic_ids=data['topic_ids'],
+                           track_session_capacity=capacity,
+                           paper_distribution=paper_distribution,
+                           U=data['U'],
+                           M=data['M'],
+                           T=data['T'],
+                           Q=data['Q'],
+                           bidder_cost = bidder_cost,
+                           topic_cost = topic_cost,
+                           topic_utility = topic_utility,
+                           QIP_parameters = QIP_parameters,
+                           save_results=False,
+                           sparse_model=sparse_model,
+                           formulation=formulation,
+                           symmetry_breaking=symmetry_breaking,
+                           backend=backend)
+        QIP_instance.build()
+        QIP_instance.solve()
+        details = QIP_instance.QIP.get_solve_details()
+
+        results.append({'Instance': instance,
+                        'Papers': len(data['paper_ids']),
+                        'Symmetry_Breaking': str(symmetry_breaking),
+                        'Variables': QIP_instance.QIP.number_of_variables,
+                        'Constraints': QIP_instance.QIP.number_of_constraints,
+                        'Nodes': details.nb_nodes_processed,
+                        'Solve_Time': details.time,
+                        'Time_To_Gap': None if details.has_hit_limit() else details.time,
+                        'Relative_Gap': details.mip_relative_gap,
+                        'Objective_Value': QIP_instance.QIP.objective_value if QIP_instance.QIP.solution else None,
+                        })
+
+df = pd.DataFrame(results).set_index(['Instance','Symmetry_Breaking'])
+print(df.to_string())
+df.to_csv(os.path.join(os.getcwd(),'benchmark_symmetry_breaking_'+datetime.now().strftime("%d_%m_%Y_%H-%M-%S")+'.csv'))
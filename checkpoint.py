@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Incumbent checkpoints of long solves: each improved schedule is written atomically to the result folder while the
+solve is running and can be reloaded as MIP start of a resumed solve (QIP parameter 'resume').
+
+@author: jakob
+"""
+
+
+# Libs
+from collections import OrderedDict
+from datetime import datetime
+import glob
+import json
+import os
+import tempfile
+from docplex.mp.progress import SolutionListener, ProgressClock
+
+# own modules
+from schedule_result import ScheduleResult
+
+CHECKPOINT_PREFIX = 'qip_checkpoint_'
+
+
+# %%
+def write_json_atomic(path, data):
+    # write to a unique temporary file in the same folder and rename it, i.e., path always contains a complete file
+    # (also if several processes write path at the same time)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def find_checkpoint(path):
+    # path is a checkpoint file or a result folder (latest checkpoint in the folder)
+    if os.path.isdir(path):
+        checkpoints = glob.glob(os.path.join(path, CHECKPOINT_PREFIX+'*.json'))
+        if not checkpoints:
+            raise FileNotFoundError(f'No {CHECKPOINT_PREFIX}*.json in {path}!')
+        return max(checkpoints, key=os.path.getmtime)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Checkpoint {path} does not exist!')
+    return path
+
+
+def load_checkpoint(path):
+
+    '''
+    Loads the checkpoint file path or the latest checkpoint in the result folder path. Returns the allocation
+    {paper_id:(session_id,track_id)} and the checkpoint, i.e., an OrderedDict with the objective value, best bound,
+    relative gap, solve time and schedule.
+    '''
+
+    with open(find_checkpoint(path)) as f:
+        checkpoint = json.load(f, object_pairs_hook=OrderedDict)
+    allocation = OrderedDict((p, (entry['Session'], entry['Track'])) for entry in checkpoint['Schedule'] for p in entry['Papers'])
+    return allocation, checkpoint
+
+
+class CheckpointListener(SolutionListener):
+
+    '''
+    This implements the class CheckpointListener.
+    Each improved incumbent of the solve is written to path as JSON: objective value, best bound, relative gap, solve
+    time (including time_offset, i.e., the solve time of the resumed checkpoint) and the schedule as list of
+    {Session, Track, Papers}. The schedule is the schedule of the model, i.e., with canonical tracks if
+    symmetry_breaking and with the representative bidders and topics if presolve.
+    '''
+
+    def __init__(self,
+                 qip,
+                 path,
+                 time_offset=0.0):
+        super().__init__(ProgressClock.Objective)
+        self.qip = qip
+        self.path = path
+        self.time_offset = time_offset
+        self.objective_value = None
+        self.n_checkpoints = 0
+
+    def improves(self, objective):
+        if self.objective_value is None:
+            return True
+        return objective > self.objective_value if self.qip.QIP.is_maximized() else objective < self.objective_value
+
+    def notify_solution(self, sol):
+        progress_data = self.current_progress_data
+        objective = progress_data.current_objective
+        if not self.improves(objective):
+            return
+        result = ScheduleResult(session_ids=self.qip.session_ids,
+                                track_ids=self.qip.track_ids,
+                                paper_ids=self.qip.paper_ids,
+                                slots=self.qip.extract_slots(sol))
+        checkpoint = OrderedDict([('Objective_Value', objective),
+                                  ('Best_Bound', progress_data.best_bound),
+                                  ('Relative_Gap', progress_data.mip_gap),
+                                  ('Solve_Time', self.time_offset + progress_data.time),
+                                  ('Date_Time', datetime.now().strftime("%d_%m_%Y_%H-%M-%S")),
+                                  ('Schedule', [OrderedDict([('Session', j), ('Track', k), ('Papers', papers)])
+                                                for (j,k), papers in result.schedule.items()])])
+        write_json_atomic(self.path, checkpoint)
+        self.objective_value = objective
+        self.n_checkpoints += 1
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+Column generation engine over subsession patterns (set partitioning) for large conferences.
+
+@author: jakob
+"""
+
+
+# Libs
+import logging
+from collections import OrderedDict
+import json
+import os
+import time
+import numpy as np
+
+# own modules
+from qip import QIP
+from schedule_result import ScheduleResult
+from heuristics import greedy_allocation
+
+
+# %%
+class ColumnGeneration(QIP):
+
+    '''
+    This implements the class ColumnGeneration.
+    Instead of x_{p,j,k} this class uses subsession patterns, i.e., sets of at most track_session_capacity papers.
+    The restricted master problem (RMP) selects for each session |track_ids| patterns (tracks are interchangeable)
+    such that each paper is covered exactly once, no paper is in a session where T(j,p)==1, and each author
+    presents in at most one pattern per session. A bidder (topic) can attend only one track per session, thus the
+    RMP has an attendance variable a_{b,c} in [0,1] for each pattern c and each bidder b for which c beats the
+    bidder cost, weighted by the bids of b on c minus the bidder cost, with a_{b,c} <= lambda_c and at most one
+    attended pattern per bidder and session (the same for topics). With binary patterns the objective of the RMP
+    is the objective of the schedule, and the duals of the attendance rows are charged in the pricing.
+
+    Starting from the patterns of the greedy heuristic, the LP relaxation of the RMP is solved and new patterns
+    with positive reduced cost are generated by a greedy pricing heuristic (per session, started from the
+    'pricing_seeds' most promising papers or from each paper if None), of which the 'pricing_columns' patterns with
+    the highest reduced cost per session are added. Column generation stops if no such pattern is found, after
+    'max_iterations' iterations or after half of the time_limit. Then the RMP is solved as a binary program over
+    all generated patterns in the remaining time.
+    '''
+
+    def __init__(self,
+                 *args,
+                 **kwargs):
+
+        super().__init__(*args, **kwargs)
+        if self.presolve:
+            raise ValueError('ColumnGeneration works on the original bidders and topics, presolve applies only to the QIP!')
+        if self.backend != 'cplex':
+            raise ValueError(f'ColumnGeneration requires the duals of the LP relaxation, i.e., backend cplex, not {self.backend}!')
+        self.name = 'ColumnGeneration'
+        self.QIP.name = self.name
+        self.columns = [] # (papers, session_id) per column
+        self.column_index = set() # (frozenset(papers), session_id) of all columns
+        self.column_values = [] # pattern value per column (upper bound of its contribution, used by the exchange heuristic)
+        self.pattern_gains = {} # frozenset of paper indices -> attendance gains of bidders and topics (cache)
+        self.lambdas = [] # RMP variable per column
+        self.attendance_vars = [] # [(kind, entity index, variable, gain)] per column, kind 'bidder' or 'topic'
+        self.paper_rows = OrderedDict() # paper_id -> RMP constraint: paper is covered exactly once
+        self.session_rows = OrderedDict() # session_id -> RMP constraint: |track_ids| patterns per session
+        self.author_rows = OrderedDict() # (author_id,session_id) -> RMP constraint: at most one pattern per session
+        self.attendance_rows = OrderedDict() # (kind,entity index,session_id) -> RMP constraint: at most one attended pattern per session
+        self.column_generation_details = None
+
+
+    def build(self):
+        self.print_input_info()
+
+        logging.info('')
+        logging.info('BUILD COLUMN GENERATION')
+        logging.info(self.log_sep)
+
+        # sparse (entity, paper, value) arrays of the scorer sorted by paper, i.e., per paper slices
+        scorer = self.get_scorer()
+        self.bids = self._paper_slices(scorer.bid_papers, scorer.bid_bidders, scorer.bid_values)
+        self.paper_topics = self._paper_slices(scorer.paper_topic_papers, scorer.paper_topic_topics, scorer.paper_topic_values)
+        self.paper_authors = self._paper_slices(scorer.paper_author_papers, scorer.paper_author_authors, np.ones(len(scorer.paper_author_papers)))
+        self.allowed = ~scorer.forbidden
+        self.n_bidders, self.n_topics, self.n_authors = len(self.bidder_ids), len(self.topic_ids), len(scorer.author_ids)
+
+        # only authors with several papers can violate the author single-track rule
+        n_papers = np.bincount(scorer.paper_author_authors, minlength=self.n_authors)
+        self.multi_paper_authors = n_papers > 1
+        self.QIP.maximize(self.QIP.linear_expr())
+
+        self.QIP_built = True
+        logging.info('Succesfully Built Column Generation')
+        self.log_build_details()
+
+
+    def _paper_slices(self, papers, entities, values):
+        # sort (paper, entity, value) arrays by paper, such that entities[ptr[i]:ptr[i+1]] belong to paper index i
+        order = np.argsort(papers, kind='stable')
+        ptr = np.searchsorted(papers[order], np.arange(len(self.paper_ids)+1))
+        return papers[order], entities[order], values[order], ptr
+
+
+    def log_build_details(self):
+        logging.info('')
+        logging.info('BUILD DETAILS:')
+        logging.info(f'papers:{len(self.paper_ids)}')
+        logging.info(f'sessions:{len(self.session_ids)}')
+        logging.info(f'bids:{len(self.U)}')
+        logging.info(f'columns:{len(self.columns)}')
+        logging.info(f'RMP constraints:{self.QIP.number_of_constraints}')
+
+
+    # %% restricted master problem
+    def add_column(self, papers, j):
+        paper_index = self.get_scorer().paper_index
+        papers = tuple(sorted(papers, key=paper_index.get))
+        key = (frozenset(papers), j)
+        if key in self.column_index:
+            return False
+        self.column_index.add(key)
+
+        c = len(self.columns)
+        indices = [paper_index[p] for p in papers]
+        lam = self.QIP.continuous_var(lb=0, name=f'lambda_{c}')
+        self.columns.append((papers, j))
+        self.column_values.append(self.pattern_value(indices))
+        self.lambdas.append(lam)
+
+        attendance_vars = []
+        for kind, ids, (entities, gains) in zip(['bidder', 'topic'], [self.bidder_ids, self.topic_ids], self.attendance_gains(indices)):
+            for e, gain in zip(entities.tolist(), gains.tolist()):
+                a = self.QIP.continuous_var(lb=0, ub=1, name=f'a_{kind}{ids[e]}_{c}')
+                self.QIP.objective_expr.add_term(a, gain)
+                self.QIP.add_constraint(ct=a <= lam, ctname=f'{kind.upper()}{ids[e]}_PATTERN{c}_ATTENDED')
+                self._row(self.attendance_rows, (kind,e,j), a, lambda expr: expr <= 1, f'{kind.upper()}{ids[e]}_SESSION{j}_SINGLE_TRACK')
+                attendance_vars.append((kind, e, a, gain))
+        self.attendance_vars.append(attendance_vars)
+
+        for p in papers:
+            self._row(self.paper_rows, p, lam, lambda e: e == 1, f'PAPER{p}_COVERED_ONCE')
+        if self.paper_distribution == 'exact':
+            self._row(self.session_rows, j, lam, lambda e: e == len(self.track_ids), f'SESSION{j}_PATTERNS')
+        else:
+            self._row(self.session_rows, j, lam, lambda e: e <= len(self.track_ids), f'SESSION{j}_PATTERNS')
+        author_ids = self.get_scorer().author_ids
+        for a in set(author_ids[a] for a in self._pattern_authors(papers) if self.multi_paper_authors[a]):
+            self._row(self.author_rows, (a,j), lam, lambda e: e <= 1, f'AUTHOR{a}_SESSION{j}_SINGLE_PATTERN')
+        return True
+
+
+    def _row(self, rows, key, var, sense, ctname):
+        # add var to the RMP constraint rows[key] or create it
+        if key in rows:
+            rows[key].lhs.add_term(var, 1)
+        else:
+            expr = self.QIP.linear_expr()
+            expr.add_term(var, 1)
+            rows[key] = self.QIP.add_constraint(ct=sense(expr), ctname=ctname)
+
+
+    def _pattern_authors(self, papers):
+        paper_index = self.get_scorer().paper_index
+        _, authors, _, ptr = self.paper_authors
+        return set(int(a) for p in papers for a in authors[ptr[paper_index[p]]:ptr[paper_index[p]+1]])
+
+
+    def attendance_gains(self, papers):
+        # bidders and topics which attend the paper indices papers in a single track, i.e., whose sum beats the cost,
+        # and their sum minus the cost: [(bidder indices, gains), (topic indices, gains)]
+        key = frozenset(papers)
+        if key not in self.pattern_gains:
+            gains = []
+            for (_, entities, values, ptr), cost in [(self.bids, self.bidder_cost), (self.paper_topics, self.topic_cost)]:
+                entries = np.concatenate([np.arange(ptr[i], ptr[i+1]) for i in papers])
+                unique, inverse = np.unique(entities[entries], return_inverse=True)
+                gain = np.bincount(inverse, values[entries], minlength=len(unique)) - cost
+                gains.append((unique[gain > 0], gain[gain > 0]))
+            self.pattern_gains[key] = gains
+        return self.pattern_gains[key]
+
+
+    def pattern_value(self, papers):
+        # objective of the paper indices papers in a single track if its bidders and topics attend no other track
+        return float(sum(gains.sum() for _, gains in self.attendance_gains(papers)))
+
+
+    def exchange_columns(self, lp_values, n_columns):
+        # pairs of patterns where one paper of each used pattern (lp_values>0) is exchanged and the sum of both pattern
+        # values increases. The LP relaxation of the set partitioning RMP is highly degenerate, such that dual pricing
+        # alone often adds columns which enter at zero level. Returns the n_columns best pairs of new columns
+        paper_index = self.get_scorer().paper_index
+        session_index = self.get_scorer().session_index
+        used = [(tuple(paper_index[p] for p in papers), session_index[j], self.column_values[c])
+                for c, ((papers, j), value) in enumerate(zip(self.columns, lp_values)) if value > 1e-6]
+        exchanges = []
+        for c1, (papers1, j1, value1) in enumerate(used):
+            for papers2, j2, value2 in used[c1+1:]:
+                if set(papers1) & set(papers2):
+                    continue
+                best = None
+                for p in papers1:
+                    for o in papers2:
+                        if not (self.allowed[p, j2] and self.allowed[o, j1]):
+                            continue
+                        new1 = [o if i == p else i for i in papers1]
+                        new2 = [p if i == o else i for i in papers2]
+                        gain = self.pattern_value(new1) + self.pattern_value(new2) - value1 - value2
+                        if gain > 1e-6 and (best is None or gain > best[0]):
+                            best = (gain, (new1, j1), (new2, j2))
+                if best is not None:
+                    exchanges.append(best)
+        exchanges.sort(key=lambda e: -e[0])
+        return [column for gain, *columns in exchanges[:n_columns] for column in columns]
+
+
+    # %% pricing
+    def price(self, j, paper_duals, session_dual, author_duals, bidder_duals, topic_duals, n_seeds, n_columns):
+        # greedy pricing heuristic for session index j: starting from each seed paper, add the paper with the highest
+        # increase of the reduced cost until the pattern is full. A bidder (topic) contributes its sum minus the cost
+        # and minus the dual of its attendance row in session j if positive. Returns the n_columns patterns (paper
+        # indices) with the highest positive reduced cost
+        bid_papers, bid_bidders, bid_values, _ = self.bids
+        topic_papers, topic_topics, topic_values, _ = self.paper_topics
+        author_papers, author_authors, _, author_ptr = self.paper_authors
+        n_papers = len(self.paper_ids)
+        bidder_costs = self.bidder_cost + bidder_duals
+        topic_costs = self.topic_cost + topic_duals
+
+        def reduced_gains(bidder_sums, topic_sums, authors_in_pattern):
+            # increase of the reduced cost when adding each paper to the pattern
+            gains = np.bincount(bid_papers, np.maximum(0, bidder_sums[bid_bidders]+bid_values-bidder_costs[bid_bidders])
+                                - np.maximum(0, bidder_sums[bid_bidders]-bidder_costs[bid_bidders]), minlength=n_papers)
+            gains += np.bincount(topic_papers, np.maximum(0, topic_sums[topic_topics]+topic_values-topic_costs[topic_topics])
+                                 - np.maximum(0, topic_sums[topic_topics]-topic_costs[topic_topics]), minlength=n_papers)
+            gains -= np.bincount(author_papers, author_duals[author_authors]*~authors_in_pattern[author_authors], minlength=n_papers)
+            return gains - paper_duals
+
+        initial_gains = reduced_gains(np.zeros(self.n_bidders), np.zeros(self.n_topics), np.zeros(self.n_authors, dtype=bool))
+        candidates = np.nonzero(self.allowed[:, j])[0]
+        if self.paper_distribution == 'exact' and len(candidates) < self.track_session_capacity:
+            return []
+        seeds = candidates[np.argsort(-initial_gains[candidates], kind='stable')[:n_seeds]]
+
+        patterns = []
+        for seed in seeds:
+            bidder_sums, topic_sums = np.zeros(self.n_bidders), np.zeros(self.n_topics)
+            authors_in_pattern = np.zeros(self.n_authors, dtype=bool)
+            available = self.allowed[:, j].copy()
+            pattern, reduced_cost = [], -session_dual
+            gains = initial_gains
+            i = seed
+            while True:
+                reduced_cost += gains[i]
+                pattern.append(i)
+                available[i] = False
+                bidder_sums[bid_bidders[self.bids[3][i]:self.bids[3][i+1]]] += bid_values[self.bids[3][i]:self.bids[3][i+1]]
+                topic_sums[topic_topics[self.paper_topics[3][i]:self.paper_topics[3][i+1]]] += topic_values[self.paper_topics[3][i]:self.paper_topics[3][i+1]]
+                authors_in_pattern[author_authors[author_ptr[i]:author_ptr[i+1]]] = True
+                if len(pattern) == self.track_session_capacity or not available.any():
+                    break
+                gains = np.where(available, reduced_gains(bidder_sums, topic_sums, authors_in_pattern), -np.inf)
+                i = int(np.argmax(gains))
+                if self.paper_distribution == 'upper_bound' and gains[i] <= 0:
+                    break
+            if self.paper_distribution == 'exact' and len(pattern) < self.track_session_capacity:
+                continue
+            if reduced_cost > 1e-6:
+                patterns.append((reduced_cost, frozenset(pattern)))
+        patterns = sorted(set(patterns), key=lambda c: -c[0])
+        return [sorted(pattern) for reduced_cost, pattern in patterns[:n_columns]]
+
+
+    # %% solve
+    def solve(self):
+        if not self.QIP_built:
+            raise ValueError('Column generation build-status:{QIP_built}, first call .build()!')
+
+        log_output = self.QIP_parameters['log_output']
+        time_limit = self.QIP_parameters['time_limit']
+        mip_relative_gap = self.QIP_parameters['mip_relative_gap']
+        max_iterations = self.QIP_parameters.get('max_iterations', 100)
+        n_seeds = self.QIP_parameters.get('pricing_seeds')
+        n_columns = self.QIP_parameters.get('pricing_columns', 5)
+
+        logging.info('')
+        logging.info('SOLVE COLUMN GENERATION')
+        logging.info(self.log_sep)
+        logging.info('Column generation time limit of %s', time_limit)
+        logging.info('Column generation max iterations %s', max_iterations)
+        logging.info('Column generation pricing seeds %s', n_seeds)
+        logging.info('Column generation pricing columns %s', n_columns)
+
+        # initial columns from the greedy heuristic
+        start = time.perf_counter()
+        allocation = greedy_allocation(session_ids=self.session_ids,
+                                       track_ids=self.track_ids,
+                                       paper_ids=self.paper_ids,
+                                       track_session_capacity=self.track_session_capacity,
+                                       U=self.U,
+                                       M=self.M,
+                                       T=self.T,
+                                       Q=self.Q,
+                                       bidder_cost=self.bidder_cost,
+                                       topic_cost=self.topic_cost,
+                                       topic_utility=self.topic_utility)
+        if allocation is None:
+            raise RuntimeError('Greedy heuristic found no feasible initial allocation!')
+        patterns = OrderedDict()
+        for p, (j,k) in allocation.items():
+            patterns.setdefault((j,k), []).append(p)
+        for (j,k), papers in patterns.items():
+            self.add_column(papers, j)
+        initial_columns = list(range(len(self.columns)))
+        logging.info(f'{len(self.columns)} initial columns')
+
+        # column generation on the LP relaxation of the RMP
+        iteration, lp_objective = 0, None
+        author_index = {a: i for i, a in enumerate(self.get_scorer().author_ids)}
+        while iteration < max_iterations and (time_limit is None or time.perf_counter()-start < time_limit/2):
+            iteration += 1
+            Sol = self.QIP.solve(log_output=log_output)
+            if not Sol:
+                raise RuntimeError(f'RMP LP relaxation could not be solved: {self.QIP.get_solve_status()}')
+            lp_objective = Sol.objective_value
+
+            paper_duals = np.array(self.QIP.dual_values([self.paper_rows[p] for p in self.paper_ids]))
+            session_duals = dict(zip(self.session_rows.keys(), self.QIP.dual_values(self.session_rows.values())))
+            author_duals = np.zeros((len(self.session_ids), self.n_authors))
+            for (a,j), dual in zip(self.author_rows.keys(), self.QIP.dual_values(self.author_rows.values())):
+                author_duals[self.get_scorer().session_index[j], author_index[a]] = dual
+            attendance_duals = {'bidder': np.zeros((len(self.session_ids), self.n_bidders)),
+                                'topic': np.zeros((len(self.session_ids), self.n_topics))}
+            for (kind,e,j), dual in zip(self.attendance_rows.keys(), self.QIP.dual_values(self.attendance_rows.values())):
+                attendance_duals[kind][self.get_scorer().session_index[j], e] = dual
+            n_new = 0
+            for s, j in enumerate(self.session_ids):
+                for pattern in self.price(s, paper_duals, session_duals.get(j, 0), author_duals[s], attendance_duals['bidder'][s],
+                                          attendance_duals['topic'][s], n_seeds, n_columns):
+                    n_new += self.add_column([self.paper_ids[i] for i in pattern], j)
+            for pattern, s in self.exchange_columns(Sol.get_values(self.lambdas), n_columns*len(self.session_ids)):
+                n_new += self.add_column([self.paper_ids[i] for i in pattern], self.session_ids[s])
+            logging.info(f'Iteration {iteration}: LP objective {lp_objective} | {n_new} new columns | {len(self.columns)} columns')
+            if n_new == 0:
+                break
+        cg_time = time.perf_counter() - start
+
+        # binary RMP over all generated columns
+        for lam in self.lambdas:
+            lam.set_vartype(self.QIP.binary_vartype)
+        if time_limit is not None:
+            self.QIP.set_time_limit(max(time_limit - cg_time, 1))
+        if mip_relative_gap is not None:
+            self.QIP.parameters.mip.tolerances.mipgap.set(mip_relative_gap)
+        mip_start = self.QIP.new_solution()
+        best = {}
+        for c in initial_columns:
+            mip_start.add_var_value(self.lambdas[c], 1)
+            for kind, e, a, gain in self.attendance_vars[c]:
+                key = (kind, e, self.columns[c][1])
+                if key not in best or gain > best[key][1]:
+                    best[key] = (a, gain)
+        for a, gain in best.values():
+            mip_start.add_var_value(a, 1)
+        self.QIP.add_mip_start(mip_start, complete_vars=True)
+        Sol = self.QIP.solve(log_output=log_output)
+        if not Sol:
+            raise RuntimeError(f'Binary RMP could not be solved: {self.QIP.get_solve_status()}')
+        self.soltime = time.perf_counter() - start
+
+        # set the allocation and schedule, tracks are assigned in the order of the selected patterns
+        selected = OrderedDict((j, []) for j in self.session_ids)
+        for (papers, j), value in zip(self.columns, Sol.get_values(self.lambdas)):
+            if value > 0.5:
+                selected[j].append(papers)
+        for j, session_patterns in selected.items():
+            for k, papers in zip(self.track_ids, session_patterns):
+                self.schedule[(j,k)] = list(papers)
+                for p in papers:
+                    self.allocation[p] = (j,k)
+        self.calc_attendance()
+
+        details = Sol.solve_details
+        self.column_generation_details = {'Problem': 'ColumnGeneration',
+                                          'Status': details.status,
+                                          'Time': self.soltime,
+                                          'Pricing_Time': cg_time,
+                                          'N_Iter': iteration,
+                                          'N_Columns': len(self.columns),
+                                          'LP_Objective_Value': lp_objective,
+                                          'RMP_Objective_Value': Sol.objective_value,
+                                          'Relative_Gap': details.mip_relative_gap,
+                                          'Objective_Value': self.score()['Objective_Value']}
+        cg_solve_details = self.log_solve_details()
+
+        if self.save_results:
+            json.dump(cg_solve_details, open(os.path.join(self.savefolder,'column_generation_solve_details_'+self.QIP_date_time+'.json'),'w'))
+            ScheduleResult.from_allocation(self.session_ids, self.track_ids, self.paper_ids, self.allocation, self.attendance).save(os.path.join(self.savefolder,'column_generation_schedule_'+self.QIP_date_time+'.npz'))
+
+        return self.schedule
+
+
+    def calc_attendance(self):
+        self.attendance = self.score()['Attendance']
+
+
+    def log_solve_details(self):
+        details = self.column_generation_details
+        logging.info('')
+        logging.info('SOLVE DETAILS:')
+        logging.info('Problem : %s', details['Problem'])
+        logging.info('Status  : %s', details['Status'])
+        logging.info('Time    : %s sec', round(details['Time']))
+        logging.info('Pricing : %s sec', round(details['Pricing_Time']))
+        logging.info('N. Iter : %s', details['N_Iter'])
+        logging.info('Columns : %s', details['N_Columns'])
+        logging.info('LP Objective Value: %s', details['LP_Objective_Value'])
+        logging.info('RMP Objective Value: %s', details['RMP_Objective_Value'])
+        logging.info('RMP Relative Gap: %s', details['Relative_Gap'])
+        logging.info('Objective Value: %s', details['Objective_Value'])
+        return details
+
+
+    def check_paper_allocation(self,
+                               verbose=0):
+        violations = self.score()['Violations']
+        for name, violated in violations.items():
+            if violated:
+                raise RuntimeError(f'{name}: {violated}')
+        logging.info(f'{len(self.paper_ids)} Papers allocated')
+        logging.info('')
@@ -8,6 +8,11 @@ Created on Tue May 24 10:33:14 2022
 import pickle as pkl
 import os
 import random
+import time
+import numpy as np
+
+# own modules
+from instance_io import save_instance
 
 def create_random_instance(seed,
                            save_data_path):
@@ -65,14 +70,8 @@ def create_random_instance(seed,
     # Remove from M mapping authors with less than two papers, since they are not constrained by session conflicts.
     paper_count = {}
     for key in M:
-        if key[0] in paper_count:
-            paper_count[key[0]] += 1
-        else:
-            paper_count[key[0]] = 1
-    for a, c in paper_count.items():
-        if c == 1:
-            to_del = [key for key in M.keys() if key[0]==a]
-            del M[to_del[0]]
+        paper_count[key[0]] = paper_count.get(key[0], 0) + 1
+    M = {key: value for key, value in M.items() if paper_count[key[0]] >= 2}
 
     # T MAPPING: T(j,p)==1 iff paper id:p CANNOT be presented in session_id:j
     T = {(1,10):1,(2,20):1}
@@ -94,21 +93,11 @@ def create_random_instance(seed,
             paper_topic_dict[key[0]] = [f'Topic{key[1]}']
 
     # SAVE
-    pkl.dump(U, open(os.path.join(save_data_path,'U.pkl'), 'wb'))
-    pkl.dump(M, open(os.path.join(save_data_path,'M.pkl'), 'wb'))
-    pkl.dump(T, open(os.path.join(save_data_path,'T.pkl'), 'wb'))
-    pkl.dump(Q, open(os.path.join(save_data_path,'Q.pkl'), 'wb'))
-
-    pkl.dump(session_ids, open(os.path.join(save_data_path,'session_ids.pkl'), 'wb'))
-    pkl.dump(track_ids, open(os.path.join(save_data_path,'track_ids.pkl'), 'wb'))
-    pkl.dump(bidder_ids, open(os.path.join(save_data_path,'bidder_ids.pkl'), 'wb'))
-    pkl.dump(author_ids, open(os.path.join(save_data_path,'author_ids.pkl'), 'wb'))
-    pkl.dump(paper_ids, open(os.path.join(save_data_path,'paper_ids.pkl'), 'wb'))
-    pkl.dump(topic_ids, open(os.path.join(save_data_path,'topic_ids.pkl'), 'wb'))
-
-    pkl.dump(paper_author_dict, open(os.path.join(save_data_path,'paper_author_dict.pkl'), 'wb'))
-    pkl.dump(paper_title_dict, open(os.path.join(save_data_path,'paper_title_dict.pkl'), 'wb'))
-    pkl.dump(paper_topic_dict, open(os.path.join(save_data_path,'paper_topic_dict.pkl'), 'wb'))
+    save_data(save_data_path,
+              {'U': U, 'M': M, 'T': T, 'Q': Q,
+               'session_ids': session_ids, 'track_ids': track_ids, 'bidder_ids': bidder_ids, 'author_ids': author_ids,
+               'paper_ids': paper_ids, 'topic_ids': topic_ids,
+               'paper_author_dict': paper_author_dict, 'paper_title_dict': paper_title_dict, 'paper_topic_dict': paper_topic_dict})
 
     print(f'Sessions:{session_ids}')
     print(f'Tracks:{track_ids}')
@@ -124,4 +113,165 @@ def create_random_instance(seed,
     print(f'len(paper_author_dict):{len(paper_author_dict)}')
     print(f'len(paper_title_dict):{len(paper_title_dict)}')
     print(f'len(paper_topic_dict):{len(paper_topic_dict)}')
-    return
\ No newline at end of file
+    return
+
+
+def save_data(save_data_path,
+              data):
+    # save the data input as pickle files (as read by create_schedule.py) and as single-file bundle (see instance_io.py)
+    os.makedirs(save_data_path, exist_ok=True)
+    names = ['U', 'M', 'T', 'Q', 'session_ids', 'track_ids', 'bidder_ids', 'author_ids', 'paper_ids', 'topic_ids',
+             'paper_author_dict', 'paper_title_dict', 'paper_topic_dict']
+    for name in names:
+        with open(os.path.join(save_data_path,name+'.pkl'), 'wb') as f:
+            pkl.dump(data[name], f)
+    save_instance(os.path.join(save_data_path,'instance.npz'), **{name: data[name] for name in names})
+
+
+def segment_sample(rng, cumulative, starts, ends):
+    # sample one index per segment [starts[i],ends[i]) of the concatenated cumulative weights (inverse CDF)
+    low = np.where(starts > 0, cumulative[np.maximum(starts-1, 0)], 0.0)
+    u = low + rng.random(len(starts))*(cumulative[ends-1]-low)
+    return np.minimum(np.searchsorted(cumulative, u, side='right'), ends-1)
+
+
+def synthetic_instance(n_sessions=6,
+                       n_tracks=4,
+                       track_session_capacity=4,
+                       n_bidders=500,
+                       n_authors=None,
+                       n_topics=30,
+                       bids_per_bidder=10,
+                       authors_per_paper=2.5,
+                       topics_per_paper=2,
+                       popularity_exponent=1.0,
+                       activity_sigma=1.0,
+                       topic_affinity=0.7,
+                       conflict_density=0.05,
+                       seed=1):
+
+    '''
+    Vectorized synthetic instance with n_sessions*n_tracks*track_session_capacity papers (returned as dict, see
+    create_synthetic_instance to save it).
+    Papers: Zipf popularity (exponent popularity_exponent) and a Zipf distributed primary topic with further topics
+    close to it (correlated topics).
+    Bidders: log-normal activity (sigma activity_sigma, on average bids_per_bidder bids) and a favourite topic. A
+    bid is on a paper of the favourite topic with probability topic_affinity (otherwise on any paper), the papers are
+    drawn proportional to their popularity and bids on the favourite topic are higher on average.
+    Authors: Zipf productivity, on average authors_per_paper authors per paper.
+    T: each (session,paper) is a conflict with probability conflict_density.
+    The instance is feasible for paper_distribution='exact': a hidden schedule (papers ordered by primary topic) is
+    fixed first, T never excludes the session of a paper in this schedule and all papers of an author are in the
+    same track of this schedule. It is returned as data['allocation'] {paper_id:(session_id,track_id)}, e.g., as
+    initial_allocation of the class LNS.
+    '''
+
+    rng = np.random.default_rng(seed)
+    n_papers = n_sessions*n_tracks*track_session_capacity
+    n_authors = n_authors if n_authors is not None else int(1.5*n_papers)
+    if n_authors < n_tracks:
+        raise ValueError(f'n_authors:{n_authors} must be at least n_tracks:{n_tracks}!')
+    paper_ids = np.arange(1, n_papers+1)
+
+    # Topics: Zipf distributed primary topic and neighbouring further topics
+    topic_weights = 1/np.arange(1, n_topics+1)**popularity_exponent
+    primary = rng.choice(n_topics, size=n_papers, p=topic_weights/topic_weights.sum())
+    n_paper_topics = np.clip(1 + rng.binomial(2, min(1.0, max(0.0, (topics_per_paper-1)/2)), size=n_papers), 1, n_topics)
+    q_papers = np.repeat(np.arange(n_papers), n_paper_topics)
+    q_topics = np.repeat(primary, n_paper_topics)
+    further = np.arange(len(q_papers)) - np.repeat(np.cumsum(n_paper_topics)-n_paper_topics, n_paper_topics) > 0
+    offsets = rng.geometric(0.5, size=int(further.sum())) * rng.choice([-1, 1], size=int(further.sum()))
+    q_topics[further] = (q_topics[further] + offsets) % n_topics
+    _, index = np.unique(q_papers*n_topics + q_topics, return_index=True)
+    q_papers, q_topics = q_papers[index], q_topics[index]
+
+    # Hidden schedule: papers ordered by primary topic fill the tracks one after the other
+    order = np.argsort(primary, kind='stable')
+    slot = np.empty(n_papers, dtype=np.int64)
+    slot[order] = np.arange(n_papers)
+    paper_track = slot // (n_sessions*track_session_capacity)
+    paper_session = (slot // track_session_capacity) % n_sessions
+
+    # Authors: home track and Zipf productivity, authors of a paper are drawn from the authors of its hidden track
+    author_track = rng.permutation(np.arange(n_authors) % n_tracks)
+    author_weights = 1/rng.permutation(np.arange(1, n_authors+1))
+    author_order = np.argsort(author_track, kind='stable')
+    author_cumulative = np.cumsum(author_weights[author_order])
+    author_ends = np.cumsum(np.bincount(author_track, minlength=n_tracks))
+    author_starts = author_ends - np.bincount(author_track, minlength=n_tracks)
+    n_paper_authors = np.clip(1 + rng.poisson(max(0.0, authors_per_paper-1), size=n_papers), 1, 8)
+    m_papers = np.repeat(np.arange(n_papers), n_paper_authors)
+    m_authors = author_order[segment_sample(rng, author_cumulative, author_starts[paper_track[m_papers]], author_ends[paper_track[m_papers]])]
+    _, index = np.unique(m_papers*n_authors + m_authors, return_index=True)
+    m_papers, m_authors = m_papers[index], m_authors[index]
+
+    # Bids: log-normal activity, favourite topic with Zipf popular papers
+    paper_weights = 1/rng.permutation(np.arange(1, n_papers+1))**popularity_exponent
+    activity = rng.lognormal(0, activity_sigma, size=n_bidders)
+    n_bids = np.clip(np.rint(activity/activity.mean()*bids_per_bidder), 1, n_papers).astype(np.int64)
+    favourite = primary[rng.choice(n_papers, size=n_bidders, p=paper_weights/paper_weights.sum())]
+    u_bidders = np.repeat(np.arange(n_bidders), n_bids)
+    on_topic = rng.random(len(u_bidders)) < topic_affinity
+    u_papers = np.searchsorted(np.cumsum(paper_weights), rng.random(len(u_bidders))*paper_weights.sum(), side='right')
+    topic_order = np.argsort(q_topics, kind='stable')
+    topic_cumulative = np.cumsum(paper_weights[q_papers[topic_order]])
+    topic_ends = np.cumsum(np.bincount(q_topics, minlength=n_topics))
+    topic_starts = topic_ends - np.bincount(q_topics, minlength=n_topics)
+    on_topic &= topic_ends[favourite[u_bidders]] > topic_starts[favourite[u_bidders]]
+    u_papers[on_topic] = q_papers[topic_order][segment_sample(rng, topic_cumulative, topic_starts[favourite[u_bidders[on_topic]]], topic_ends[favourite[u_bidders[on_topic]]])]
+    u_papers = np.minimum(u_papers, n_papers-1)
+    u_values = np.clip(rng.normal(np.where(on_topic, 70, 40), 20), 1, 100)
+    _, index = np.unique(u_bidders*n_papers + u_papers, return_index=True)
+    u_bidders, u_papers, u_values = u_bidders[index], u_papers[index], u_values[index]
+
+    # T: conflicts except for the session of the hidden schedule
+    conflicts = rng.random((n_papers, n_sessions)) < conflict_density
+    conflicts[np.arange(n_papers), paper_session] = False
+    t_papers, t_sessions = np.nonzero(conflicts)
+
+    # M without authors with less than two papers
+    multiple = np.bincount(m_authors, minlength=n_authors)[m_authors] >= 2
+
+    data = {'session_ids': list(range(1, n_sessions+1)),
+            'track_ids': list(range(1, n_tracks+1)),
+            'paper_ids': paper_ids.tolist(),
+            'bidder_ids': list(range(1, n_bidders+1)),
+            'author_ids': list(range(1, n_authors+1)),
+            'topic_ids': list(range(1, n_topics+1))}
+    data['U'] = dict(zip(zip((u_bidders+1).tolist(), (u_papers+1).tolist()), u_values.tolist()))
+    data['M'] = dict.fromkeys(zip((m_authors[multiple]+1).tolist(), (m_papers[multiple]+1).tolist()), 1)
+    data['T'] = dict.fromkeys(zip((t_sessions+1).tolist(), (t_papers+1).tolist()), 1)
+    data['Q'] = dict.fromkeys(zip((q_papers+1).tolist(), (q_topics+1).tolist()), 1)
+    data['paper_title_dict'] = {p: f'Paper Title {p}' for p in data['paper_ids']}
+    data['paper_author_dict'] = {p: [] for p in data['paper_ids']}
+    for a, p in zip((m_authors+1).tolist(), (m_papers+1).tolist()):
+        data['paper_author_dict'][p].append(f'Author{a}')
+    data['paper_topic_dict'] = {p: [] for p in data['paper_ids']}
+    for p, t in data['Q']:
+        data['paper_topic_dict'][p].append(f'Topic{t}')
+    data['allocation'] = dict(zip(data['paper_ids'], zip((paper_session+1).tolist(), (paper_track+1).tolist())))
+    return data
+
+
+def create_synthetic_instance(seed,
+                              save_data_path,
+                              **kwargs):
+    # save a synthetic instance (see synthetic_instance for the keyword arguments) in the layout read by create_schedule.py
+    print('CREATE SYNTHETIC PREPARED DATA AND MAPPINGS:')
+    print(''.join(['-']*50))
+    print(f'SAVE PREPARED DATA IN: {save_data_path}')
+    start = time.perf_counter()
+    data = synthetic_instance(seed=seed, **kwargs)
+    print(f'Generated in {round(time.perf_counter()-start,2)} sec')
+    save_data(save_data_path, data)
+    print(f'Sessions:{data["session_ids"]}')
+    print(f'Tracks:{data["track_ids"]}')
+    print(f'#Papers:{len(data["paper_ids"])}')
+    print(f'#Bidders:{len(data["bidder_ids"])}')
+    print(f'#Authors:{len(data["author_ids"])}')
+    print(f'#Topics:{len(data["topic_ids"])}')
+    print(f'#Bids:{len(data["U"])}')
+    print(f'len(M):{len(data["M"])}')
+    print(f'len(T):{len(data["T"])}')
+    print(f'len(Q):{len(data["Q"])}')
+    return data
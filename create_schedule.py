@@ -5,17 +5,27 @@ Created on Tue May 24 16:48:20 2022
 @author: jakob
 """
 
-import pickle as pkl
 import os
 
 # own modules
-from create_random_instance import create_random_instance
+from create_random_instance import create_random_instance, create_synthetic_instance
 from qip import QIP
+from local_search import LocalSearch
+from column_generation import ColumnGeneration
+from portfolio import Portfolio
+from lns import LNS
+from decomposition import Decomposition
+from profiling import Profiler
+from instance_io import load_instance, load_pickles
+from solve_cache import SolveCache
 
 # %% Path
 save_data_path = os.path.join(os.getcwd(),'data_prepared')
+# single-file bundle of the pickle files, create it with: python instance_io.py data_prepared data_prepared/instance.npz
+instance_path = os.path.join(save_data_path,'instance.npz')
 
 #create_random_instance(seed=1,save_data_path=save_data_path)
+#create_synthetic_instance(seed=1,save_data_path=save_data_path,n_sessions=6,n_tracks=4,n_bidders=500)
 
 # %%  Set Input Parameters
 
@@ -24,6 +34,18 @@ paper_distribution = 'exact' # 'exact' or 'upper_bound'
 bidder_cost = 5
 topic_cost = 25
 topic_utility = 100
+sparse_model = False # if True, only variables which can be nonzero are created
+formulation = 'quadratic' # 'quadratic' or 'linear'
+symmetry_breaking = None # None, 'lowest_paper' or 'weighted_order' (not recommended, see benchmark_symmetry_breaking.py)
+author_formulation = 'presence' # 'presence' or 'compact' (fewer author constraints and z variables)
+model_names = False # if True, variables and constraints are named (readable LP files and constraint logs), slower build
+model_export = None # formats of the model saved after the build, e.g., ['txt','lp','mps.gz'] (None: not saved)
+engine = 'qip' # 'qip', 'local_search', 'column_generation', 'portfolio', 'lns' or 'decomposition'
+backend = 'cplex' # 'cplex' or 'cpsat' (OR-Tools CP-SAT)
+presolve = False # if True, bidders (topics) with identical bids (papers) are merged into weighted classes
+bid_quantization = None # None or step to which U is rounded before bidders are compared in the presolve
+cache_path = None # folder of the solve cache, e.g., os.path.join(os.getcwd(),'solve_cache') (None: no cache), engine 'qip' only
+cache_size_mb = 500 # least recently used schedules are evicted if the cache exceeds this size
 
 # QIP parameters
 QIP_parameters = {'log_output': False,
@@ -31,69 +53,75 @@ QIP_parameters = {'log_output': False,
                   'mip_relative_gap': 0.01,
                   'integrality_tol': None,
                   'feasibility_tol': None,
+                  'mip_start': None, # None or 'greedy'
+                  'threads': None, # None: solver default
+                  'checkpoint': False, # if True, write each improved incumbent to qip_checkpoint_<day_month_year>_<hh-mm-ss>.json
+                  'resume': None, # None or checkpoint file or result folder of an earlier solve (MIP start, remaining time limit)
                   }
 # %% Load Data Input
 
-# U MAPPING: U(b,p)= scaled preference of bidder_id:b for paper_id:p
-U = pkl.load(open(os.path.join(save_data_path,'U.pkl'), 'rb'))
-# M MAPPING: M(a,p)==1 iff author_id: a is an author of paper_id:p
-M = pkl.load(open(os.path.join(save_data_path,'M.pkl'), 'rb'))
-# T MAPPING: T(j,p)==1 iff paper_id:p CANNOT be presented in session:j
-T = pkl.load(open(os.path.join(save_data_path,'T.pkl'), 'rb'))
-# Q MAPPING: Q(p,t)==1 iff paper_id:p has topic ID:t
-Q = pkl.load(open(os.path.join(save_data_path,'Q.pkl'), 'rb'))
-
-# session_ids
-session_ids = pkl.load(open(os.path.join(save_data_path,'session_ids.pkl'), 'rb'))
-# track_ids
-track_ids = pkl.load(open(os.path.join(save_data_path,'track_ids.pkl'), 'rb'))
-# paper_ids
-paper_ids = pkl.load(open(os.path.join(save_data_path,'paper_ids.pkl'), 'rb'))
-# bidder_ids
-bidder_ids = pkl.load(open(os.path.join(save_data_path,'bidder_ids.pkl'), 'rb'))
-# author_ids
-author_ids = pkl.load(open(os.path.join(save_data_path,'author_ids.pkl'), 'rb'))
-# author_ids
-topic_ids = pkl.load(open(os.path.join(save_data_path,'topic_ids.pkl'), 'rb'))
-
-# paper_title_dict
-paper_title_dict = pkl.load(open(os.path.join(save_data_path,'paper_title_dict.pkl'), 'rb'))
-# paper_author_dict
-paper_author_dict = pkl.load(open(os.path.join(save_data_path,'paper_author_dict.pkl'), 'rb'))
-# paper_topic_dict
-paper_topic_dict = pkl.load(open(os.path.join(save_data_path,'paper_topic_dict.pkl'), 'rb'))
+# wall-clock time, CPU time and peak RSS per phase, saved as qip_profile_<day_month_year>_<hh-mm-ss>.json
+profiler = Profiler()
+
+with profiler.phase('data_load'):
+    if os.path.exists(instance_path):
+        # single-file bundle with all inputs (see instance_io.py)
+        instance = load_instance(instance_path)
+    else:
+        # one pickle file per input, e.g., U.pkl with U(b,p)= scaled preference of bidder_id:b for paper_id:p
+        instance = load_pickles(save_data_path)
+    U, M, T, Q = instance['U'], instance['M'], instance['T'], instance['Q']
+    session_ids, track_ids, paper_ids = instance['session_ids'], instance['track_ids'], instance['paper_ids']
+    bidder_ids, author_ids, topic_ids = instance['bidder_ids'], instance['author_ids'], instance['topic_ids']
+    paper_title_dict, paper_author_dict, paper_topic_dict = instance['paper_title_dict'], instance['paper_author_dict'], instance['paper_topic_dict']
 
 # %% QIP
 
-#  INSTNATIATE AND BUILD QIP
-QIP_instance = QIP(session_ids=session_ids,
-                   track_ids=track_ids,
-                   paper_ids=paper_ids,
-                   bidder_ids=bidder_ids,
-                   author_ids=author_ids,
-                   topic_ids = topic_ids,
-                   track_session_capacity=track_session_capacity,
-                   paper_distribution=paper_distribution,
-                   U=U,
-                   M=M,
-                   T=T,
-                   Q=Q,
-                   bidder_cost = bidder_cost,
-                   topic_cost = topic_cost,
-                   topic_utility = topic_utility,
-                   QIP_parameters = QIP_parameters,
-                   save_results=True,
-                   savefolder='QIP_RESULTS')
-
-QIP_instance.build()
-
-#  SOLVE QIP
-QIP_instance.solve()
+#  INSTNATIATE AND BUILD QIP (or the local search or column generation engine)
+QIP_class = {'qip': QIP, 'local_search': LocalSearch, 'column_generation': ColumnGeneration, 'portfolio': Portfolio, 'lns': LNS, 'decomposition': Decomposition}[engine]
+QIP_instance = QIP_class(session_ids=session_ids,
+                         track_ids=track_ids,
+                         paper_ids=paper_ids,
+                         bidder_ids=bidder_ids,
+                         author_ids=author_ids,
+                         topic_ids = topic_ids,
+                         track_session_capacity=track_session_capacity,
+                         paper_distribution=paper_distribution,
+                         U=U,
+                         M=M,
+                         T=T,
+                         Q=Q,
+                         bidder_cost = bidder_cost,
+                         topic_cost = topic_cost,
+                         topic_utility = topic_utility,
+                         QIP_parameters = QIP_parameters,
+                         save_results=True,
+                         savefolder='QIP_RESULTS',
+                         sparse_model=sparse_model,
+                         formulation=formulation,
+                         symmetry_breaking=symmetry_breaking,
+                         author_formulation=author_formulation,
+                         model_names=model_names,
+                         model_export=model_export,
+                         backend=backend,
+                         presolve=presolve,
+                         bid_quantization=bid_quantization,
+                         cache=SolveCache(cache_path, max_size_mb=cache_size_mb) if cache_path and engine == 'qip' else None,
+                         profiler=profiler)
+
+# schedule of the solve cache (engine 'qip'), the model is only built and solved if the instance is not cached
+if QIP_instance.cached_result() is None:
+    QIP_instance.build()
+
+    #  SOLVE QIP
+    QIP_instance.solve()
 QIP_instance.summary()
 
 # TRANSFORM QIP_instance.schedule to nice format and create output folder
-QIP_instance.create_schedule(filename = 'schedule',
-                             paper_author_dict = paper_author_dict,
-                             paper_title_dict = paper_title_dict,
-                             paper_topic_dict =  paper_topic_dict,
-                             )
\ No newline at end of file
+with profiler.phase('create_schedule'):
+    QIP_instance.create_schedule(filename = 'schedule',
+                                 paper_author_dict = paper_author_dict,
+                                 paper_title_dict = paper_title_dict,
+                                 paper_topic_dict =  paper_topic_dict,
+                                 )
+QIP_instance.save_profile()
\ No newline at end of file
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Decomposition of multi-day conferences: papers are assigned to blocks of sessions (e.g. days), one QIP per block is
+solved in a process pool and papers are exchanged between the blocks afterwards.
+
+@author: jakob
+"""
+
+
+# Libs
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import time
+import math
+
+# own modules
+from qip import QIP
+from schedule_result import ScheduleResult
+from local_search import LocalSearch
+from heuristics import greedy_allocation
+
+
+# %%
+def solve_block(block, QIP_kwargs, initial_allocation):
+    # build and solve the QIP of one block with the master schedule of its papers as MIP start
+    start = time.perf_counter()
+    QIP_instance = QIP(**QIP_kwargs)
+    QIP_instance.build()
+    QIP_instance.allocation = OrderedDict(initial_allocation)
+    try:
+        QIP_instance.solve()
+    except Exception as error: # e.g. no solution within the time limit, the master schedule of the block is kept
+        logging.info(f'Block {block} failed: {error}')
+    details = QIP_instance.QIP.get_solve_details()
+    solved = bool(QIP_instance.result is not None and QIP_instance.allocation)
+    return {'Block': block,
+            'Papers': len(QIP_kwargs['paper_ids']),
+            'Variables': QIP_instance.QIP.number_of_variables,
+            'Status': details.status if details is not None else None,
+            'Time': time.perf_counter() - start,
+            'Objective_Value': QIP_instance.QIP.objective_value if solved else None,
+            'Allocation': dict(QIP_instance.allocation) if solved else dict(initial_allocation)}
+
+
+class BlockRepair(LocalSearch):
+
+    '''
+    This implements the class BlockRepair.
+    Local search which only moves papers to sessions of another block (or swaps papers of two blocks), i.e., it
+    exchanges papers between the independently solved blocks.
+    '''
+
+    def __init__(self,
+                 *args,
+                 block_of_session=None,
+                 **kwargs):
+
+        super().__init__(*args, **kwargs)
+        self.name = 'BlockRepair'
+        self.block_of_session = block_of_session # session_id -> block
+
+
+    def build(self):
+        super().build()
+        self.session_block = [self.block_of_session[j] for j in self.session_ids]
+
+
+    def _random_move(self, rng, exact):
+        candidate = super()._random_move(rng, exact)
+        if candidate is None or self.session_block[self.slot_of[candidate[0]][0]] == self.session_block[candidate[1]]:
+            return None
+        return candidate
+
+
+class Decomposition(QIP):
+
+    '''
+    This implements the class Decomposition.
+    For conferences with many sessions the QIP is decomposed into blocks of sessions (e.g. the days). Since the
+    objective is a sum over sessions, the QIP of a block only depends on the papers assigned to the block:
+    1. Master: the greedy heuristic on the whole conference assigns each paper to a session, respecting T and the
+       author single-track rule. Each paper is assigned to the block of its session.
+    2. Blocks: the QIP of each block (its sessions, papers and the bidders, authors and topics of its papers) is
+       built and solved in a process pool with the master schedule of the block as MIP start. The QIP options
+       (formulation, backend, presolve, ...) apply to the QIPs of the blocks.
+    3. Repair: a local search without worsening moves (BlockRepair) moves papers to sessions of other blocks and
+       swaps papers of two blocks if the objective of the conference improves.
+
+    Decomposition specific QIP_parameters (all optional):
+    'blocks' (list of lists of session_ids, default: consecutive blocks of 'block_size' sessions, default 4),
+    'decomposition_workers' (processes, default: number of cores), 'block_time_limit' (time limit per block in
+    seconds, default: 80% of time_limit split over the rounds of the pool), 'repair_time_limit' (default: the rest
+    of time_limit, at least 1 second), 'seed'.
+    The parameter 'time_limit' (required) is the total wall-clock budget.
+    '''
+
+    def __init__(self,
+                 **kwargs):
+
+        super().__init__(**kwargs)
+        self.name = 'Decomposition'
+        self.QIP_kwargs = kwargs
+        self.objective_value = None
+        self.block_results = []
+        self.decomposition_details = None
+
+
+    def build(self):
+        # every block builds its own QIP
+        self.print_input_info()
+        self.blocks = self.QIP_parameters.get('blocks')
+        if self.blocks is None:
+            block_size = self.QIP_parameters.get('block_size', 4)
+            self.blocks = [self.session_ids[i:i+block_size] for i in range(0, len(self.session_ids), block_size)]
+        sessions = [j for block in self.blocks for j in block]
+        if len(sessions) != len(self.session_ids) or set(sessions) != set(self.session_ids):
+            raise ValueError('Each session must be in exactly one block!')
+        self.block_of_session = {j: b for b, block in enumerate(self.blocks) for j in block}
+        self.n_workers = min(self.QIP_parameters.get('decomposition_workers') or os.cpu_count(), len(self.blocks))
+        self.QIP_built = True
+        self.log_build_details()
+
+
+    def log_build_details(self):
+        logging.info('')
+        logging.info('BUILD DETAILS:')
+        logging.info(f'blocks:{len(self.blocks)}')
+        logging.info(f'workers:{self.n_workers}')
+        for b, sessions in enumerate(self.blocks):
+            logging.info(f'block {b}: sessions {sessions}')
+
+
+    def block_kwargs(self, sessions, papers, threads, time_limit):
+        # QIP inputs of a block: its sessions and papers and the bidders, authors and topics of its papers
+        bidder_ids, topic_ids, U, Q = self.original_inputs()
+        sessions, papers = set(sessions), set(papers)
+        U_block = {(b,p): u for (b,p), u in U.items() if p in papers}
+        M_block = {(a,p): m for (a,p), m in self.M.items() if p in papers}
+        T_block = {(j,p): t for (j,p), t in self.T.items() if j in sessions and p in papers}
+        Q_block = {(p,t): c for (p,t), c in Q.items() if p in papers}
+        bidders, authors, topics = set(b for b,_ in U_block), set(a for a,_ in M_block), set(t for _,t in Q_block)
+        return dict(self.QIP_kwargs,
+                    session_ids=[j for j in self.session_ids if j in sessions],
+                    paper_ids=[p for p in self.paper_ids if p in papers],
+                    bidder_ids=[b for b in bidder_ids if b in bidders],
+                    author_ids=[a for a in self.author_ids if a in authors],
+                    topic_ids=[t for t in topic_ids if t in topics],
+                    U=U_block,
+                    M=M_block,
+                    T=T_block,
+                    Q=Q_block,
+                    QIP_parameters=dict(self.QIP_parameters, time_limit=time_limit, threads=threads, mip_start=None, checkpoint=False, resume=None),
+                    save_results=False,
+                    savefolder=None,
+                    profiler=None,
+                    cache=None)
+
+
+    def solve(self):
+        if not self.QIP_built:
+            raise ValueError('Decomposition build-status:{QIP_built}, first call .build()!')
+
+        time_limit = self.QIP_parameters.get('time_limit')
+        if time_limit is None:
+            raise ValueError('Decomposition needs a time_limit!')
+        n_rounds = math.ceil(len(self.blocks)/self.n_workers)
+        block_time_limit = self.QIP_parameters.get('block_time_limit') or 0.8*time_limit/n_rounds
+        threads = max(1, os.cpu_count() // self.n_workers)
+
+        logging.info('')
+        logging.info('SOLVE DECOMPOSITION')
+        logging.info(self.log_sep)
+        logging.info(f'Block time limit of {block_time_limit} ({n_rounds} round(s) of {self.n_workers} worker(s))')
+
+        # 1. master: greedy schedule of the conference, i.e., block of each paper
+        start = time.perf_counter()
+        bidder_ids, topic_ids, U, Q = self.original_inputs()
+        master_allocation = greedy_allocation(session_ids=self.session_ids,
+                                              track_ids=self.track_ids,
+                                              paper_ids=self.paper_ids,
+                                              track_session_capacity=self.track_session_capacity,
+                                              U=U,
+                                              M=self.M,
+                                              T=self.T,
+                                              Q=Q,
+                                              bidder_cost=self.bidder_cost,
+                                              topic_cost=self.topic_cost,
+                                              topic_utility=self.topic_utility)
+        if master_allocation is None:
+            raise RuntimeError('Greedy heuristic found no feasible master schedule!')
+        master_objective = self.score(allocation=master_allocation)['Objective_Value']
+        logging.info(f'Master schedule with objective value {master_objective} in {round(time.perf_counter()-start,2)} sec')
+
+        # 2. blocks: QIP of each block in a process pool
+        block_papers = [[p for p in self.paper_ids if self.block_of_session[master_allocation[p][0]] == b] for b in range(len(self.blocks))]
+        with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+            futures = [pool.submit(solve_block, b, self.block_kwargs(sessions, block_papers[b], threads, block_time_limit),
+                                   OrderedDict((p, master_allocation[p]) for p in block_papers[b]))
+                       for b, sessions in enumerate(self.blocks)]
+            self.block_results = [future.result() for future in futures]
+        allocation = OrderedDict()
+        for result in self.block_results:
+            logging.info(f'Block {result["Block"]}: {result["Papers"]} papers | {result["Variables"]} variables | {result["Status"]} | objective {result["Objective_Value"]} | {round(result["Time"],2)} sec')
+            allocation.update(result['Allocation'])
+        block_objective = self.score(allocation=allocation)['Objective_Value']
+        logging.info(f'Merged block schedules with objective value {block_objective} in {round(time.perf_counter()-start,2)} sec')
+
+        # 3. repair: exchange papers between the blocks without worsening moves
+        repair_time_limit = self.QIP_parameters.get('repair_time_limit') or max(time_limit - (time.perf_counter()-start), 1)
+        repair_parameters = dict(self.QIP_parameters, time_limit=repair_time_limit, max_iterations=None, initial_temperature=1e-9, final_temperature=1e-9)
+        repair = None
+        if len(self.blocks) > 1:
+            repair = BlockRepair(**dict(self.QIP_kwargs, QIP_parameters=repair_parameters, save_results=False, savefolder=None,
+                                        profiler=None, cache=None, presolve=False, bid_quantization=None),
+                                 initial_allocation=allocation,
+                                 block_of_session=self.block_of_session)
+            repair.build()
+            repair.solve()
+            allocation = repair.allocation
+        self.soltime = time.perf_counter() - start
+
+        # set the allocation, schedule and attendance
+        self.allocation = OrderedDict()
+        self.schedule = OrderedDict()
+        for j,k in self.session_track_tuple_ids:
+            for p in self.paper_ids:
+                if allocation.get(p) == (j,k):
+                    self.allocation[p] = (j,k)
+                    self.schedule.setdefault((j,k), []).append(p)
+        self.calc_attendance()
+        self.objective_value = self.score()['Objective_Value']
+
+        self.decomposition_details = {'Problem': 'Decomposition',
+                                      'Status': 'time limit',
+                                      'Time': self.soltime,
+                                      'Blocks': len(self.blocks),
+                                      'Master_Objective_Value': master_objective,
+                                      'Block_Objective_Value': block_objective,
+                                      'Repair_N_Improved': repair.local_search_details['N_Improved'] if repair is not None else 0,
+                                      'Objective_Value': self.objective_value}
+        decomposition_solve_details = self.log_solve_details()
+
+        if self.save_results:
+            block_results = [{key: value for key, value in result.items() if key != 'Allocation'} for result in self.block_results]
+            json.dump(dict(decomposition_solve_details, Block_Results=block_results), open(os.path.join(self.savefolder,'decomposition_solve_details_'+self.QIP_date_time+'.json'),'w'))
+            ScheduleResult.from_allocation(self.session_ids, self.track_ids, self.paper_ids, self.allocation, self.attendance).save(os.path.join(self.savefolder,'decomposition_schedule_'+self.QIP_date_time+'.npz'))
+
+        return self.schedule
+
+
+    def calc_attendance(self):
+        self.attendance = self.score()['Attendance']
+
+
+    def log_solve_details(self):
+        details = self.decomposition_details
+        logging.info('')
+        logging.info('SOLVE DETAILS:')
+        logging.info('Problem : %s', details['Problem'])
+        logging.info('Status  : %s', details['Status'])
+        logging.info('Time    : %s sec', round(details['Time']))
+        logging.info('Blocks  : %s', details['Blocks'])
+        logging.info('Master Objective Value: %s', details['Master_Objective_Value'])
+        logging.info('Block Objective Value: %s', details['Block_Objective_Value'])
+        logging.info('Repair Improvements: %s', details['Repair_N_Improved'])
+        logging.info('Objective Value: %s', details['Objective_Value'])
+        return details
+
+
+    def check_paper_allocation(self,
+                               verbose=0):
+        for p in self.paper_ids:
+            if verbose > 0:
+                logging.info(f'PaperID:{p} allocated:{p in self.allocation}')
+            if p not in self.allocation:
+                raise RuntimeError(f'Paper{p} was not allocated!')
+        logging.info(f'{len(self.paper_ids)} Papers allocated')
+        logging.info('')
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Constructive heuristics for the scheduling problem, e.g., to create a MIP start for the QIP.
+
+@author: jakob
+"""
+
+from collections import OrderedDict, defaultdict
+import random
+
+
+def greedy_allocation(session_ids,
+                      track_ids,
+                      paper_ids,
+                      track_session_capacity,
+                      U,
+                      M,
+                      T,
+                      Q,
+                      bidder_cost,
+                      topic_cost,
+                      topic_utility,
+                      max_repair_iterations=10000,
+                      random_walk_probability=0.1):
+
+    '''
+    Greedily packs papers with high co-bidder overlap (from U) and shared topics (from Q) into the same
+    (session,track) tuple. Each paper is placed in the subsession with the highest marginal objective gain
+    among all subsessions with free capacity which are allowed by T and by the author single-track rule. If a
+    paper fits nowhere without violating the author single-track rule, it is placed with a violation which is
+    afterwards repaired by min-conflicts swaps of papers (with random walk steps).
+    Returns an allocation {paper_id:(session_id,track_id)} or None if no feasible allocation was found.
+    '''
+
+    session_track_tuple_ids = [(j,k) for j in session_ids for k in track_ids]
+
+    paper_bids = defaultdict(list)
+    for (b,p), u in U.items():
+        paper_bids[p].append((b,u))
+    paper_topics = defaultdict(list)
+    for p,t in Q.keys():
+        paper_topics[p].append(t)
+    paper_authors = defaultdict(list)
+    for a,p in M.keys():
+        paper_authors[p].append(a)
+    forbidden_sessions = defaultdict(set)
+    for j,p in T.keys():
+        forbidden_sessions[p].add(j)
+
+    # most constrained papers first, i.e., time conflicts, authors with several papers, and then most bids
+    order = sorted(paper_ids, key=lambda p: (-len(forbidden_sessions[p]),
+                                             -len(paper_authors[p]),
+                                             -sum(u for b,u in paper_bids[p])))
+
+    subsession_papers = {(j,k): [] for j,k in session_track_tuple_ids}
+    bid_sum = defaultdict(float) # (b,j,k) -> sum of U(b,p) over papers p allocated to (j,k)
+    best_bid_sum = defaultdict(float) # (b,j) -> max_k bid_sum[(b,j,k)]
+    topic_count = defaultdict(int) # (t,j,k) -> number of papers with topic t allocated to (j,k)
+    best_topic_count = defaultdict(int) # (t,j) -> max_k topic_count[(t,j,k)]
+    author_count = defaultdict(int) # (a,j,k) -> number of papers of author a allocated to (j,k)
+    allocation = OrderedDict()
+
+    def is_allowed(p, j, k):
+        # time conflicts and author single-track rule (ignoring capacity)
+        if j in forbidden_sessions[p]:
+            return False
+        return all(author_count[(a,j,l)] == 0 for a in paper_authors[p] for l in track_ids if l != k)
+
+    def gain(p, j, k):
+        # marginal gain when bidders and topics attend the best track per session if it beats their cost
+        gain = 0
+        for b,u in paper_bids[p]:
+            old = best_bid_sum[(b,j)]
+            new = max(old, bid_sum[(b,j,k)]+u)
+            gain += max(0, new-bidder_cost) - max(0, old-bidder_cost)
+        for t in paper_topics[p]:
+            old = best_topic_count[(t,j)]
+            new = max(old, topic_count[(t,j,k)]+1)
+            gain += max(0, new*topic_utility-topic_cost) - max(0, old*topic_utility-topic_cost)
+        return gain
+
+    def update(p, j, k, sign):
+        # add (sign=1) or remove (sign=-1) paper p to/from (j,k)
+        for b,u in paper_bids[p]:
+            bid_sum[(b,j,k)] += sign*u
+            best_bid_sum[(b,j)] = max(bid_sum[(b,j,l)] for l in track_ids)
+        for t in paper_topics[p]:
+            topic_count[(t,j,k)] += sign
+            best_topic_count[(t,j)] = max(topic_count[(t,j,l)] for l in track_ids)
+        for a in paper_authors[p]:
+            author_count[(a,j,k)] += sign
+        if sign > 0:
+            allocation[p] = (j,k)
+            subsession_papers[(j,k)].append(p)
+        else:
+            del allocation[p]
+            subsession_papers[(j,k)].remove(p)
+
+    def author_violations(authors, sessions):
+        # number of additional tracks used by the given authors in the given sessions (author single-track rule)
+        return sum(max(0, sum(author_count[(a,j,l)] > 0 for l in track_ids)-1) for a in authors for j in sessions)
+
+    def move_authors(p, j, k, sign):
+        for a in paper_authors[p]:
+            author_count[(a,j,k)] += sign
+
+    # greedy: prefer subsessions without author violations, then highest gain, then most free capacity
+    for p in order:
+        best_key, best_subsession = None, None
+        for j,k in session_track_tuple_ids:
+            free_capacity = track_session_capacity - len(subsession_papers[(j,k)])
+            if free_capacity == 0 or j in forbidden_sessions[p]:
+                continue
+            key = (int(is_allowed(p, j, k)), gain(p, j, k), free_capacity)
+            if best_key is None or key > best_key:
+                best_key, best_subsession = key, (j,k)
+        if best_subsession is None:
+            return None
+        update(p, *best_subsession, 1)
+
+    # repair: remove author violations by min-conflicts swaps (or moves to subsessions with free capacity)
+    rng = random.Random(0)
+    for _ in range(max_repair_iterations):
+        violating = [p for p in allocation if not is_allowed(p, *allocation[p])]
+        if not violating:
+            return allocation
+        p = rng.choice(violating)
+        j,k = allocation[p]
+
+        candidates = [(o,)+allocation[o] for o in allocation if allocation[o] != (j,k)]
+        candidates += [(None,)+subsession for subsession in session_track_tuple_ids if len(subsession_papers[subsession]) < track_session_capacity]
+        best_delta, best_moves = None, []
+        for o, j_o, k_o in candidates:
+            if j_o in forbidden_sessions[p] or (o is not None and j in forbidden_sessions[o]):
+                continue
+            authors = set(paper_authors[p]) | set(paper_authors[o] if o is not None else [])
+            before = author_violations(authors, {j, j_o})
+            move_authors(p, j, k, -1)
+            move_authors(p, j_o, k_o, 1)
+            if o is not None:
+                move_authors(o, j_o, k_o, -1)
+                move_authors(o, j, k, 1)
+            delta = author_violations(authors, {j, j_o}) - before
+            move_authors(p, j_o, k_o, -1)
+            move_authors(p, j, k, 1)
+            if o is not None:
+                move_authors(o, j, k, -1)
+                move_authors(o, j_o, k_o, 1)
+            if best_delta is None or delta < best_delta:
+                best_delta, best_moves = delta, [(o, j_o, k_o)]
+            elif delta == best_delta:
+                best_moves.append((o, j_o, k_o))
+        if not best_moves:
+            return None
+
+        # random walk step to escape plateaus
+        if rng.random() < random_walk_probability:
+            best_moves = [(o, j_o, k_o) for o, j_o, k_o in candidates if j_o not in forbidden_sessions[p] and (o is None or j not in forbidden_sessions[o])]
+        o, j_o, k_o = rng.choice(best_moves)
+        update(p, j, k, -1)
+        if o is not None:
+            update(o, j_o, k_o, -1)
+            update(o, j, k, 1)
+        update(p, j_o, k_o, 1)
+
+    return None
+
+
+def evaluate_allocation(allocation,
+                        U,
+                        Q,
+                        bidder_cost,
+                        topic_cost,
+                        topic_utility):
+
+    '''
+    Evaluates the objective of an allocation {paper_id:(session_id,track_id)} with the implied optimal
+    bidder and topic variables, i.e., a bidder (topic) attends the track with the highest utility per session
+    if it beats the bidder (topic) cost. Returns the objective value and the sets of (b,j,k) with y_{b,j,k}==1
+    and (t,j,k) with q_{t,j,k}==1.
+    '''
+
+    bid_sum = defaultdict(float)
+    for (b,p), u in U.items():
+        if p in allocation:
+            j,k = allocation[p]
+            bid_sum[(b,j,k)] += u
+    topic_sum = defaultdict(float)
+    for p,t in Q.keys():
+        if p in allocation:
+            j,k = allocation[p]
+            topic_sum[(t,j,k)] += topic_utility
+
+    objective = 0
+    attending = []
+    for sums, cost in [(bid_sum, bidder_cost), (topic_sum, topic_cost)]:
+        best = {}
+        for (i,j,k), s in sums.items():
+            if s-cost > 0 and s > best.get((i,j), (0, None))[0]:
+                best[(i,j)] = (s, k)
+        objective += sum(s-cost for s,k in best.values())
+        attending.append(set((i,j,k) for (i,j), (s,k) in best.items()))
+
+    return objective, attending[0], attending[1]
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming ingest of CSV exports of a conference-management system (papers, bids, authorships, topics, session
+conflicts) into a single-file instance bundle (see instance_io.py).
+
+@author: jakob
+"""
+
+
+# Libs
+import logging
+import argparse
+from collections import OrderedDict
+import time
+import numpy as np
+import pandas as pd
+
+# own modules
+from instance_io import save_arrays
+from profiling import peak_rss_mb
+
+
+# %%
+class IdMap:
+
+    '''
+    Maps arbitrary external ids (read as strings) to dense integer ids 1,2,... in order of first appearance.
+    '''
+
+    def __init__(self, external_ids=()):
+        self.index = OrderedDict()
+        for external_id in external_ids:
+            self.index.setdefault(external_id, len(self.index)+1)
+
+    def __len__(self):
+        return len(self.index)
+
+    def encode(self, values, add=True):
+        # dense ids of a pandas Series of external ids (0 for unknown ids if not add)
+        if add:
+            for external_id in values.unique():
+                self.index.setdefault(external_id, len(self.index)+1)
+        return values.map(self.index).fillna(0).to_numpy(dtype=np.int64)
+
+    @property
+    def ids(self):
+        return np.arange(1, len(self.index)+1, dtype=np.int64)
+
+    @property
+    def external_ids(self):
+        return np.array(list(self.index), dtype=str)
+
+
+def unique_last(rows, cols, values, n_cols):
+    # drop duplicate (row,col) keys keeping the last occurrence, the result is sorted by (row,col)
+    keys = rows*(n_cols+1) + cols
+    _, index = np.unique(keys[::-1], return_index=True)
+    index = len(keys) - 1 - index
+    return rows[index], cols[index], values[index]
+
+
+def csr(rows, values, n_rows):
+    # ptr and values of the lists per row 1,...,n_rows (in the original order within a row)
+    order = np.argsort(rows, kind='stable')
+    ptr = np.zeros(n_rows+1, dtype=np.int64)
+    ptr[1:] = np.cumsum(np.bincount(rows, minlength=n_rows+1)[1:])
+    return ptr, values[order]
+
+
+class CSVIngest:
+
+    '''
+    This implements the class CSVIngest.
+    The CSV files are read in chunks of chunksize rows (all columns as strings), only the encoded columns of each
+    chunk are kept as integer and float arrays, i.e., the memory is bounded by the size of the instance and not by
+    the size of the exports. External ids are mapped to dense integer ids 1,2,... (the external ids are saved in the
+    bundle as <name>_external). The arguments *_columns are the column names of the ids (and of the bid or title) in
+    each file.
+    papers: defines paper_ids and paper_title_dict, rows of the other files for unknown papers are dropped.
+    bids: U(b,p) are the bids scaled to [0,100], numeric bids are scaled linearly from bid_range to [0,100] (e.g.
+    bid_range=(0,3) if a bid of 0 means no interest) or, if bid_range is None, from the smallest and largest bid in
+    the file to [min_bid,100], i.e., the smallest bid is kept in U. Textual bids are mapped with bid_map, e.g.,
+    {'eager': 100, 'willing': 50}. With bid_scaling='bidder' the bids of each bidder are additionally rescaled such
+    that their largest bid is 100. Bids <= 0 after scaling are dropped and for duplicate rows the last one is kept.
+    authors: M(a,p)=1 for authors with at least 2 papers (as in create_random_instance.py), paper_author_dict lists
+    all authors.
+    topics (optional): Q(p,t)=1 and paper_topic_dict.
+    conflicts (optional): T(j,p)=1 iff paper p cannot be presented in session j, where j is one of session_ids.
+    .run() writes the bundle and returns a report with the rows, dropped rows, time and throughput per file.
+    '''
+
+    def __init__(self,
+                 papers_path,
+                 bids_path,
+                 authors_path,
+                 session_ids,
+                 track_ids,
+                 topics_path=None,
+                 conflicts_path=None,
+                 papers_columns=('paper', 'title'),
+                 bids_columns=('bidder', 'paper', 'bid'),
+                 authors_columns=('paper', 'author'),
+                 topics_columns=('paper', 'topic'),
+                 conflicts_columns=('paper', 'session'),
+                 bid_range=None,
+                 bid_map=None,
+                 bid_scaling='global',
+                 min_bid=1,
+                 chunksize=100000,
+                 sep=','):
+
+        self.paths = OrderedDict([('papers', papers_path), ('bids', bids_path), ('authors', authors_path),
+                                  ('topics', topics_path), ('conflicts', conflicts_path)])
+        self.columns = {'papers': list(papers_columns), 'bids': list(bids_columns), 'authors': list(authors_columns),
+                        'topics': list(topics_columns), 'conflicts': list(conflicts_columns)}
+        self.session_ids = list(session_ids)
+        self.track_ids = list(track_ids)
+        self.bid_range = bid_range
+        self.bid_map = bid_map
+        if bid_scaling not in ['global', 'bidder']:
+            raise ValueError(f'bid_scaling:{bid_scaling} must be global or bidder!')
+        self.bid_scaling = bid_scaling
+        self.min_bid = min_bid
+        self.chunksize = chunksize
+        self.sep = sep
+        self.id_maps = {name: IdMap() for name in ['paper', 'bidder', 'author', 'topic']}
+        self.arrays = OrderedDict() # arrays in the layout of the bundle
+        self.report = OrderedDict() # file -> rows, dropped rows, time, throughput
+
+
+    def chunks(self, name, paper_column=None):
+        # (dense ids of the papers, chunk) of a file, the report of the file is updated once all chunks are read
+        start = time.perf_counter()
+        rows = dropped = 0
+        paper_column = paper_column or self.columns[name][0]
+        for chunk in pd.read_csv(self.paths[name], usecols=self.columns[name], dtype=str, chunksize=self.chunksize,
+                                 sep=self.sep, keep_default_na=False):
+            rows += len(chunk)
+            papers = self.id_maps['paper'].encode(chunk[paper_column].str.strip(), add=name == 'papers')
+            known = papers > 0
+            dropped += int((~known).sum())
+            yield papers[known], chunk[known]
+        seconds = time.perf_counter() - start
+        self.report[name] = OrderedDict([('Rows', rows),
+                                         ('Dropped_Rows', dropped),
+                                         ('Time', seconds),
+                                         ('Rows_per_Second', rows/seconds if seconds > 0 else None),
+                                         ('Peak_RSS_MB', peak_rss_mb())])
+
+
+    def read_pairs(self, name, entity):
+        # (paper, entity) pairs of a file, e.g., (paper, author) from the authorships
+        papers, entities, external = [], [], []
+        for paper_chunk, chunk in self.chunks(name):
+            values = chunk[self.columns[name][1]].str.strip()
+            papers.append(paper_chunk)
+            entities.append(self.id_maps[entity].encode(values) if entity is not None else values.to_numpy())
+            external.append(values.to_numpy(dtype=str))
+        if not papers:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=str)
+        return np.concatenate(papers), np.concatenate(entities), np.concatenate(external)
+
+
+    def read_papers(self):
+        papers, titles = [], []
+        for paper_chunk, chunk in self.chunks('papers'):
+            papers.append(paper_chunk)
+            titles.append(chunk[self.columns['papers'][1]].to_numpy(dtype=str))
+        # for duplicate paper ids the first title is kept
+        first = np.unique(np.concatenate(papers), return_index=True)[1] if papers else np.zeros(0, dtype=np.int64)
+        self.arrays['paper_title_dict'] = np.concatenate(titles)[first] if titles else np.zeros(0, dtype=str)
+
+
+    def read_bids(self):
+        bidder_column, _, bid_column = self.columns['bids']
+        bidders, papers, bids = [], [], []
+        invalid = 0
+        for paper_chunk, chunk in self.chunks('bids', paper_column=self.columns['bids'][1]):
+            if self.bid_map is not None:
+                values = chunk[bid_column].str.strip().map(self.bid_map)
+            else:
+                values = pd.to_numeric(chunk[bid_column], errors='coerce')
+            valid = values.notna().to_numpy()
+            invalid += int((~valid).sum())
+            bidders.append(self.id_maps['bidder'].encode(chunk[bidder_column].str.strip()[valid]))
+            papers.append(paper_chunk[valid])
+            bids.append(values[valid].to_numpy(dtype=float))
+        self.report['bids']['Dropped_Rows'] += invalid
+        bidders, papers, bids = (np.concatenate(x) if x else np.zeros(0) for x in [bidders, papers, bids])
+        bidders, papers, bids = unique_last(bidders.astype(np.int64), papers.astype(np.int64), bids, len(self.id_maps['paper']))
+
+        # scale to [0,100]
+        if self.bid_map is None and len(bids) > 0:
+            if self.bid_range is not None:
+                low, high = self.bid_range
+                bids = (bids-low)/(high-low)*100 if high > low else np.full(len(bids), 100.0)
+            else:
+                low, high = bids.min(), bids.max()
+                bids = self.min_bid + (bids-low)/(high-low)*(100-self.min_bid) if high > low else np.full(len(bids), 100.0)
+        if self.bid_scaling == 'bidder' and len(bids) > 0:
+            largest = np.zeros(len(self.id_maps['bidder'])+1)
+            np.maximum.at(largest, bidders, bids)
+            bids = np.divide(bids*100, largest[bidders], out=np.zeros(len(bids)), where=largest[bidders] > 0)
+        keep = bids > 0
+        self.arrays['U_rows'] = bidders[keep]-1
+        self.arrays['U_cols'] = papers[keep]-1
+        self.arrays['U_values'] = np.clip(bids[keep], 0, 100)
+
+
+    def read_authors(self):
+        papers, authors, external = self.read_pairs('authors', 'author')
+        papers, authors, external = unique_last(papers, authors, external, len(self.id_maps['author']))
+        ptr, values = csr(papers, external, len(self.id_maps['paper']))
+        self.arrays['paper_author_dict_ptr'] = ptr
+        self.arrays['paper_author_dict_values'] = values
+        # remove authors with less than two papers, since they are not constrained by session conflicts
+        keep = np.bincount(authors, minlength=len(self.id_maps['author'])+1)[authors] >= 2
+        self.arrays['M_rows'] = authors[keep]-1
+        self.arrays['M_cols'] = papers[keep]-1
+        self.arrays['M_values'] = np.ones(int(keep.sum()), dtype=np.int64)
+
+
+    def read_topics(self):
+        if self.paths['topics'] is None:
+            papers, topics, external = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=str)
+        else:
+            papers, topics, external = self.read_pairs('topics', 'topic')
+            papers, topics, external = unique_last(papers, topics, external, len(self.id_maps['topic']))
+        ptr, values = csr(papers, external, len(self.id_maps['paper']))
+        self.arrays['paper_topic_dict_ptr'] = ptr
+        self.arrays['paper_topic_dict_values'] = values
+        self.arrays['Q_rows'] = papers-1
+        self.arrays['Q_cols'] = topics-1
+        self.arrays['Q_values'] = np.ones(len(papers), dtype=np.int64)
+
+
+    def read_conflicts(self):
+        session_index = {str(j): n for n, j in enumerate(self.session_ids)}
+        sessions, papers = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if self.paths['conflicts'] is not None:
+            papers, sessions, _ = self.read_pairs('conflicts', None)
+            sessions = np.array([session_index.get(j, -1) for j in sessions], dtype=np.int64)
+            known = sessions >= 0
+            self.report['conflicts']['Dropped_Rows'] += int((~known).sum())
+            sessions, papers, _ = unique_last(sessions[known], papers[known], papers[known], len(self.id_maps['paper']))
+        self.arrays['T_rows'] = sessions
+        self.arrays['T_cols'] = papers-1
+        self.arrays['T_values'] = np.ones(len(papers), dtype=np.int64)
+
+
+    def run(self, path):
+        logging.info('')
+        logging.info('CSV INGEST')
+        start = time.perf_counter()
+        self.read_papers()
+        self.read_bids()
+        self.read_authors()
+        self.read_topics()
+        self.read_conflicts()
+
+        arrays = OrderedDict([('session_ids', np.array(self.session_ids)),
+                              ('track_ids', np.array(self.track_ids)),
+                              ('paper_ids', self.id_maps['paper'].ids),
+                              ('bidder_ids', self.id_maps['bidder'].ids),
+                              ('author_ids', self.id_maps['author'].ids),
+                              ('topic_ids', self.id_maps['topic'].ids)])
+        for name in ['U', 'M', 'T', 'Q']:
+            arrays[f'{name}_rows'] = self.arrays[f'{name}_rows'].astype(np.int32)
+            arrays[f'{name}_cols'] = self.arrays[f'{name}_cols'].astype(np.int32)
+            arrays[f'{name}_values'] = self.arrays[f'{name}_values']
+        for name in ['paper_title_dict', 'paper_author_dict_ptr', 'paper_author_dict_values', 'paper_topic_dict_ptr', 'paper_topic_dict_values']:
+            arrays[name] = self.arrays[name]
+        for name, id_map in self.id_maps.items():
+            arrays[f'{name}_external'] = id_map.external_ids
+        save_arrays(path, arrays)
+
+        self.report['total'] = OrderedDict([('Rows', sum(report['Rows'] for report in self.report.values())),
+                                            ('Dropped_Rows', sum(report['Dropped_Rows'] for report in self.report.values())),
+                                            ('Time', time.perf_counter() - start),
+                                            ('Peak_RSS_MB', peak_rss_mb())])
+        self.report['total']['Rows_per_Second'] = self.report['total']['Rows']/self.report['total']['Time']
+        logging.info(f'Papers:{len(self.id_maps["paper"])} | Bidders:{len(self.id_maps["bidder"])} | Authors:{len(self.id_maps["author"])} | Topics:{len(self.id_maps["topic"])}')
+        logging.info(f'U:{len(arrays["U_values"])} | M:{len(arrays["M_values"])} | T:{len(arrays["T_values"])} | Q:{len(arrays["Q_values"])}')
+        logging.info('\n'+pd.DataFrame(self.report).T.to_string())
+        logging.info(f'Saved instance bundle: {path}')
+        return self.report
+
+
+# %%
+if __name__ == '__main__':
+    # python ingest.py --papers papers.csv --bids bids.csv --authors authors.csv --sessions 6 --tracks 4 data_prepared/instance.npz
+    parser = argparse.ArgumentParser(description='Streaming ingest of CSV exports into an instance bundle.')
+    parser.add_argument('path', help='path of the instance bundle (.npz)')
+    parser.add_argument('--papers', required=True, help='CSV with the columns paper,title')
+    parser.add_argument('--bids', required=True, help='CSV with the columns bidder,paper,bid')
+    parser.add_argument('--authors', required=True, help='CSV with the columns paper,author')
+    parser.add_argument('--topics', help='CSV with the columns paper,topic')
+    parser.add_argument('--conflicts', help='CSV with the columns paper,session')
+    parser.add_argument('--sessions', type=int, required=True, help='number of sessions')
+    parser.add_argument('--tracks', type=int, required=True, help='number of tracks')
+    parser.add_argument('--bid_range', type=float, nargs=2, help='smallest and largest possible bid')
+    parser.add_argument('--bid_scaling', default='global', choices=['global', 'bidder'])
+    parser.add_argument('--min_bid', type=float, default=1, help='scaled value of the smallest bid if no bid_range is given')
+    parser.add_argument('--chunksize', type=int, default=100000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    CSVIngest(papers_path=args.papers,
+              bids_path=args.bids,
+              authors_path=args.authors,
+              topics_path=args.topics,
+              conflicts_path=args.conflicts,
+              session_ids=list(range(1, args.sessions+1)),
+              track_ids=list(range(1, args.tracks+1)),
+              bid_range=args.bid_range,
+              bid_scaling=args.bid_scaling,
+              min_bid=args.min_bid,
+              chunksize=args.chunksize).run(args.path)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Single-file instance bundle (.npz): id arrays and COO arrays of U, M, T and Q instead of 13 pickle files.
+
+@author: jakob
+"""
+
+
+# Libs
+from collections import OrderedDict
+import pickle as pkl
+import zipfile
+import struct
+import os
+import sys
+import numpy as np
+
+
+FORMAT_VERSION = 1
+ID_NAMES = ['session_ids', 'track_ids', 'paper_ids', 'bidder_ids', 'author_ids', 'topic_ids']
+# mapping -> id lists of the first and second key entry, e.g., U(b,p) with b in bidder_ids and p in paper_ids
+MAPPING_IDS = OrderedDict([('U', ('bidder_ids', 'paper_ids')),
+                           ('M', ('author_ids', 'paper_ids')),
+                           ('T', ('session_ids', 'paper_ids')),
+                           ('Q', ('paper_ids', 'topic_ids'))])
+PAPER_LIST_DICTS = ['paper_author_dict', 'paper_topic_dict']
+
+
+# %%
+def _id_array(name, ids):
+    # ids must be all integers or all strings, since the bundle is loaded without pickle
+    if all(isinstance(i, (int, np.integer)) and not isinstance(i, bool) for i in ids):
+        return np.array(ids, dtype=np.int64)
+    if all(isinstance(i, str) for i in ids):
+        return np.array(ids, dtype=str)
+    raise ValueError(f'{name} must be all integers or all strings!')
+
+
+def save_instance(path,
+                  session_ids,
+                  track_ids,
+                  paper_ids,
+                  bidder_ids,
+                  author_ids,
+                  topic_ids,
+                  U,
+                  M,
+                  T,
+                  Q,
+                  paper_title_dict=None,
+                  paper_author_dict=None,
+                  paper_topic_dict=None):
+
+    '''
+    Saves an instance as a single uncompressed .npz bundle, i.e., the id lists as arrays, each mapping U, M, T and Q
+    as COO arrays <name>_rows, <name>_cols (positions in the id lists) and <name>_values, the paper titles aligned
+    with paper_ids and the author and topic lists per paper as CSR arrays <name>_ptr and <name>_values.
+    '''
+
+    ids = OrderedDict([('session_ids', session_ids), ('track_ids', track_ids), ('paper_ids', paper_ids),
+                       ('bidder_ids', bidder_ids), ('author_ids', author_ids), ('topic_ids', topic_ids)])
+    arrays = OrderedDict()
+    for name, id_list in ids.items():
+        arrays[name] = _id_array(name, id_list)
+
+    for name, mapping in zip(MAPPING_IDS, [U, M, T, Q]):
+        row_index = {i: n for n, i in enumerate(ids[MAPPING_IDS[name][0]])}
+        col_index = {i: n for n, i in enumerate(ids[MAPPING_IDS[name][1]])}
+        arrays[f'{name}_rows'] = np.array([row_index[i] for i, _ in mapping.keys()], dtype=np.int32)
+        arrays[f'{name}_cols'] = np.array([col_index[i] for _, i in mapping.keys()], dtype=np.int32)
+        arrays[f'{name}_values'] = np.array(list(mapping.values()), dtype=float if any(isinstance(v, float) for v in mapping.values()) else np.int64)
+
+    if paper_title_dict is not None:
+        arrays['paper_title_dict'] = np.array([paper_title_dict.get(p, '') for p in paper_ids], dtype=str)
+    for name, paper_dict in zip(PAPER_LIST_DICTS, [paper_author_dict, paper_topic_dict]):
+        if paper_dict is not None:
+            values = [paper_dict.get(p, []) for p in paper_ids]
+            arrays[f'{name}_ptr'] = np.cumsum([0]+[len(v) for v in values], dtype=np.int64)
+            arrays[f'{name}_values'] = np.array([x for v in values for x in v], dtype=str)
+
+    save_arrays(path, arrays)
+
+
+def save_arrays(path,
+                arrays):
+    # save arrays which are already in the layout of save_instance (e.g. from ingest.py) as a bundle
+    np.savez(path, format_version=np.array(FORMAT_VERSION), **arrays)
+
+
+def _memmap_npz(path):
+    # memory-map the members of an uncompressed .npz file, i.e., .npy files stored in a zip archive
+    arrays = OrderedDict()
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{path} is compressed and cannot be memory-mapped!')
+            # local file header: 30 bytes, file name and extra field
+            f.seek(info.header_offset)
+            header = f.read(30)
+            offset = info.header_offset + 30 + struct.unpack('<H', header[26:28])[0] + struct.unpack('<H', header[28:30])[0]
+            f.seek(offset)
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-len('.npy')]
+            if int(np.prod(shape)) <= 1: # scalars and empty arrays cannot be memory-mapped
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+            else:
+                arrays[name] = np.memmap(f, dtype=dtype, mode='r', shape=shape, order='F' if fortran_order else 'C', offset=f.tell())
+    return arrays
+
+
+def load_arrays(path,
+                mmap=False):
+    # the arrays of a bundle (memory-mapped if mmap), e.g., for code that works on the COO arrays directly
+    if mmap:
+        arrays = _memmap_npz(path)
+    else:
+        with np.load(path, allow_pickle=False) as bundle:
+            arrays = OrderedDict((name, bundle[name]) for name in bundle.files)
+    if int(arrays['format_version']) > FORMAT_VERSION:
+        raise ValueError(f'{path} has format version {int(arrays["format_version"])}, only <= {FORMAT_VERSION} is supported!')
+    return arrays
+
+
+def load_instance(path,
+                  mmap=False):
+
+    '''
+    Loads a bundle written by save_instance and returns a dict with the inputs of the class QIP, i.e., session_ids,
+    track_ids, paper_ids, bidder_ids, author_ids, topic_ids (lists) and U, M, T, Q (dicts with tuple keys), and
+    paper_title_dict, paper_author_dict, paper_topic_dict if they are in the bundle.
+    '''
+
+    arrays = load_arrays(path, mmap=mmap)
+    instance = OrderedDict((name, arrays[name].tolist()) for name in ID_NAMES)
+    for name, (row_ids, col_ids) in MAPPING_IDS.items():
+        rows = np.asarray(arrays[f'{name}_rows'])
+        cols = np.asarray(arrays[f'{name}_cols'])
+        keys = zip(np.asarray(arrays[row_ids])[rows].tolist(), np.asarray(arrays[col_ids])[cols].tolist())
+        instance[name] = dict(zip(keys, arrays[f'{name}_values'].tolist()))
+
+    if 'paper_title_dict' in arrays:
+        instance['paper_title_dict'] = dict(zip(instance['paper_ids'], arrays['paper_title_dict'].tolist()))
+    for name in PAPER_LIST_DICTS:
+        if f'{name}_ptr' in arrays:
+            ptr, values = arrays[f'{name}_ptr'].tolist(), arrays[f'{name}_values'].tolist()
+            instance[name] = {p: values[ptr[n]:ptr[n+1]] for n, p in enumerate(instance['paper_ids'])}
+    return instance
+
+
+def load_pickles(data_path):
+    # the inputs saved as pickle files in a data folder (e.g. data_prepared), missing files are skipped
+    data = OrderedDict()
+    for name in ID_NAMES + list(MAPPING_IDS) + ['paper_title_dict'] + PAPER_LIST_DICTS:
+        filename = os.path.join(data_path, name+'.pkl')
+        if os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                data[name] = pkl.load(f)
+    return data
+
+
+def convert_pickles(data_path,
+                    path):
+    # convert the pickle files of a data folder (e.g. data_prepared) into a bundle
+    save_instance(path, **load_pickles(data_path))
+
+
+# %%
+if __name__ == '__main__':
+    # python instance_io.py data_prepared data_prepared.npz
+    convert_pickles(sys.argv[1], sys.argv[2])
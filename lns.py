@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Large neighbourhood search (LNS) around the CPLEX model for large conferences.
+
+@author: jakob
+"""
+
+
+# Libs
+import logging
+from collections import OrderedDict, defaultdict
+import json
+import os
+import time
+import random
+
+# own modules
+from qip import QIP
+from schedule_result import ScheduleResult
+from heuristics import greedy_allocation
+
+
+# %%
+class LNS(QIP):
+
+    '''
+    This implements the class LNS.
+    It builds the same model as the class QIP, but instead of solving it at once it starts from a feasible schedule
+    and repeatedly frees a neighbourhood of papers while all other papers are fixed to their (session,track) via
+    bounds of their x variables. Each subproblem is solved with a short time limit (MIP start: current schedule) and
+    improvements are accepted. Neighbourhoods:
+    'sessions': all papers of one or two random sessions,
+    'topic': the papers of a random topic and the other papers of their subsessions,
+    'co_bidders': the papers of a random bidder and of its co-bidders.
+
+    LNS specific QIP_parameters (all optional):
+    'lns_neighbourhoods' (list of the above), 'lns_policy' ('random', 'round_robin' or 'adaptive': roulette wheel
+    selection weighted by recent improvements), 'lns_size' (max number of freed papers of 'topic' and 'co_bidders',
+    default: papers of one session), 'lns_time_limit' (time limit per subproblem in seconds), 'seed'.
+    The parameter 'time_limit' is the total wall-clock budget.
+    '''
+
+    neighbourhood_names = ['sessions', 'topic', 'co_bidders']
+
+    def __init__(self,
+                 *args,
+                 initial_allocation=None,
+                 **kwargs):
+
+        super().__init__(*args, **kwargs)
+        self.name = 'LNS'
+        self.initial_allocation = initial_allocation # {paper_id:(session_id,track_id)}, if None the greedy heuristic is used
+        self.objective_value = None
+        self.lns_details = None
+        self.lns_trajectory = [] # one entry per LNS iteration
+
+
+    def build(self):
+        super().build()
+
+        # papers per topic and bidder, bidders per paper
+        self.topic_papers = defaultdict(list)
+        for p,t in self.Q.keys():
+            self.topic_papers[t].append(p)
+        self.bidder_papers = defaultdict(list)
+        self.paper_bidders = defaultdict(list)
+        for b,p in self.U.keys():
+            self.bidder_papers[b].append(p)
+            self.paper_bidders[p].append(b)
+
+
+    # %% neighbourhoods
+    def neighbourhood(self, name, allocation, rng, size):
+        # papers which are freed in the next LNS iteration
+        if name == 'sessions':
+            sessions = rng.sample(self.session_ids, min(rng.choice([1,2]), len(self.session_ids)))
+            return [p for p, (j,k) in allocation.items() if j in sessions]
+
+        if name == 'topic':
+            topics = [t for t, papers in self.topic_papers.items() if len(papers) > 1]
+            if not topics:
+                return []
+            papers = list(self.topic_papers[rng.choice(topics)])
+            rng.shuffle(papers)
+            papers = papers[:size]
+            subsessions = set(allocation[p] for p in papers)
+            mates = [p for p, v in allocation.items() if v in subsessions and p not in papers]
+            rng.shuffle(mates)
+            return papers + mates[:size-len(papers)]
+
+        if name == 'co_bidders':
+            bidders = list(self.bidder_papers.keys())
+            if not bidders:
+                return []
+            papers = []
+            group = [rng.choice(bidders)]
+            while group and len(papers) < size:
+                b = group.pop(0)
+                new_papers = [p for p in self.bidder_papers[b] if p not in papers]
+                rng.shuffle(new_papers)
+                papers += new_papers[:size-len(papers)]
+                group += [o for p in new_papers for o in self.paper_bidders[p] if o != b and o not in group]
+            return papers
+
+        raise NotImplementedError(f'neighbourhood:{name} not implemented!')
+
+
+    def select_neighbourhood(self, policy, names, weights, iteration, rng):
+        if policy == 'random':
+            return rng.choice(names)
+        if policy == 'round_robin':
+            return names[iteration % len(names)]
+        if policy == 'adaptive':
+            return rng.choices(names, weights=[weights[name] for name in names])[0]
+        raise NotImplementedError(f'lns_policy:{policy} not implemented!')
+
+
+    # %% solve
+    def solve_subproblem(self, allocation, papers, time_limit, log_output):
+        # fix all papers except papers to their (session,track) and solve with the current allocation as MIP start
+        free = set(papers)
+        fixed = [self.x[(p,)+allocation[p]] for p in self.paper_ids if p not in free]
+        for x in fixed:
+            x.lb = 1
+        try:
+            self.QIP.clear_mip_starts()
+            self.add_mip_start_from_allocation(allocation)
+            self.QIP.set_time_limit(time_limit)
+            Sol = self.QIP.solve(log_output=log_output)
+        finally:
+            # the model is shared by all iterations, i.e., the fixings must be undone also if the solve raises
+            for x in fixed:
+                x.lb = 0
+        if not Sol:
+            return None
+        keys = list(self.x.keys())
+        return OrderedDict((p, (j,k)) for (p, j, k), value in zip(keys, Sol.get_values([self.x[key] for key in keys])) if value > 0.5)
+
+
+    def solve(self):
+        if not self.QIP_built:
+            raise ValueError('LNS build-status:{QIP_built}, first call .build()!')
+
+        log_output = self.QIP_parameters['log_output']
+        time_limit = self.QIP_parameters['time_limit']
+        names = self.QIP_parameters.get('lns_neighbourhoods') or self.neighbourhood_names
+        policy = self.QIP_parameters.get('lns_policy', 'adaptive')
+        size = self.QIP_parameters.get('lns_size') or len(self.track_ids)*self.track_session_capacity
+        subproblem_time_limit = self.QIP_parameters.get('lns_time_limit', 10)
+        rng = random.Random(self.QIP_parameters.get('seed', 1))
+        if time_limit is None:
+            raise ValueError('LNS needs a time_limit!')
+
+        logging.info('')
+        logging.info('SOLVE LNS')
+        logging.info(self.log_sep)
+        self.set_QIP_parameters()
+        logging.info('LNS neighbourhoods %s', names)
+        logging.info('LNS policy %s', policy)
+        logging.info('LNS size %s', size)
+        logging.info('LNS subproblem time limit %s', subproblem_time_limit)
+
+        # initial allocation: given, previous solution or greedy heuristic
+        start = time.perf_counter()
+        allocation = self.initial_allocation or self.allocation
+        if not allocation:
+            allocation = greedy_allocation(session_ids=self.session_ids,
+                                           track_ids=self.track_ids,
+                                           paper_ids=self.paper_ids,
+                                           track_session_capacity=self.track_session_capacity,
+                                           U=self.U,
+                                           M=self.M,
+                                           T=self.T,
+                                           Q=self.Q,
+                                           bidder_cost=self.bidder_cost,
+                                           topic_cost=self.topic_cost,
+                                           topic_utility=self.topic_utility)
+            if allocation is None:
+                raise RuntimeError('Greedy heuristic found no feasible initial allocation!')
+        allocation = self.canonicalize_allocation(allocation)
+        score = self.score(allocation)
+        if not score['Feasible']:
+            raise ValueError(f'Initial allocation is not feasible: {score["Violations"]}')
+        objective = score['Objective_Value']
+        logging.info(f'Initial objective value {objective}')
+
+        # LNS iterations until the wall-clock budget is used
+        weights = OrderedDict((name, 1.0) for name in names)
+        iteration = 0
+        self.lns_trajectory = []
+        while time.perf_counter() - start < time_limit:
+            iteration_start = time.perf_counter()
+            name = self.select_neighbourhood(policy, names, weights, iteration, rng)
+            papers = self.neighbourhood(name, allocation, rng, size)
+            iteration += 1
+
+            new_allocation = self.solve_subproblem(allocation, papers, min(subproblem_time_limit, max(time_limit-(time.perf_counter()-start), 1)), log_output)
+            improvement = 0
+            if new_allocation is not None:
+                new_objective = self.score(new_allocation)['Objective_Value']
+                if new_objective > objective + 1e-6:
+                    improvement = new_objective - objective
+                    allocation, objective = new_allocation, new_objective
+            weights[name] = 0.8*weights[name] + 0.2*(1.0 + improvement/max(abs(objective), 1e-10)*100 if improvement > 0 else 0.1)
+
+            self.lns_trajectory.append({'Iteration': iteration,
+                                        'Neighbourhood': name,
+                                        'Papers': len(papers),
+                                        'Objective_Value': objective,
+                                        'Improvement': improvement,
+                                        'Time': time.perf_counter() - start})
+            logging.info(f'LNS iteration {iteration}: {name} ({len(papers)} papers) | objective {objective} | improvement {improvement} | {round(time.perf_counter()-iteration_start,2)} sec')
+
+        self.soltime = time.perf_counter() - start
+        self.objective_value = objective
+
+        # set the allocation, schedule and attendance
+        self.allocation = OrderedDict()
+        self.schedule = OrderedDict()
+        for j,k in self.session_track_tuple_ids:
+            for p in self.session_track_paper_ids[(j,k)]:
+                if allocation.get(p) == (j,k):
+                    self.allocation[p] = (j,k)
+                    self.schedule.setdefault((j,k), []).append(p)
+        self.calc_attendance()
+        if self.symmetry_breaking:
+            self.relabel_tracks()
+
+        self.lns_details = {'Problem': 'LNS',
+                            'Status': 'time limit',
+                            'Time': self.soltime,
+                            'N_Iter': iteration,
+                            'N_Improved': sum(1 for entry in self.lns_trajectory if entry['Improvement'] > 0),
+                            'Neighbourhood_Weights': dict(weights),
+                            'Objective_Value': self.objective_value}
+        lns_solve_details = self.log_solve_details()
+
+        if self.save_results:
+            json.dump(lns_solve_details, open(os.path.join(self.savefolder,'lns_solve_details_'+self.QIP_date_time+'.json'),'w'))
+            json.dump(self.lns_trajectory, open(os.path.join(self.savefolder,'lns_trajectory_'+self.QIP_date_time+'.json'),'w'))
+            ScheduleResult.from_allocation(self.session_ids, self.track_ids, self.paper_ids, self.allocation, self.attendance).save(os.path.join(self.savefolder,'lns_schedule_'+self.QIP_date_time+'.npz'))
+
+        return self.schedule
+
+
+    def calc_attendance(self):
+        self.attendance = self.score()['Attendance']
+
+
+    def log_solve_details(self):
+        details = self.lns_details
+        logging.info('')
+        logging.info('SOLVE DETAILS:')
+        logging.info('Problem : %s', details['Problem'])
+        logging.info('Status  : %s', details['Status'])
+        logging.info('Time    : %s sec', round(details['Time']))
+        logging.info('N. Iter : %s', details['N_Iter'])
+        logging.info('Improved: %s', details['N_Improved'])
+        logging.info('Weights : %s', details['Neighbourhood_Weights'])
+        logging.info('Objective Value: %s', details['Objective_Value'])
+        return details
+
+
+    def check_paper_allocation(self,
+                               verbose=0):
+        violations = self.score()['Violations']
+        for name, violated in violations.items():
+            if violated:
+                raise RuntimeError(f'{name}: {violated}')
+        logging.info(f'{len(self.paper_ids)} Papers allocated')
+        logging.info('')
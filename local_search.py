@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+Solver-free local search engine (simulated annealing) for very large conferences.
+
+@author: jakob
+"""
+
+
+# Libs
+import logging
+from collections import OrderedDict, defaultdict
+import json
+import os
+import time
+import math
+import numpy as np
+
+# own modules
+from qip import QIP
+from schedule_result import ScheduleResult
+from heuristics import greedy_allocation
+
+
+# %%
+class LocalSearch(QIP):
+
+    '''
+    This implements the class LocalSearch.
+    This class optimizes the same objective as the class QIP without building a docplex model: simulated annealing
+    over move and swap neighborhoods of papers, where each move is evaluated incrementally via delta updates of
+    per-(bidder,session,track) and per-(topic,session,track) sums. It takes the same inputs as QIP and produces the
+    same allocation, schedule and attendance, such that create_schedule() keeps working.
+
+    Local search specific QIP_parameters (all optional):
+    'seed', 'max_iterations', 'initial_temperature' (None: estimated from random moves), 'final_temperature',
+    'move_probability' (share of moves vs. swaps, only used for paper_distribution 'upper_bound').
+    The parameter 'time_limit' is shared with the QIP.
+    '''
+
+    def __init__(self,
+                 *args,
+                 initial_allocation=None,
+                 **kwargs):
+
+        super().__init__(*args, **kwargs)
+        if self.presolve:
+            raise ValueError('LocalSearch works on the original bidders and topics, presolve applies only to the QIP!')
+        self.name = 'LocalSearch'
+        self.initial_allocation = initial_allocation # {paper_id:(session_id,track_id)}, if None the greedy heuristic is used
+        self.objective_value = None
+        self.local_search_details = None
+
+
+    def build(self):
+        self.print_input_info()
+
+        logging.info('')
+        logging.info('BUILD LOCAL SEARCH')
+        logging.info(self.log_sep)
+
+        self.n_tracks = len(self.track_ids)
+        self.paper_index = {p: i for i, p in enumerate(self.paper_ids)}
+        self.session_index = {j: i for i, j in enumerate(self.session_ids)}
+        self.track_index = {k: i for i, k in enumerate(self.track_ids)}
+        bidder_index = {b: i for i, b in enumerate(self.bidder_ids)}
+        topic_index = {t: i for i, t in enumerate(self.topic_ids)}
+
+        # per paper arrays of bids (bidder index, U(b,p)) and topics, per paper lists of authors
+        self.paper_bidders, self.paper_bids = self._paper_arrays([(self.paper_index[p], bidder_index[b], u) for (b,p), u in self.U.items()])
+        self.paper_topics, self.paper_topic_counts = self._paper_arrays([(self.paper_index[p], topic_index[t], 1) for p,t in self.Q.keys()])
+        self.paper_authors = [[] for _ in self.paper_ids]
+        for a,p in self.M.keys():
+            self.paper_authors[self.paper_index[p]].append(a)
+
+        # allowed[paper, session]==False iff T(j,p)==1
+        self.allowed = np.ones((len(self.paper_ids), len(self.session_ids)), dtype=bool)
+        for j,p in self.T.keys():
+            if p in self.paper_index and j in self.session_index:
+                self.allowed[self.paper_index[p], self.session_index[j]] = False
+
+        # state: sums of bids per (bidder,session,track), paper counts per (topic,session,track) and the best track
+        # value per (bidder,session) and (topic,session); papers per (author,session,track)
+        self.bid_sum = np.zeros((len(self.bidder_ids), len(self.session_ids), self.n_tracks))
+        self.best_bid_sum = np.zeros((len(self.bidder_ids), len(self.session_ids)))
+        self.topic_count = np.zeros((len(self.topic_ids), len(self.session_ids), self.n_tracks))
+        self.best_topic_count = np.zeros((len(self.topic_ids), len(self.session_ids)))
+        self.author_count = defaultdict(int)
+        self.slot_of = [None]*len(self.paper_ids) # paper index -> (session index, track index)
+        self.slot_papers = [[[] for _ in self.track_ids] for _ in self.session_ids]
+
+        self.QIP_built = True
+        logging.info('Succesfully Built Local Search')
+        self.log_build_details()
+
+
+    def _paper_arrays(self, entries):
+        # list of (paper index, entity index, value) -> per paper entity index arrays and value arrays
+        indices = [[] for _ in self.paper_ids]
+        values = [[] for _ in self.paper_ids]
+        for i, e, v in entries:
+            indices[i].append(e)
+            values[i].append(v)
+        return [np.array(e, dtype=np.int64) for e in indices], [np.array(v, dtype=float) for v in values]
+
+
+    def log_build_details(self):
+        logging.info('')
+        logging.info('BUILD DETAILS:')
+        logging.info(f'papers:{len(self.paper_ids)}')
+        logging.info(f'subsessions:{len(self.session_track_tuple_ids)}')
+        logging.info(f'bids:{len(self.U)}')
+        logging.info(f'paper-topics:{len(self.Q)}')
+        logging.info(f'paper-authors:{len(self.M)}')
+        logging.info(f'state-size:{self.bid_sum.nbytes+self.best_bid_sum.nbytes+self.topic_count.nbytes+self.best_topic_count.nbytes} bytes')
+
+
+    # %% incremental evaluation
+    def _families(self, i):
+        # (state, best, rows, values, scale, cost) of the bidders and topics of paper index i
+        return [(self.bid_sum, self.best_bid_sum, self.paper_bidders[i], self.paper_bids[i], 1, self.bidder_cost),
+                (self.topic_count, self.best_topic_count, self.paper_topics[i], self.paper_topic_counts[i], self.topic_utility, self.topic_cost)]
+
+
+    def move_delta(self, i, j_to, k_to):
+        # objective delta of moving paper index i to (session index, track index), i.e., a bidder (topic) attends the
+        # best track per session if it beats the cost
+        j_from, k_from = self.slot_of[i]
+        delta = 0
+        for state, best, rows, values, scale, cost in self._families(i):
+            if len(rows) == 0:
+                continue
+            block = state[rows, j_from, :]
+            block[:, k_from] -= values
+            if j_to == j_from:
+                block[:, k_to] += values
+                delta += (np.maximum(0, block.max(axis=1)*scale-cost) - np.maximum(0, best[rows, j_from]*scale-cost)).sum()
+            else:
+                best_to = best[rows, j_to]
+                new_best_to = np.maximum(best_to, state[rows, j_to, k_to]+values)
+                delta += (np.maximum(0, block.max(axis=1)*scale-cost) - np.maximum(0, best[rows, j_from]*scale-cost)).sum()
+                delta += (np.maximum(0, new_best_to*scale-cost) - np.maximum(0, best_to*scale-cost)).sum()
+        return delta
+
+
+    def move(self, i, j_to, k_to):
+        # move paper index i to (session index, track index) (or allocate it if it is not allocated yet)
+        if self.slot_of[i] is not None:
+            j_from, k_from = self.slot_of[i]
+            for state, best, rows, values, scale, cost in self._families(i):
+                state[rows, j_from, k_from] -= values
+                best[rows, j_from] = state[rows, j_from, :].max(axis=1)
+            for a in self.paper_authors[i]:
+                self.author_count[(a, j_from, k_from)] -= 1
+            self.slot_papers[j_from][k_from].remove(i)
+        for state, best, rows, values, scale, cost in self._families(i):
+            state[rows, j_to, k_to] += values
+            best[rows, j_to] = np.maximum(best[rows, j_to], state[rows, j_to, k_to])
+        for a in self.paper_authors[i]:
+            self.author_count[(a, j_to, k_to)] += 1
+        self.slot_papers[j_to][k_to].append(i)
+        self.slot_of[i] = (j_to, k_to)
+
+
+    def is_allowed(self, i, j_to, k_to, ignore=None):
+        # time conflicts and author single-track rule for paper index i in (session index, track index), where the
+        # papers of the authors of paper index i (and of paper index ignore) are not counted
+        if not self.allowed[i, j_to]:
+            return False
+        for a in self.paper_authors[i]:
+            for k in range(self.n_tracks):
+                if k == k_to:
+                    continue
+                n = self.author_count[(a, j_to, k)]
+                for o in (i, ignore):
+                    if o is not None and self.slot_of[o] == (j_to, k) and a in self.paper_authors[o]:
+                        n -= 1
+                if n > 0:
+                    return False
+        return True
+
+
+    def calc_objective(self):
+        return (np.maximum(0, self.bid_sum.max(axis=2)-self.bidder_cost).sum()
+                + np.maximum(0, self.topic_count.max(axis=2)*self.topic_utility-self.topic_cost).sum())
+
+
+    # %% simulated annealing
+    def _random_move(self, rng, exact):
+        # random move of a paper to a subsession with free capacity or random swap of two papers
+        i = int(rng.integers(len(self.paper_ids)))
+        j_to, k_to = int(rng.integers(len(self.session_ids))), int(rng.integers(self.n_tracks))
+        if self.slot_of[i] == (j_to, k_to):
+            return None
+        papers_to = self.slot_papers[j_to][k_to]
+        if not exact and len(papers_to) < self.track_session_capacity and rng.random() < self.move_probability:
+            return i, j_to, k_to, None
+        if len(papers_to) == 0:
+            return None
+        return i, j_to, k_to, papers_to[int(rng.integers(len(papers_to)))]
+
+
+    def _is_feasible(self, i, j_to, k_to, o):
+        if o is None:
+            return self.is_allowed(i, j_to, k_to)
+        j_from, k_from = self.slot_of[i]
+        if not self.is_allowed(i, j_to, k_to, ignore=o):
+            return False
+        if not self.is_allowed(o, j_from, k_from, ignore=i):
+            return False
+        # authors of both papers: i is in (j_to,k_to) and o in (j_from,k_from) after the swap
+        if j_from == j_to and set(self.paper_authors[i]) & set(self.paper_authors[o]):
+            return False
+        return True
+
+
+    def _move_or_swap(self, i, j_to, k_to, o, temperature, rng):
+        # evaluate and (if accepted) apply a move of paper index i or a swap of paper indices i and o
+        if o is None:
+            delta = self.move_delta(i, j_to, k_to)
+            if delta >= 0 or rng.random() < math.exp(delta/temperature):
+                self.move(i, j_to, k_to)
+                return True, delta
+            return False, delta
+
+        # swap = move of i followed by move of o
+        j_from, k_from = self.slot_of[i]
+        delta = self.move_delta(i, j_to, k_to)
+        self.move(i, j_to, k_to)
+        delta += self.move_delta(o, j_from, k_from)
+        if delta >= 0 or rng.random() < math.exp(delta/temperature):
+            self.move(o, j_from, k_from)
+            return True, delta
+        self.move(i, j_from, k_from)
+        return False, delta
+
+
+    def solve(self):
+        if not self.QIP_built:
+            raise ValueError('Local search build-status:{QIP_built}, first call .build()!')
+
+        time_limit = self.QIP_parameters['time_limit']
+        max_iterations = self.QIP_parameters.get('max_iterations')
+        initial_temperature = self.QIP_parameters.get('initial_temperature')
+        final_temperature = self.QIP_parameters.get('final_temperature', 0.01)
+        self.move_probability = self.QIP_parameters.get('move_probability', 0.5)
+        rng = np.random.default_rng(self.QIP_parameters.get('seed', 1))
+        exact = self.paper_distribution == 'exact'
+        if time_limit is None and max_iterations is None:
+            raise ValueError('Local search needs a time_limit or max_iterations!')
+
+        logging.info('')
+        logging.info('SOLVE LOCAL SEARCH')
+        logging.info(self.log_sep)
+        logging.info('Local search time limit of %s', time_limit)
+        logging.info('Local search max iterations %s', max_iterations)
+
+        # initial allocation
+        start = time.perf_counter()
+        allocation = self.initial_allocation
+        if allocation is None:
+            allocation = greedy_allocation(session_ids=self.session_ids,
+                                           track_ids=self.track_ids,
+                                           paper_ids=self.paper_ids,
+                                           track_session_capacity=self.track_session_capacity,
+                                           U=self.U,
+                                           M=self.M,
+                                           T=self.T,
+                                           Q=self.Q,
+                                           bidder_cost=self.bidder_cost,
+                                           topic_cost=self.topic_cost,
+                                           topic_utility=self.topic_utility)
+            if allocation is None:
+                raise RuntimeError('Greedy heuristic found no feasible initial allocation!')
+        for p, (j,k) in allocation.items():
+            self.move(self.paper_index[p], self.session_index[j], self.track_index[k])
+        objective = self.calc_objective()
+        logging.info(f'Initial objective value {objective} in {round(time.perf_counter()-start,2)} sec')
+
+        # estimate initial temperature from the deltas of random feasible moves
+        if initial_temperature is None:
+            deltas = []
+            for _ in range(1000):
+                candidate = self._random_move(rng, exact)
+                if candidate is not None and self._is_feasible(*candidate):
+                    i, j_to, k_to, o = candidate
+                    accepted, delta = self._move_or_swap(i, j_to, k_to, o, 1e-12, rng) if o is not None else (False, self.move_delta(i, j_to, k_to))
+                    if accepted:
+                        objective += delta
+                    deltas.append(abs(delta))
+            initial_temperature = max(np.mean(deltas) if deltas else 1, 1e-6)
+        logging.info('Local search initial temperature %s', initial_temperature)
+
+        # simulated annealing with geometric cooling over the time or iteration budget
+        best_objective, best_slot_of = objective, list(self.slot_of)
+        iteration, n_accepted, n_improved = 0, 0, 0
+        temperature = initial_temperature
+        start = time.perf_counter()
+        while True:
+            if iteration % 1000 == 0:
+                elapsed = time.perf_counter() - start
+                progress = max(elapsed/time_limit if time_limit is not None else 0,
+                               iteration/max_iterations if max_iterations is not None else 0)
+                if progress >= 1:
+                    break
+                temperature = initial_temperature*(final_temperature/initial_temperature)**progress
+            iteration += 1
+
+            candidate = self._random_move(rng, exact)
+            if candidate is None or not self._is_feasible(*candidate):
+                continue
+            accepted, delta = self._move_or_swap(*candidate, temperature, rng)
+            if accepted:
+                objective += delta
+                n_accepted += 1
+                if objective > best_objective + 1e-9:
+                    best_objective, best_slot_of = objective, list(self.slot_of)
+                    n_improved += 1
+
+        self.soltime = time.perf_counter() - start
+
+        # restore best allocation
+        for i, slot in enumerate(best_slot_of):
+            if self.slot_of[i] != slot:
+                self.move(i, *slot)
+        self.objective_value = self.calc_objective()
+
+        self.local_search_details = {'Problem': 'LocalSearch',
+                                     'Status': 'iteration limit' if max_iterations is not None and iteration >= max_iterations else 'time limit',
+                                     'Time': self.soltime,
+                                     'N_Iter': iteration,
+                                     'N_Accepted': n_accepted,
+                                     'N_Improved': n_improved,
+                                     'Moves_Per_Sec': iteration/self.soltime if self.soltime > 0 else None,
+                                     'Initial_Temperature': initial_temperature,
+                                     'Final_Temperature': temperature,
+                                     'Objective_Value': self.objective_value}
+        ls_solve_details = self.log_solve_details()
+
+        # set the allocation, schedule and attendance
+        self.allocation = OrderedDict()
+        self.schedule = OrderedDict()
+        for j,k in self.session_track_tuple_ids:
+            for i in sorted(self.slot_papers[self.session_index[j]][self.track_index[k]]):
+                p = self.paper_ids[i]
+                self.allocation[p] = (j,k)
+                self.schedule.setdefault((j,k), []).append(p)
+        self.calc_attendance()
+
+        if self.save_results:
+            json.dump(ls_solve_details, open(os.path.join(self.savefolder,'local_search_solve_details_'+self.QIP_date_time+'.json'),'w'))
+            ScheduleResult.from_allocation(self.session_ids, self.track_ids, self.paper_ids, self.allocation, self.attendance).save(os.path.join(self.savefolder,'local_search_schedule_'+self.QIP_date_time+'.npz'))
+
+        return self.schedule
+
+
+    def calc_attendance(self):
+        # a bidder attends the best track per session if it beats the bidder cost
+        best_track = self.bid_sum.argmax(axis=2)
+        attends = self.bid_sum.max(axis=2) - self.bidder_cost > 0
+        attendance = np.zeros((len(self.session_ids), self.n_tracks), dtype=int)
+        np.add.at(attendance, (np.nonzero(attends)[1], best_track[attends]), 1)
+        self.attendance = OrderedDict(((j,k), int(attendance[self.session_index[j], self.track_index[k]]))
+                                      for j,k in self.session_track_tuple_ids)
+
+
+    def log_solve_details(self):
+        details = self.local_search_details
+        logging.info('')
+        logging.info('SOLVE DETAILS:')
+        logging.info('Problem : %s', details['Problem'])
+        logging.info('Status  : %s', details['Status'])
+        logging.info('Time    : %s sec', round(details['Time']))
+        logging.info('N. Iter : %s', details['N_Iter'])
+        logging.info('Accepted: %s', details['N_Accepted'])
+        logging.info('Improved: %s', details['N_Improved'])
+        logging.info('Moves/s : %s', round(details['Moves_Per_Sec']) if details['Moves_Per_Sec'] else None)
+        logging.info('Objective Value: %s', details['Objective_Value'])
+        return details
+
+
+    def check_paper_allocation(self,
+                               verbose=0):
+        for p in self.paper_ids:
+            if verbose > 0:
+                logging.info(f'PaperID:{p} allocated:{p in self.allocation}')
+            if p not in self.allocation:
+                raise RuntimeError(f'Paper{p} was not allocated!')
+        for j,k in self.session_track_tuple_ids:
+            n_papers = len(self.schedule.get((j,k), []))
+            if n_papers > self.track_session_capacity or (self.paper_distribution == 'exact' and n_papers != self.track_session_capacity):
+                raise RuntimeError(f'Session{j} Track{k} has {n_papers} papers!')
+        for i in range(len(self.paper_ids)):
+            if not self.is_allowed(i, *self.slot_of[i]):
+                raise RuntimeError(f'Paper{self.paper_ids[i]} violates a time conflict or the author single-track rule!')
+        logging.info(f'{len(self.paper_ids)} Papers allocated')
+        logging.info('')
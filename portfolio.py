@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel portfolio of independent QIP solves with different CPLEX parameter sets in a process pool.
+
+@author: jakob
+"""
+
+
+# Libs
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Manager
+from queue import Empty
+import json
+import os
+import time
+from docplex.mp.progress import ProgressListener, ProgressClock
+
+# own modules
+from qip import QIP
+from schedule_result import ScheduleResult
+
+
+# %%
+def set_cplex_parameter(model, name, value):
+    # set a CPLEX parameter given by its dotted name, e.g., 'emphasis.mip' or 'randomseed'
+    parameter = model.parameters
+    for attribute in name.split('.'):
+        parameter = getattr(parameter, attribute)
+    parameter.set(value)
+
+
+class PortfolioListener(ProgressListener):
+
+    '''
+    Records the trajectory (time, objective, best bound, gap) of a portfolio worker, sends new incumbents and bounds
+    to the result queue and aborts the search once the stop event is set.
+    '''
+
+    def __init__(self, worker, result_queue, stop_event):
+        super().__init__(ProgressClock.All)
+        self.worker = worker
+        self.result_queue = result_queue
+        self.stop_event = stop_event
+        self.trajectory = []
+
+    def notify_progress(self, progress_data):
+        if self.stop_event.is_set():
+            self.abort()
+            return
+        if not progress_data.has_incumbent:
+            return
+        point = (progress_data.time, progress_data.current_objective, progress_data.best_bound, progress_data.mip_gap)
+        if not self.trajectory or self.trajectory[-1][1:] != point[1:]:
+            self.trajectory.append(point)
+            self.result_queue.put((self.worker, 'progress', point))
+
+
+def solve_worker(worker, QIP_kwargs, cplex_parameters, result_queue, stop_event):
+    # build and solve the QIP with the given CPLEX parameters, returns the schedule and the trajectory of the worker
+    QIP_instance = QIP(**QIP_kwargs)
+    QIP_instance.build()
+    for name, value in cplex_parameters.items():
+        set_cplex_parameter(QIP_instance.QIP, name, value)
+    listener = PortfolioListener(worker, result_queue, stop_event)
+    QIP_instance.QIP.add_progress_listener(listener)
+
+    start = time.perf_counter()
+    try:
+        QIP_instance.solve()
+    except Exception as error: # e.g. aborted before an incumbent was found
+        logging.info(f'Worker {worker} failed: {error}')
+    details = QIP_instance.QIP.get_solve_details()
+    solution = QIP_instance.QIP.solution
+    result = {'Worker': worker,
+              'CPLEX_Parameters': cplex_parameters,
+              'Status': details.status if details is not None else None,
+              'Time': time.perf_counter() - start,
+              'Objective_Value': solution.objective_value if solution else None,
+              'Best_Bound': details.best_bound if details is not None and solution else None,
+              'Relative_Gap': details.mip_relative_gap if details is not None and solution else None,
+              'Trajectory': listener.trajectory,
+              'Allocation': dict(QIP_instance.allocation) if solution else None,
+              'Schedule': dict(QIP_instance.schedule) if solution else None,
+              'Attendance': dict(QIP_instance.attendance) if solution else None}
+    result_queue.put((worker, 'done', (result['Objective_Value'], result['Best_Bound'])))
+    return result
+
+
+# %%
+class Portfolio(QIP):
+
+    '''
+    This implements the class Portfolio.
+    It launches independent solves of the same QIP in a process pool, each with a different CPLEX parameter set from
+    the QIP parameter 'portfolio' (a list of dicts with dotted CPLEX parameter names, e.g.,
+    [{'randomseed': 1}, {'randomseed': 2, 'emphasis.mip': 1}]). Workers send their incumbents and bounds to a result
+    queue; as soon as the best incumbent and the best bound over all workers are within mip_relative_gap (or one
+    worker finishes within its gap), all other workers are stopped. The best schedule and the trajectories
+    (time, objective, best bound, gap) of all workers are returned.
+    '''
+
+    def __init__(self,
+                 **kwargs):
+
+        super().__init__(**kwargs)
+        self.name = 'Portfolio'
+        self.QIP_kwargs = kwargs
+        self.portfolio_results = []
+        self.portfolio_details = None
+
+
+    def build(self):
+        # every worker builds its own QIP
+        self.print_input_info()
+        self.portfolio = self.QIP_parameters.get('portfolio') or [{'randomseed': i} for i in range(os.cpu_count())]
+        self.n_workers = self.QIP_parameters.get('portfolio_workers') or len(self.portfolio)
+        threads = max(1, os.cpu_count() // self.n_workers)
+        self.portfolio = [OrderedDict([('threads', threads)] + list(cplex_parameters.items())) for cplex_parameters in self.portfolio]
+        self.QIP_built = True
+        self.log_build_details()
+
+
+    def log_build_details(self):
+        logging.info('')
+        logging.info('BUILD DETAILS:')
+        logging.info(f'workers:{self.n_workers}')
+        for worker, cplex_parameters in enumerate(self.portfolio):
+            logging.info(f'worker {worker}: {dict(cplex_parameters)}')
+
+
+    def solve(self):
+        if not self.QIP_built:
+            raise ValueError('Portfolio build-status:{QIP_built}, first call .build()!')
+
+        mip_relative_gap = self.QIP_parameters['mip_relative_gap']
+        QIP_kwargs = dict(self.QIP_kwargs, save_results=False, savefolder=None, profiler=None, cache=None)
+
+        logging.info('')
+        logging.info('SOLVE PORTFOLIO')
+        logging.info(self.log_sep)
+
+        start = time.perf_counter()
+        best_objective, best_bound = None, None
+        with Manager() as manager:
+            result_queue, stop_event = manager.Queue(), manager.Event()
+            with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+                futures = [pool.submit(solve_worker, worker, QIP_kwargs, cplex_parameters, result_queue, stop_event)
+                           for worker, cplex_parameters in enumerate(self.portfolio)]
+                pending = set(futures)
+                while pending:
+                    _, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    while True:
+                        try:
+                            worker, event, point = result_queue.get_nowait()
+                        except Empty:
+                            break
+                        objective, bound = (point[1], point[2]) if event == 'progress' else point
+                        if objective is not None and (best_objective is None or objective > best_objective):
+                            best_objective = objective
+                            logging.info(f'{round(time.perf_counter()-start,2)} sec: new incumbent {objective} from worker {worker}')
+                        if bound is not None and (best_bound is None or bound < best_bound):
+                            best_bound = bound
+                        # stop all workers once the best incumbent and the best bound (over all workers) are within
+                        # the relative gap, e.g., if one worker finished with a gap below mip_relative_gap
+                        if (not stop_event.is_set() and best_objective is not None and best_bound is not None and mip_relative_gap is not None
+                                and best_bound - best_objective <= mip_relative_gap*(1e-10+abs(best_objective))):
+                            logging.info(f'{round(time.perf_counter()-start,2)} sec: relative gap reached, stopping all workers')
+                            stop_event.set()
+                self.portfolio_results = [future.result() for future in futures]
+        self.soltime = time.perf_counter() - start
+
+        solved = [result for result in self.portfolio_results if result['Objective_Value'] is not None]
+        if not solved:
+            raise RuntimeError('No portfolio worker found a feasible schedule!')
+        best = max(solved, key=lambda result: result['Objective_Value'])
+        self.allocation = OrderedDict(best['Allocation'])
+        self.schedule = OrderedDict(best['Schedule'])
+        self.attendance = OrderedDict(best['Attendance'])
+
+        self.portfolio_details = {'Problem': 'Portfolio',
+                                  'Status': best['Status'],
+                                  'Time': self.soltime,
+                                  'Best_Worker': best['Worker'],
+                                  'Objective_Value': best['Objective_Value'],
+                                  'Best_Bound': best_bound,
+                                  'Relative_Gap': (best_bound - best['Objective_Value'])/(1e-10+abs(best['Objective_Value'])) if best_bound is not None else None}
+        portfolio_solve_details = self.log_solve_details()
+
+        if self.save_results:
+            trajectories = [{key: value for key, value in result.items() if key not in ['Allocation','Schedule','Attendance']}
+                            for result in self.portfolio_results]
+            json.dump(portfolio_solve_details, open(os.path.join(self.savefolder,'portfolio_solve_details_'+self.QIP_date_time+'.json'),'w'))
+            json.dump(trajectories, open(os.path.join(self.savefolder,'portfolio_trajectories_'+self.QIP_date_time+'.json'),'w'))
+            ScheduleResult.from_allocation(self.session_ids, self.track_ids, self.paper_ids, self.allocation, self.attendance).save(os.path.join(self.savefolder,'portfolio_schedule_'+self.QIP_date_time+'.npz'))
+
+        return self.schedule
+
+
+    def log_solve_details(self):
+        details = self.portfolio_details
+        logging.info('')
+        logging.info('SOLVE DETAILS:')
+        logging.info('Problem : %s', details['Problem'])
+        logging.info('Status  : %s', details['Status'])
+        logging.info('Time    : %s sec', round(details['Time']))
+        logging.info('Best Worker: %s', details['Best_Worker'])
+        for result in self.portfolio_results:
+            logging.info(f'Worker {result["Worker"]}: {result["Status"]} | objective {result["Objective_Value"]} | gap {result["Relative_Gap"]} | {round(result["Time"])} sec | {len(result["Trajectory"])} trajectory points')
+        logging.info('Objective Value: %s', details['Objective_Value'])
+        logging.info('Best Bound: %s', details['Best_Bound'])
+        logging.info('Relative Gap: %s', details['Relative_Gap'])
+        return details
+
+
+    def check_paper_allocation(self,
+                               verbose=0):
+        for p in self.paper_ids:
+            if verbose > 0:
+                logging.info(f'PaperID:{p} allocated:{p in self.allocation}')
+            if p not in self.allocation:
+                raise RuntimeError(f'Paper{p} was not allocated!')
+        logging.info(f'{len(self.paper_ids)} Papers allocated')
+        logging.info('')
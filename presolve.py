@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Presolve of the QIP: bidders with identical bid vectors and topics with identical paper sets are merged into weighted classes.
+
+@author: jakob
+"""
+
+
+# Libs
+from collections import OrderedDict, defaultdict
+
+
+# %%
+class Presolve:
+
+    '''
+    This implements the class Presolve.
+    Bidders with identical bid vectors, i.e., the same papers with the same U (after rounding U to multiples of
+    bid_quantization, if given), and topics with identical paper sets in Q are merged into classes. Each class is
+    represented by its first member and weighted by the number of its members: the QIP is built over the
+    representatives, where U of a representative is the sum of U of its members and the bidder cost, topic cost and
+    topic utility are multiplied by the weight. Without quantization the reduced QIP is equivalent, since all members
+    of a class have the same optimal attendance. With quantization the members of a class attend together, i.e., the
+    reduced QIP is an approximation and the schedule is scored with the original bidders.
+    '''
+
+    def __init__(self,
+                 bidder_ids,
+                 topic_ids,
+                 U,
+                 Q,
+                 bid_quantization=None):
+
+        # original inputs (used to score schedules of the reduced QIP)
+        self.bidder_ids = bidder_ids
+        self.topic_ids = topic_ids
+        self.U = U
+        self.Q = Q
+        self.bid_quantization = bid_quantization # None: only identical bid vectors are merged
+
+        self.bidder_classes = OrderedDict() # representative bidder_id -> bidder_ids of the class
+        self.topic_classes = OrderedDict() # representative topic_id -> topic_ids of the class
+        self.bidder_representative = {} # bidder_id -> representative bidder_id
+        self.topic_representative = {} # topic_id -> representative topic_id
+
+
+    def _bid_key(self, u):
+        return u if self.bid_quantization is None else round(u/self.bid_quantization)
+
+
+    @staticmethod
+    def _classes(ids, vectors):
+        # ids with the same (sorted) vector form a class, represented by its first member in ids
+        classes = OrderedDict()
+        representative_of_vector = {}
+        representative = {}
+        for i in ids:
+            vector = tuple(sorted(vectors.get(i, [])))
+            r = representative_of_vector.setdefault(vector, i)
+            classes.setdefault(r, []).append(i)
+            representative[i] = r
+        return classes, representative
+
+
+    def run(self):
+
+        '''
+        Returns the reduced bidder_ids, topic_ids, U and Q and the weights (class sizes) of the representative
+        bidders and topics.
+        '''
+
+        bid_vectors = defaultdict(list)
+        for (b,p), u in self.U.items():
+            bid_vectors[b].append((p, self._bid_key(u)))
+        topic_vectors = defaultdict(list)
+        for p,t in self.Q.keys():
+            topic_vectors[t].append(p)
+        self.bidder_classes, self.bidder_representative = self._classes(self.bidder_ids, bid_vectors)
+        self.topic_classes, self.topic_representative = self._classes(self.topic_ids, topic_vectors)
+
+        U = defaultdict(float)
+        for (b,p), u in self.U.items():
+            U[(self.bidder_representative[b], p)] += u
+        Q = OrderedDict()
+        for (p,t), value in self.Q.items():
+            if self.topic_representative[t] == t:
+                Q[(p,t)] = value
+
+        bidder_weights = OrderedDict((b, len(members)) for b, members in self.bidder_classes.items())
+        topic_weights = OrderedDict((t, len(members)) for t, members in self.topic_classes.items())
+        return list(self.bidder_classes), list(self.topic_classes), dict(U), Q, bidder_weights, topic_weights
+
+
+    def remove_paper(self, p):
+        # the classes remain valid, since the bid vectors (paper sets) of all members lose the same entry
+        self.U = {(b,q): u for (b,q), u in self.U.items() if q != p}
+        self.Q = {(q,t): c for (q,t), c in self.Q.items() if q != p}
+
+
+    def report(self):
+        # number of bidders, topics, bids and paper-topic pairs before and after the presolve and the reduction ratio
+        n_bids = len(set((self.bidder_representative[b], p) for b,p in self.U.keys()))
+        n_paper_topics = sum(1 for p,t in self.Q.keys() if self.topic_representative[t] == t)
+        report = OrderedDict()
+        for name, before, after in [('Bidders', len(self.bidder_ids), len(self.bidder_classes)),
+                                    ('Topics', len(self.topic_ids), len(self.topic_classes)),
+                                    ('Bids', len(self.U), n_bids),
+                                    ('Paper_Topics', len(self.Q), n_paper_topics)]:
+            report[name] = OrderedDict([('Before', before), ('After', after), ('Reduction', 1 - after/before if before else 0.0)])
+        return report
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Per-phase profiling (wall-clock time, CPU time, peak RSS) and solver trajectories of QIP runs.
+
+@author: jakob
+"""
+
+
+# Libs
+from collections import OrderedDict
+from contextlib import contextmanager
+import sys
+import time
+from docplex.mp.progress import ProgressListener, ProgressClock
+try:
+    import resource # not available on Windows
+except ImportError:
+    resource = None
+
+
+# %%
+def peak_rss_mb():
+    # peak resident set size of the process so far in MB (None if not available)
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss/2**20 if sys.platform == 'darwin' else peak_rss/2**10 # bytes on macOS, KB on Linux
+
+
+class TrajectoryListener(ProgressListener):
+
+    '''
+    Records the incumbent and bound trajectory (time, objective, best bound, gap) of a CPLEX solve.
+    '''
+
+    def __init__(self):
+        super().__init__(ProgressClock.All)
+        self.trajectory = []
+
+    def notify_progress(self, progress_data):
+        point = (progress_data.time,
+                 progress_data.current_objective if progress_data.has_incumbent else None,
+                 progress_data.best_bound,
+                 progress_data.mip_gap if progress_data.has_incumbent else None)
+        if not self.trajectory or self.trajectory[-1][1:] != point[1:]:
+            self.trajectory.append(point)
+
+
+class Profiler:
+
+    '''
+    This implements the class Profiler.
+    Each phase of a run, e.g., the data load, every build step, the solve and the report writing, is wrapped in
+    "with profiler.phase(name):" and its wall-clock time, CPU time and the peak RSS of the process at the end of
+    the phase are recorded. Since the peak RSS is monotone, the phase in which it increases is the phase which
+    allocated the memory.
+    '''
+
+    def __init__(self):
+        self.phases = []
+        self.trajectory = [] # (time, objective, best bound, gap) of the last solve
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    @contextmanager
+    def phase(self, name):
+        wall_time, cpu_time = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.phases.append(OrderedDict([('Phase', name),
+                                            ('Wall_Time', time.perf_counter() - wall_time),
+                                            ('CPU_Time', time.process_time() - cpu_time),
+                                            ('Peak_RSS_MB', peak_rss_mb())]))
+
+    def to_dict(self,
+                variable_counts=None,
+                constraint_counts=None):
+        # machine-readable profile, e.g., to be saved as .json
+        profile = OrderedDict()
+        profile['Wall_Time'] = time.perf_counter() - self.start
+        profile['CPU_Time'] = time.process_time() - self.cpu_start
+        profile['Peak_RSS_MB'] = peak_rss_mb()
+        profile['Phases'] = self.phases
+        profile['Variables'] = variable_counts or OrderedDict()
+        profile['Constraints'] = constraint_counts or OrderedDict()
+        profile['Trajectory'] = [OrderedDict(zip(['Time', 'Objective_Value', 'Best_Bound', 'Relative_Gap'], point)) for point in self.trajectory]
+        return profile
@@ -8,18 +8,33 @@ Created on Tue May 24 16:59:42 2022
 
 # Libs
 import logging
-import docplex.mp.model as cpx
-from itertools import product
+from docplex.mp.constants import EffortLevel
+from docplex.mp.quad import QuadExpr
+from itertools import product, chain
 from collections import OrderedDict
 from datetime import datetime
 import json
-import pickle as pkl
-from copy import deepcopy
+import numpy as np
 import pandas as pd
 import os
+import time
 import xlsxwriter
+
+# own modules
+from heuristics import greedy_allocation, evaluate_allocation
+from scoring import ScheduleScorer
+from profiling import Profiler, TrajectoryListener
+from backends import create_model
+from presolve import Presolve
+from schedule_result import ScheduleResult
+from checkpoint import CheckpointListener, load_checkpoint
+from solve_cache import stable_hash, DATA_COMPONENTS, IGNORED_QIP_PARAMETERS
 # DOCPLEX documentation: http://ibmdecisionoptimization.github.io/docplex-doc/mp/docplex.mp.model.html
 
+# approximate bytes per variable, constraint and nonzero of an exported model (without and with model_names)
+EXPORT_BYTES_PER_ENTRY = {'txt': (18, 32), 'lp': (18, 32), 'mps': (47, 138), 'sav': (12, 16)}
+EXPORT_COMPRESSION_RATIO = 0.15
+
 
 # %%
 class QIP:
@@ -47,7 +62,18 @@ class QIP:
                  topic_cost,
                  topic_utility,
                  save_results,
-                 savefolder=None):
+                 savefolder=None,
+                 sparse_model=False,
+                 formulation='quadratic',
+                 symmetry_breaking=None,
+                 model_names=False,
+                 profiler=None,
+                 model_export=None,
+                 backend='cplex',
+                 presolve=False,
+                 bid_quantization=None,
+                 author_formulation='presence',
+                 cache=None):
 
         self.session_ids = session_ids
         self.track_ids = track_ids
@@ -59,11 +85,23 @@ class QIP:
         self.topic_ids = topic_ids
         self.track_session_capacity = track_session_capacity
         self.paper_distribution = paper_distribution
+        self.sparse_model = sparse_model # if True, only variables which can be nonzero are created
+        self.formulation = formulation # 'quadratic': QIP objective or 'linear': equivalent linearized MILP
+        self.author_formulation = author_formulation # 'presence': z>=x per author and paper or 'compact': rows per author and subsession, z only for authors with 3+ papers
+        self.symmetry_breaking = symmetry_breaking # None, 'lowest_paper' or 'weighted_order': ordering of interchangeable tracks per session
+        self.model_names = model_names # if True, variables and constraints are named (readable LP files), slower build
+        self.presolve = presolve # if True, bidders (topics) with identical bids (papers) are merged into weighted classes
+        self.bid_quantization = bid_quantization # None or step to which U is rounded before bidders are compared (presolve)
+        self.model_export = model_export # formats of the model saved after .build() if save_results, e.g., ['txt','mps.gz'] (see .export_model())
         self.QIP_date_time = datetime.now().strftime("%d_%m_%Y_%H-%M-%S")
         self.QIP_parameters = QIP_parameters
         self.name = "QIP"
-        self.QIP = cpx.Model(name=self.name)  # QIP docplex instance
+        self.backend = backend # solver of the docplex model: 'cplex' or 'cpsat' (OR-Tools CP-SAT, see backends.py)
+        self.QIP = create_model(name=self.name, backend=self.backend)  # QIP docplex instance
         self.save_results = save_results
+        self.cache = cache # None or SolveCache: .solve() returns the cached schedule of the same instance and parameters
+        self.cached_solve_details = None # solve details of the cached schedule if .solve() was a cache hit
+        self.cache_lookup = None # lookup of .cached_result() without hit, reused by .solve()
 
         if self.save_results:
             if savefolder:
@@ -71,6 +109,8 @@ class QIP:
                 os.makedirs(self.savefolder, exist_ok=True)
             else:
                 self.savefolder = os.getcwd()
+        else:
+            self.savefolder = None
 
 
         self.U = U
@@ -82,16 +122,37 @@ class QIP:
         self.topic_cost = topic_cost
         self.topic_utility = topic_utility
 
+        # weights of the bidders and topics in the objective, i.e., the class sizes if presolve
+        self.presolver = None # Presolve with the original bidders, topics, U and Q
+        self.bidder_weights = dict.fromkeys(self.bidder_ids, 1)
+        self.topic_weights = dict.fromkeys(self.topic_ids, 1)
+        if self.presolve:
+            self.apply_presolve()
+
+        self.result = None # ScheduleResult of the last .solve(), allocation, schedule and attendance are its dict views
         self.allocation = OrderedDict()
         self.schedule = OrderedDict()
         self.attendance = OrderedDict()
+        self.track_labels = OrderedDict() # (session_id,track_id) in the model -> track_id in schedule (only differs if symmetry_breaking)
         self.soltime = None  # timing
+        self.heuristic_details = None # objective and time of the heuristic used as MIP start
+        self.resume_time = 0.0 # solve time of the checkpoint of QIP_parameters['resume'], deducted from the time limit
+        self.resumed = False # QIP_parameters['resume'] applies only to the first .solve()
+        self.scorer = None # ScheduleScorer, created on first call of .score()
+        self.fixed_papers = OrderedDict() # paper_id -> (session_id,track_id) fixed by .fix_paper()
+        self.inputs_copied = False # U, M, T and Q are copied before the first what-if change
 
         self.objective1_ids = [] # 1st sum in objective: bidders' utilitites, i.e. bids
         self.objective2_ids = [] # 2nd sum in objective: bidders' costs, i.e. bids
         self.objective3_ids = [] # 3rd sum in objective: topics' utilitites
         self.objective4_ids = [] # 4th sum in objective: topics' costs
 
+        self.constraint_counts = OrderedDict() # number of added constraints per constraint family
+        self.profiler = profiler if profiler is not None else Profiler() # wall-clock time, CPU time and peak RSS per phase
+        self.paper_constraints = OrderedDict() # paper_id -> allocation constraint
+        self.capacity_constraints = OrderedDict() # (session_id,track_id) -> capacity constraint
+        self.product_lower_bounds = {} # ('W' or 'V', key) -> lower bound constraint of a linearization variable
+
         self.QIP_built = False
 
         self.set_logging()
@@ -105,11 +166,14 @@ class QIP:
             logging.root.removeHandler(handler)
         # --------------------------------------
         # LOG TO CONSOLE and TO FILE qip_logs.txt
-        logging.basicConfig(level=logging.DEBUG,
-                            datefmt='%Y-%m-%d %H:%M:%S',
-                            format='%(asctime)s: %(message)s',
-                            filename = os.path.join(self.savefolder,'qip_logs_'+ self.QIP_date_time +'.log'),
-                            filemode='w')
+        if self.savefolder is not None:
+            logging.basicConfig(level=logging.DEBUG,
+                                datefmt='%Y-%m-%d %H:%M:%S',
+                                format='%(asctime)s: %(message)s',
+                                filename = os.path.join(self.savefolder,'qip_logs_'+ self.QIP_date_time +'.log'),
+                                filemode='w')
+        else:
+            logging.getLogger('').setLevel(logging.DEBUG)
 
         # define a Handler which writes DEBUG messages or higher to the sys.stderr
         console = logging.StreamHandler()
@@ -124,12 +188,32 @@ class QIP:
         self.log_sep = ''.join(['-']*80)
 
 
+    def apply_presolve(self):
+        # the QIP is built over the representatives of the bidder and topic classes (see presolve.py)
+        self.presolver = Presolve(bidder_ids=self.bidder_ids,
+                                  topic_ids=self.topic_ids,
+                                  U=self.U,
+                                  Q=self.Q,
+                                  bid_quantization=self.bid_quantization)
+        self.bidder_ids, self.topic_ids, self.U, self.Q, self.bidder_weights, self.topic_weights = self.presolver.run()
+
+
+    def original_inputs(self):
+        # bidders, topics, U and Q before the presolve, e.g., to score schedules
+        inputs = self.presolver if self.presolver is not None else self
+        return inputs.bidder_ids, inputs.topic_ids, inputs.U, inputs.Q
+
+
     def print_input_info(self):
         logging.info('')
         logging.info('QIP INPUT:')
         logging.info(self.log_sep)
         logging.info(f'TRACK-SESSION-CAPACITY:{self.track_session_capacity}')
         logging.info(f'PAPER-DISTRIBUTION-METHOD:{self.paper_distribution}')
+        logging.info(f'FORMULATION:{self.formulation}')
+        logging.info(f'BACKEND:{self.backend}')
+        logging.info(f'SYMMETRY-BREAKING:{self.symmetry_breaking}')
+        logging.info(f'AUTHOR-FORMULATION:{self.author_formulation}')
         logging.info(f'SESSIONS:{len(self.session_ids)} | {self.session_ids}')
         logging.info(f'TRACKS:{len(self.track_ids)} | {self.track_ids}')
         logging.info(f'BIDS (=len(U)):{len(self.U.keys())}')
@@ -142,40 +226,110 @@ class QIP:
         logging.info('')
         logging.info(f'AUTHORS:{len(self.author_ids)}')
         logging.info(f'{self.author_ids}')
+        if self.presolver is not None:
+            logging.info('')
+            logging.info(f'PRESOLVE (bid_quantization={self.bid_quantization}):')
+            for name, counts in self.presolver.report().items():
+                logging.info(f'{name.upper()}:{counts["Before"]} -> {counts["After"]} (reduction:{round(100*counts["Reduction"],1)}%)')
+
+
+    def define_QIP_index_sets(self):
+        # papers per author
+        self.author_paper_ids = OrderedDict()
+        for a,p in self.M.keys():
+            self.author_paper_ids.setdefault(a, []).append(p)
+
+        if self.sparse_model:
+            # (session,track) tuples where paper_id:p is allowed, i.e., T(j,p)!=1
+            forbidden = set(self.T.keys())
+            self.paper_session_track_ids = OrderedDict((p, [(j,k) for j,k in self.session_track_tuple_ids if (j,p) not in forbidden]) for p in self.paper_ids)
+            self.session_track_paper_ids = OrderedDict(((j,k), [p for p in self.paper_ids if (j,p) not in forbidden]) for j,k in self.session_track_tuple_ids)
+            # only bidders with at least one bid, authors in M and topics in Q
+            bidders_with_bids = set(b for b,p in self.U.keys())
+            authors_in_M = set(a for a,p in self.M.keys())
+            topics_in_Q = set(t for p,t in self.Q.keys())
+            self.active_bidder_ids = [b for b in self.bidder_ids if b in bidders_with_bids]
+            self.active_author_ids = [a for a in self.author_ids if a in authors_in_M]
+            self.active_topic_ids = [t for t in self.topic_ids if t in topics_in_Q]
+        else:
+            self.paper_session_track_ids = OrderedDict((p, self.session_track_tuple_ids) for p in self.paper_ids)
+            self.session_track_paper_ids = OrderedDict(((j,k), self.paper_ids) for j,k in self.session_track_tuple_ids)
+            self.active_bidder_ids = self.bidder_ids
+            self.active_author_ids = self.author_ids
+            self.active_topic_ids = self.topic_ids
 
 
     def define_QIP_variables(self):
-        self.x = {}  # binary QIP paper variable, i.e., x_{p,j,k} in {0,1} where x_{p,j,k}==1 iff paper_id:p is allocated to session_id:j and track_id:k
-        for p in self.paper_ids:
-            for j,k in self.session_track_tuple_ids:
-                self.x[(p, j, k)] = self.QIP.binary_var(name=f'x_{p}_{j}_{k}')
+        self.define_QIP_index_sets()
 
-        self.y = {}  # binary QIP bidder variable, i.e., y_{b,j,k} in {0,1} where y_{b,j,k}==1 iff bidder_id:b is attending session_id:j and track_id:k
-        for b in self.bidder_ids:
-            for j,k in self.session_track_tuple_ids:
-                self.y[(b, j, k)] = self.QIP.binary_var(name=f'y_{b}_{j}_{k}')
+        # variables are created in bulk, names x_{p}_{j}_{k} etc. only if model_names
+        # binary QIP paper variable, i.e., x_{p,j,k} in {0,1} where x_{p,j,k}==1 iff paper_id:p is allocated to session_id:j and track_id:k
+        self.x = self.QIP.binary_var_dict([(p, j, k) for p in self.paper_ids for j,k in self.paper_session_track_ids[p]],
+                                          name=self._name('x'))
 
-        self.z = {}  # binary QIP author variable, i.e., z_{a,j,k} in {0,1} where z_{a,j,k}==1 iff author_id:a is presenting in session_id:j and track_id:k
-        for a in self.author_ids:
-            for j,k in self.session_track_tuple_ids:
-                self.z[(a, j, k)] = self.QIP.binary_var(name=f'z_{a}_{j}_{k}')
+        # binary QIP bidder variable, i.e., y_{b,j,k} in {0,1} where y_{b,j,k}==1 iff bidder_id:b is attending session_id:j and track_id:k
+        self.y = self.QIP.binary_var_dict([(b, j, k) for b in self.active_bidder_ids for j,k in self.session_track_tuple_ids],
+                                          name=self._name('y'))
 
-        self.q = {}  # binary QIP topic variable, i.e., q_{t,j,k} in {0,1} where q_{t,j,k}==1 iff topic_id:t is attending in session_id:j and track_id:k
-        for t in self.topic_ids:
-            for j,k in self.session_track_tuple_ids:
-                self.q[(t, j, k)] = self.QIP.binary_var(name=f'q_{t}_{j}_{k}')
+        # binary QIP author variable, i.e., z_{a,j,k} in {0,1} where z_{a,j,k}==1 iff author_id:a is presenting in session_id:j and track_id:k
+        # (with author_formulation 'compact' only for authors with at least 3 papers)
+        if self.author_formulation == 'compact':
+            z_author_ids = [a for a in self.active_author_ids if len(self.author_paper_ids.get(a, [])) >= 3]
+        else:
+            z_author_ids = self.active_author_ids
+        self.z = self.QIP.binary_var_dict([(a, j, k) for a in z_author_ids for j,k in self.session_track_tuple_ids],
+                                          name=self._name('z'))
+
+        # binary QIP topic variable, i.e., q_{t,j,k} in {0,1} where q_{t,j,k}==1 iff topic_id:t is attending in session_id:j and track_id:k
+        self.q = self.QIP.binary_var_dict([(t, j, k) for t in self.active_topic_ids for j,k in self.session_track_tuple_ids],
+                                          name=self._name('q'))
+
+
+    def _name(self, name):
+        # variable and constraint names are only created if model_names
+        return name if self.model_names else None
+
+
+    def add_constraints(self, cts, names):
+        # add a batch of constraints, names (any iterable) are only evaluated if model_names
+        return self.QIP.add_constraints(cts, list(names) if self.model_names else None)
+
+
+    # allocation, schedule and attendance are the dict views of self.result unless they are set explicitly
+    @property
+    def allocation(self):
+        return self.result.allocation if self._allocation is None else self._allocation
+
+    @allocation.setter
+    def allocation(self, allocation):
+        self._allocation = allocation
+
+    @property
+    def schedule(self):
+        return self.result.schedule if self._schedule is None else self._schedule
+
+    @schedule.setter
+    def schedule(self, schedule):
+        self._schedule = schedule
+
+    @property
+    def attendance(self):
+        return self.result.attendance if self._attendance is None else self._attendance
+
+    @attendance.setter
+    def attendance(self, attendance):
+        self._attendance = attendance
 
 
     def check_paper_allocation(self,
                                verbose=0):
-        for p in self.paper_ids:
-
-            if verbose > 0:
-                logging.info(f'PaperID:{p} allocated:{1==sum([self.x[(p,j,k)].solution_value for j,k in self.session_track_tuple_ids])}')
-            paper_allocated = (1==sum([self.x[(p,j,k)].solution_value for j,k in self.session_track_tuple_ids]))
-            if not paper_allocated:
-                raise RuntimeError(f'Paper{p} was not allocated!')
-        logging.info(f'{len(self.paper_ids)} Papers allocated')
+        allocated = self.result.slots >= 0
+        if verbose > 0:
+            for p, paper_allocated in zip(self.result.paper_ids, allocated.tolist()):
+                logging.info(f'PaperID:{p} allocated:{paper_allocated}')
+        if not allocated.all():
+            raise RuntimeError(f'Paper{self.result.paper_ids[int(np.argmin(allocated))]} was not allocated!')
+        logging.info(f'{len(self.result.paper_ids)} Papers allocated')
         logging.info('')
 
 
@@ -200,34 +354,60 @@ class QIP:
             raise ValueError('QIP build-status:{QIP_built}, first call .build()!')
 
         log_output = self.QIP_parameters['log_output']
-        time_limit = self.QIP_parameters['time_limit']
-        mip_relative_gap = self.QIP_parameters['mip_relative_gap']
-        integrality_tol = self.QIP_parameters['integrality_tol']
-        feasibility_tol = self.QIP_parameters['feasibility_tol']
-
-        # set time limit
-        if time_limit is not None:
-            self.QIP.set_time_limit(time_limit)
-        # set mip relative gap
-        if mip_relative_gap is not None:
-            self.QIP.parameters.mip.tolerances.mipgap.set(mip_relative_gap)
-        # set mip integrality tolerance
-        if integrality_tol is not None:
-            self.QIP.parameters.mip.tolerances.integrality.set(integrality_tol)
-        # Set feasibility tolerance
-        if feasibility_tol is not None:
-            self.QIP.parameters.simplex.tolerances.feasibility.set(feasibility_tol)
 
         logging.info('')
         logging.info('SOLVE QIP')
         logging.info(self.log_sep)
-        logging.info('QIP time Limit of %s', self.QIP.get_time_limit())
-        logging.info('QIP relative gap %s', self.QIP.parameters.mip.tolerances.mipgap.get())
-        logging.info('QIP integrality tol %s', self.QIP.parameters.mip.tolerances.integrality.get())
-        logging.info('QIP feasibility tol %s', self.QIP.parameters.simplex.tolerances.feasibility.get())
 
-        # solve QIP
-        Sol = self.QIP.solve(log_output=log_output)
+        # solve cache: cached schedule of the same instance (hit) or as MIP start if only U, M, T or Q changed (near hit)
+        self.cached_solve_details = None
+        cache_allocation = None
+        if self.cache is not None:
+            cache_components, lookup, result, details = self.lookup_cache()
+            if lookup == 'hit':
+                return self.set_cached_result(result, details)
+            if lookup == 'near_hit':
+                cache_allocation = result.allocation
+
+        # resume: schedule and solve time of the latest checkpoint of an earlier (e.g. killed) solve, only in the first
+        # solve, later solves (e.g. after what-if changes) start from the previous solution with the full time limit
+        checkpoint_allocation = None
+        self.resume_time = 0.0
+        if self.QIP_parameters.get('resume') and not self.resumed:
+            checkpoint_allocation, checkpoint = load_checkpoint(self.QIP_parameters['resume'])
+            self.resume_time = checkpoint['Solve_Time']
+            self.resumed = True
+            logging.info(f'Resume from checkpoint of {checkpoint["Date_Time"]}: objective value {checkpoint["Objective_Value"]}, solve time {round(self.resume_time,2)} sec')
+        self.set_QIP_parameters()
+
+        # set MIP start: checkpoint, previous solution (e.g. after what-if changes) or greedy heuristic
+        previous_allocation = self.allocation
+        self.allocation = OrderedDict()
+        self.schedule = OrderedDict()
+        self.attendance = OrderedDict()
+        with self.profiler.phase('mip_start'):
+            if checkpoint_allocation:
+                self.add_warm_start(checkpoint_allocation, heuristic='checkpoint')
+            elif previous_allocation:
+                self.add_warm_start(previous_allocation)
+            elif cache_allocation:
+                self.add_warm_start(cache_allocation, heuristic='cache')
+            elif self.QIP_parameters.get('mip_start') == 'greedy':
+                self.add_greedy_mip_start()
+
+        # solve QIP and record the incumbent and bound trajectory (and write each improved incumbent as checkpoint)
+        listeners = [TrajectoryListener()]
+        if self.save_results and self.QIP_parameters.get('checkpoint'):
+            listeners.append(CheckpointListener(self, os.path.join(self.savefolder,'qip_checkpoint_'+self.QIP_date_time+'.json'), time_offset=self.resume_time))
+        for listener in listeners:
+            self.QIP.add_progress_listener(listener)
+        with self.profiler.phase('solve'):
+            Sol = self.QIP.solve(log_output=log_output)
+        for listener in listeners:
+            self.QIP.remove_progress_listener(listener)
+        self.profiler.trajectory = listeners[0].trajectory
+        if len(listeners) > 1:
+            logging.info(f'{listeners[1].n_checkpoints} checkpoint(s) written to {listeners[1].path}')
         if Sol:
             self.soltime = Sol.solve_details._time
             qip_solve_details = self.log_solve_details()
@@ -243,27 +423,406 @@ class QIP:
 
 
         # set the optimal allocation and optimal schedule
-        for j,k in self.session_track_tuple_ids:
-            for p in self.paper_ids:
-                if self.x[(p, j, k)].solution_value == 1:
-                    self.allocation[p] = (j,k)
-                    if (j,k) in self.schedule:
-                        self.schedule[(j,k)].append(p)
-                    else:
-                        self.schedule[(j,k)] = [p]
+        with self.profiler.phase('solution_extraction'):
+            self.result = ScheduleResult(session_ids=self.session_ids,
+                                         track_ids=self.track_ids,
+                                         paper_ids=self.paper_ids,
+                                         slots=self.extract_slots(Sol))
+            self._allocation, self._schedule, self._attendance = None, None, None
 
         # calculate attendance
-        self.calc_attendance()
+        with self.profiler.phase('calc_attendance'):
+            self.calc_attendance()
+        if self.presolver is not None:
+            logging.info(f'Objective value of the schedule with the original bidders and topics: {self.score()["Objective_Value"]}')
+
+        # map canonical tracks of the symmetry breaking model back to track labels
+        if self.symmetry_breaking:
+            self.relabel_tracks()
 
         if self.save_results:
-            Sol.export(file_or_filename=os.path.join(self.savefolder,'qip_solution_'+self.QIP_date_time+'.json'),format='json')
-            json.dump(qip_solve_details, open(os.path.join(self.savefolder,'qip_solve_details_'+self.QIP_date_time+'.json'),'w'))
-            pkl.dump(self.schedule, open(os.path.join(self.savefolder,'qip_schedule_'+self.QIP_date_time+'.pkl'),'wb'))
+            with self.profiler.phase('save_results'):
+                Sol.export(file_or_filename=os.path.join(self.savefolder,'qip_solution_'+self.QIP_date_time+'.json'),format='json')
+                json.dump(qip_solve_details, open(os.path.join(self.savefolder,'qip_solve_details_'+self.QIP_date_time+'.json'),'w'))
+                self.result.save(os.path.join(self.savefolder,'qip_schedule_'+self.QIP_date_time+'.npz'))
+            self.save_profile()
 
+        if self.cache is not None:
+            self.cache.put(cache_components, self.result, qip_solve_details)
+
+        return self.schedule
+
+
+    def cache_components(self):
+        # hashes of the ids, parameters, U, M, T and Q, i.e., the key of the solve cache (with the what-if changes)
+        qip_parameters = {name: value for name, value in self.QIP_parameters.items() if name not in IGNORED_QIP_PARAMETERS}
+        parameters = {'track_session_capacity': self.track_session_capacity,
+                      'paper_distribution': self.paper_distribution,
+                      'bidder_cost': self.bidder_cost,
+                      'topic_cost': self.topic_cost,
+                      'topic_utility': self.topic_utility,
+                      'sparse_model': self.sparse_model,
+                      'formulation': self.formulation,
+                      'author_formulation': self.author_formulation,
+                      'symmetry_breaking': self.symmetry_breaking,
+                      'presolve': self.presolve,
+                      'bid_quantization': self.bid_quantization,
+                      'backend': self.backend,
+                      'fixed_papers': list(self.fixed_papers.items()),
+                      'QIP_parameters': qip_parameters}
+        bidder_ids, topic_ids, U, Q = self.original_inputs()
+        components = OrderedDict()
+        components['ids'] = stable_hash([self.session_ids, self.track_ids, self.paper_ids, bidder_ids, self.author_ids, topic_ids])
+        components['parameters'] = stable_hash(parameters)
+        for name, mapping in zip(DATA_COMPONENTS, [U, self.M, self.T, Q]):
+            components[name] = stable_hash(mapping)
+        return components
+
+
+    def lookup_cache(self):
+        # (components, lookup, result, details), the lookup of .cached_result() is reused by the following .solve() if
+        # the instance did not change in between
+        cache_components = self.cache_components()
+        entry, self.cache_lookup = self.cache_lookup, None
+        if entry is not None and entry[0] == cache_components:
+            return entry
+        with self.profiler.phase('cache_lookup'):
+            lookup, result, details, changed = self.cache.get(cache_components)
+        logging.info(f'Solve cache: {lookup}' + (f' (changed: {", ".join(changed)})' if changed else ''))
+        self.cache.log_statistics()
+        return cache_components, lookup, result, details
+
+
+    def cached_result(self):
+
+        '''
+        Looks up the instance in the solve cache before the model is built. Returns the schedule of a hit (as
+        .solve() does) and None if there is no cache or no hit, i.e., the model must be built and solved.
+        '''
+
+        if self.cache is None:
+            return None
+        logging.info('')
+        logging.info('SOLVE CACHE')
+        logging.info(self.log_sep)
+        self.cached_solve_details = None
+        entry = self.lookup_cache()
+        if entry[1] != 'hit':
+            self.cache_lookup = entry
+            return None
+        return self.set_cached_result(entry[2], entry[3])
+
+
+    def set_cached_result(self, result, details):
+        # schedule of a cache hit, the model is not solved
+        self.result = result
+        self._allocation, self._schedule, self._attendance = None, None, None
+        self.cached_solve_details = details
+        self.soltime = 0.0
+        logging.info(f'Cached schedule with objective value {details["Objective_Value"]} (status: {details["Status"]})')
+        if self.save_results:
+            with self.profiler.phase('save_results'):
+                json.dump(dict(details, Cache='hit'), open(os.path.join(self.savefolder,'qip_solve_details_'+self.QIP_date_time+'.json'),'w'))
+                self.result.save(os.path.join(self.savefolder,'qip_schedule_'+self.QIP_date_time+'.npz'))
+            self.save_profile()
         return self.schedule
 
 
+    def save_profile(self):
+        # per-phase wall-clock time, CPU time and peak RSS, counts per variable and constraint family and the trajectory
+        variable_counts = OrderedDict((name, len(getattr(self, name))) for name in ['x','y','z','q','w','v'] if hasattr(self, name))
+        profile = self.profiler.to_dict(variable_counts=variable_counts,
+                                        constraint_counts=self.constraint_counts)
+        if self.save_results:
+            json.dump(profile, open(os.path.join(self.savefolder,'qip_profile_'+self.QIP_date_time+'.json'),'w'), indent=2)
+        return profile
+
+
+    def set_QIP_parameters(self):
+        time_limit = self.QIP_parameters['time_limit']
+        mip_relative_gap = self.QIP_parameters['mip_relative_gap']
+        integrality_tol = self.QIP_parameters['integrality_tol']
+        feasibility_tol = self.QIP_parameters['feasibility_tol']
+        threads = self.QIP_parameters.get('threads')
+
+        # set time limit (remaining time if resumed)
+        if time_limit is not None:
+            self.QIP.set_time_limit(max(time_limit - self.resume_time, 0))
+        # set mip relative gap
+        if mip_relative_gap is not None:
+            self.QIP.parameters.mip.tolerances.mipgap.set(mip_relative_gap)
+        # set mip integrality tolerance
+        if integrality_tol is not None:
+            self.QIP.parameters.mip.tolerances.integrality.set(integrality_tol)
+        # Set feasibility tolerance
+        if feasibility_tol is not None:
+            self.QIP.parameters.simplex.tolerances.feasibility.set(feasibility_tol)
+        # set number of threads (0: automatic)
+        if threads is not None:
+            self.QIP.parameters.threads.set(threads)
+
+        logging.info('QIP time Limit of %s', self.QIP.get_time_limit())
+        logging.info('QIP relative gap %s', self.QIP.parameters.mip.tolerances.mipgap.get())
+        logging.info('QIP integrality tol %s', self.QIP.parameters.mip.tolerances.integrality.get())
+        logging.info('QIP feasibility tol %s', self.QIP.parameters.simplex.tolerances.feasibility.get())
+        logging.info('QIP threads %s', self.QIP.parameters.threads.get())
+
+
+    def add_greedy_mip_start(self):
+        start = time.perf_counter()
+        _, _, U, Q = self.original_inputs()
+        allocation = greedy_allocation(session_ids=self.session_ids,
+                                       track_ids=self.track_ids,
+                                       paper_ids=self.paper_ids,
+                                       track_session_capacity=self.track_session_capacity,
+                                       U=U,
+                                       M=self.M,
+                                       T=self.T,
+                                       Q=Q,
+                                       bidder_cost=self.bidder_cost,
+                                       topic_cost=self.topic_cost,
+                                       topic_utility=self.topic_utility)
+        heuristic_time = time.perf_counter() - start
+
+        if allocation is None:
+            logging.info(f'Greedy heuristic found no feasible allocation in {round(heuristic_time,2)} sec, solve without MIP start')
+            return
+
+        heuristic_objective = self.add_mip_start_from_allocation(allocation)
+        self.heuristic_details = {'Heuristic': 'greedy',
+                                  'Objective_Value': heuristic_objective,
+                                  'Time': heuristic_time}
+        logging.info(f'Greedy heuristic objective value {heuristic_objective} in {round(heuristic_time,2)} sec added as MIP start')
+
+
+    def add_mip_start_from_allocation(self,
+                                      allocation,
+                                      effort_level=EffortLevel.Repair):
+        # MIP start from an allocation {paper_id:(session_id,track_id)} with the implied y, z and q (and w and v),
+        # if presolve, y and q of a class are those of its representative
+        allocation = self.canonicalize_allocation(allocation)
+        _, _, U, Q = self.original_inputs()
+        objective, y_ones, q_ones = evaluate_allocation(allocation=allocation,
+                                                        U=U,
+                                                        Q=Q,
+                                                        bidder_cost=self.bidder_cost,
+                                                        topic_cost=self.topic_cost,
+                                                        topic_utility=self.topic_utility)
+        z_ones = set((a,)+allocation[p] for a,p in self.M.keys() if p in allocation)
+
+        mip_start = self.QIP.new_solution()
+        for p, (j,k) in allocation.items():
+            mip_start.add_var_value(self.x[(p, j, k)], 1)
+        for key in y_ones:
+            if key in self.y:
+                mip_start.add_var_value(self.y[key], 1)
+        for key in z_ones:
+            if key in self.z:
+                mip_start.add_var_value(self.z[key], 1)
+        for key in q_ones:
+            if key in self.q:
+                mip_start.add_var_value(self.q[key], 1)
+        if self.formulation == 'linear':
+            for p,j,k,b in self.objective1_ids:
+                if allocation.get(p) == (j,k) and (b,j,k) in y_ones:
+                    mip_start.add_var_value(self.w[(p, j, k, b)], 1)
+            for p,j,k,t in self.objective3_ids:
+                if allocation.get(p) == (j,k) and (t,j,k) in q_ones:
+                    mip_start.add_var_value(self.v[(p, j, k, t)], 1)
+
+        # all variables which are not set explicitly are 0
+        self.QIP.add_mip_start(mip_start, effort_level=effort_level, complete_vars=True)
+
+        return objective
+
+
+    def add_warm_start(self,
+                       allocation,
+                       heuristic='warm_start'):
+        # MIP start from the previous solution (or a checkpoint), adapted to the what-if changes since then
+        start = time.perf_counter()
+        allocation = OrderedDict((p, (j,k)) for p, (j,k) in allocation.items() if p in self.paper_session_track_ids and (j,p) not in self.T)
+        for p, (j,k) in self.fixed_papers.items():
+            if self.symmetry_breaking is None:
+                allocation[p] = (j,k)
+        self.QIP.clear_mip_starts()
+        objective = self.add_mip_start_from_allocation(allocation, effort_level=EffortLevel.Repair)
+        self.heuristic_details = {'Heuristic': heuristic,
+                                  'Objective_Value': objective,
+                                  'Time': time.perf_counter() - start}
+        source = {'warm_start': 'Previous solution (after what-if changes)',
+                  'checkpoint': 'Checkpoint',
+                  'cache': 'Cached schedule (near hit)'}[heuristic]
+        logging.info(f'{source} with objective value {objective} added as MIP start')
+
+
+    # %% what-if changes of a built model
+    def _copy_inputs(self):
+        # the input dicts are shared with the caller, copy them before the first change
+        if not self.inputs_copied:
+            self.U, self.M, self.T, self.Q = dict(self.U), dict(self.M), dict(self.T), dict(self.Q)
+            self.inputs_copied = True
+        self.scorer = None
+
+
+    def _set_objective_coefficient(self, var, value):
+        objective = self.QIP.objective_expr
+        (objective.linear_part if objective.is_quad_expr() else objective).set_coefficient(var, value)
+
+
+    def _update_objective(self):
+        # pass the modified objective expression to the engine
+        self.QIP.maximize(self.QIP.objective_expr)
+
+
+    def _check_built(self):
+        if not self.QIP_built:
+            raise ValueError('QIP build-status:{QIP_built}, first call .build()!')
+
+
+    def add_time_conflict(self, p, j):
+        # paper_id:p cannot be presented in session_id:j, i.e., T(j,p)==1
+        self._check_built()
+        if p not in self.paper_session_track_ids or j not in self.session_ids:
+            raise ValueError(f'Paper{p} or Session{j} does not exist!')
+        if self.fixed_papers.get(p, (None,None))[0] == j:
+            raise ValueError(f'Paper{p} is fixed to Session{j}!')
+        self._copy_inputs()
+        self.T[(j,p)] = 1
+        for k in self.track_ids:
+            if (p, j, k) in self.x:
+                self.x[(p, j, k)].ub = 0
+        logging.info(f'WHAT-IF: Paper{p} cannot be presented in Session{j}')
+
+
+    def remove_paper(self, p):
+        # withdraw paper_id:p, i.e., fix all its x to 0 and remove its allocation constraint
+        self._check_built()
+        if p not in self.paper_session_track_ids:
+            raise ValueError(f'Paper{p} does not exist!')
+        self._copy_inputs()
+        self.QIP.remove_constraint(self.paper_constraints.pop(p))
+        for j,k in self.paper_session_track_ids[p]:
+            self.x[(p, j, k)].ub = 0
+            self.x[(p, j, k)].lb = 0
+        self.paper_ids = [q for q in self.paper_ids if q != p]
+        del self.paper_session_track_ids[p]
+        self.session_track_paper_ids = OrderedDict((key, [q for q in papers if q != p]) for key, papers in self.session_track_paper_ids.items())
+        self.U = {(b,q): u for (b,q), u in self.U.items() if q != p}
+        self.M = {(a,q): m for (a,q), m in self.M.items() if q != p}
+        self.T = {(j,q): c for (j,q), c in self.T.items() if q != p}
+        self.Q = {(q,t): c for (q,t), c in self.Q.items() if q != p}
+        if self.presolver is not None:
+            self.presolver.remove_paper(p)
+        self.fixed_papers.pop(p, None)
+
+        # with one paper less, not every track can have exactly track_session_capacity papers
+        if self.paper_distribution == 'exact':
+            self.QIP.remove_constraints(list(self.capacity_constraints.values()))
+            self.paper_distribution = 'upper_bound'
+            self.capacity_constraints = OrderedDict(zip(self.session_track_tuple_ids, self.add_capacity_constraints(self.session_track_tuple_ids)))
+            logging.info('WHAT-IF: paper_distribution changed from exact to upper_bound')
+        logging.info(f'WHAT-IF: Paper{p} removed')
+
+
+    def update_bid(self, b, p, value):
+        # set U(b,p)=value (value 0 or None removes the bid) and change the affected objective coefficients
+        self._check_built()
+        if self.presolver is not None:
+            raise NotImplementedError('update_bid() cannot be combined with presolve, since the bidder is merged into a class!')
+        if b not in self.bidder_ids or p not in self.paper_session_track_ids:
+            raise ValueError(f'Bidder{b} or Paper{p} does not exist!')
+        self._copy_inputs()
+        value = value or 0
+        if value == 0 and (b,p) not in self.U:
+            return
+        if value != 0:
+            self.U[(b,p)] = value
+        else:
+            del self.U[(b,p)]
+
+        if b not in self.active_bidder_ids:
+            self._add_bidder(b)
+        for j,k in self.paper_session_track_ids[p]:
+            if self.formulation == 'quadratic':
+                self.QIP.objective_expr.set_quadratic_coefficient(self.x[(p, j, k)], self.y[(b, j, k)], value)
+            else:
+                if (p, j, k, b) not in self.w:
+                    self.objective1_ids.append((p,j,k,b))
+                    self.add_product_variables(self.w, self.y, 'W', 'BIDDER', [(p, j, k, b)])
+                if value < 0:
+                    self.add_product_lower_bounds(self.w, self.y, 'W', 'BIDDER', [(p, j, k, b)])
+                self._set_objective_coefficient(self.w[(p, j, k, b)], value)
+        self._update_objective()
+        logging.info(f'WHAT-IF: U(Bidder{b},Paper{p})={value}')
+
+
+    def _add_bidder(self, b):
+        # y variables, single track constraints and costs of a bidder without bids in a sparse model
+        self.y.update(self.QIP.binary_var_dict([(b, j, k) for j,k in self.session_track_tuple_ids], name=self._name('y')))
+        for j,k in self.session_track_tuple_ids:
+            self.objective2_ids.append((b,j,k))
+            self._set_objective_coefficient(self.y[(b, j, k)], -self.bidder_cost*self.bidder_weights[b])
+        self.add_constraints((self.QIP.sum_vars(self.y[(b, j, k)] for k in self.track_ids) <= 1 for j in self.session_ids),
+                             (f'BIDDER{b}_SESSION{j}_CAN_ONLY_BE_IN_SINGLE_TRACK' for j in self.session_ids))
+        self.active_bidder_ids = self.active_bidder_ids + [b]
+
+
+    def fix_paper(self, p, j, k):
+        # paper_id:p must be presented in session_id:j and track_id:k
+        self._check_built()
+        if self.symmetry_breaking:
+            raise NotImplementedError('fix_paper() cannot be combined with symmetry_breaking, since tracks are interchangeable!')
+        if (p, j, k) not in self.x or self.x[(p, j, k)].ub == 0:
+            raise ValueError(f'Paper{p} cannot be presented in Session{j} Track{k}!')
+        self.unfix_paper(p)
+        self.x[(p, j, k)].lb = 1
+        self.fixed_papers[p] = (j,k)
+        logging.info(f'WHAT-IF: Paper{p} fixed to Session{j} Track{k}')
+
+
+    def unfix_paper(self, p):
+        self._check_built()
+        if p in self.fixed_papers:
+            self.x[(p,)+self.fixed_papers.pop(p)].lb = 0
+            logging.info(f'WHAT-IF: Paper{p} unfixed')
+
+
+    def set_costs(self,
+                  bidder_cost=None,
+                  topic_cost=None,
+                  topic_utility=None):
+        # change bidder_cost, topic_cost and/or topic_utility and the affected objective coefficients
+        self._check_built()
+        self._copy_inputs()
+        if bidder_cost is not None:
+            self.bidder_cost = bidder_cost
+            for b,j,k in self.objective2_ids:
+                self._set_objective_coefficient(self.y[(b, j, k)], -bidder_cost*self.bidder_weights[b])
+        if topic_cost is not None:
+            self.topic_cost = topic_cost
+            for t,j,k in self.objective4_ids:
+                self._set_objective_coefficient(self.q[(t, j, k)], -topic_cost*self.topic_weights[t])
+        if topic_utility is not None:
+            self.topic_utility = topic_utility
+            if self.formulation == 'linear' and topic_utility < 0:
+                self.add_product_lower_bounds(self.v, self.q, 'V', 'TOPIC', self.objective3_ids)
+            for p,j,k,t in self.objective3_ids:
+                if self.formulation == 'quadratic':
+                    self.QIP.objective_expr.set_quadratic_coefficient(self.x[(p, j, k)], self.q[(t, j, k)], topic_utility*self.topic_weights[t])
+                else:
+                    self._set_objective_coefficient(self.v[(p, j, k, t)], topic_utility*self.topic_weights[t])
+        self._update_objective()
+        logging.info(f'WHAT-IF: bidder_cost={self.bidder_cost}, topic_cost={self.topic_cost}, topic_utility={self.topic_utility}')
+
+
     def log_solve_details(self):
+        if self.cached_solve_details is not None:
+            logging.info('')
+            logging.info('SOLVE DETAILS (cache hit):')
+            for name, value in self.cached_solve_details.items():
+                logging.info(f'{name}: {value}')
+            return self.cached_solve_details
         details = self.QIP.get_solve_details()
         logging.info('')
         logging.info('SOLVE DETAILS:')
@@ -275,18 +834,31 @@ class QIP:
         logging.info('Hit Lim.: %s', details.has_hit_limit())
         logging.info('Objective Value: %s', self.QIP.objective_value)
         logging.info(f'Status: {self.QIP.get_solve_status()}')
-
-        return {'Problem': details.problem_type,
-                'Status': details.status,
-                'Time': details.time,
-                'Relative_Gap': details.mip_relative_gap,
-                'N_Iter': details.nb_iterations,
-                'Hit_Time_Limit': details.has_hit_limit(),
-                'Objective_Value': self.QIP.objective_value
-                }
+        if self.heuristic_details is not None:
+            logging.info('Heuristic Objective Value: %s', self.heuristic_details['Objective_Value'])
+            logging.info('Heuristic Time: %s sec', round(self.heuristic_details['Time'], 2))
+
+        qip_solve_details = {'Problem': details.problem_type,
+                             'Status': details.status,
+                             'Time': details.time,
+                             'Relative_Gap': details.mip_relative_gap,
+                             'N_Iter': details.nb_iterations,
+                             'Hit_Time_Limit': details.has_hit_limit(),
+                             'Objective_Value': self.QIP.objective_value
+                             }
+        if self.heuristic_details is not None:
+            qip_solve_details['Heuristic'] = self.heuristic_details['Heuristic']
+            qip_solve_details['Heuristic_Objective_Value'] = self.heuristic_details['Objective_Value']
+            qip_solve_details['Heuristic_Time'] = self.heuristic_details['Time']
+
+        return qip_solve_details
 
 
     def log_build_details(self):
+        if not self.QIP_built:
+            logging.info('')
+            logging.info('BUILD DETAILS: model not built (cache hit)')
+            return
         details = str(self.QIP.get_statistics())
         details = details.replace(' ','').replace('\n','').split('-')[1:]
 
@@ -294,6 +866,31 @@ class QIP:
         logging.info('BUILD DETAILS:')
         for detail in details:
             logging.info(detail)
+        for family, n in self.constraint_counts.items():
+            logging.info(f'{family}constraints:{n}')
+
+
+    def log_sparsity_details(self):
+        # size of the corresponding dense model, i.e., all variables over full cartesian products
+        n_subsessions = len(self.session_track_tuple_ids)
+        n_sessions = len(self.session_ids)
+        dense_variables = (len(self.paper_ids)+len(self.bidder_ids)+len(self.author_ids)+len(self.topic_ids))*n_subsessions
+        dense_constraints = OrderedDict([('paper', len(self.paper_ids)+n_subsessions),
+                                         ('time_conflict', len(self.T)*len(self.track_ids)),
+                                         ('bidder', len(self.bidder_ids)*n_sessions),
+                                         ('author', len(self.M)*n_subsessions+len(self.author_ids)*n_sessions),
+                                         ('topic', len(self.topic_ids)*n_sessions)])
+
+        sparse_variables = len(self.x)+len(self.y)+len(self.z)+len(self.q)
+        sparse_constraints = sum(self.constraint_counts.get(family, 0) for family in dense_constraints)
+
+        logging.info('')
+        logging.info('SPARSITY DETAILS:')
+        logging.info(f'x:{len(self.x)}/{len(self.paper_ids)*n_subsessions} | y:{len(self.y)}/{len(self.bidder_ids)*n_subsessions} | z:{len(self.z)}/{len(self.author_ids)*n_subsessions} | q:{len(self.q)}/{len(self.topic_ids)*n_subsessions}')
+        logging.info(f'variables:{sparse_variables} (dense:{dense_variables}, saved:{dense_variables-sparse_variables})')
+        for family, n in dense_constraints.items():
+            logging.info(f'{family}constraints:{self.constraint_counts.get(family, 0)} (dense:{n}, saved:{n-self.constraint_counts.get(family, 0)})')
+        logging.info(f'constraints:{sparse_constraints} (dense:{sum(dense_constraints.values())}, saved:{sum(dense_constraints.values())-sparse_constraints})')
 
 
     def summary(self):
@@ -320,11 +917,9 @@ class QIP:
                         ):
 
 
-        QIP_SCHEDULE = deepcopy(self.schedule)
-
         # create nice schedule
         FINAL_SCHEDULE = {}
-        for subsession, papers in QIP_SCHEDULE.items():
+        for subsession, papers in self.schedule.items():
 
             FINAL_SCHEDULE[subsession] = {}
 
@@ -440,40 +1035,92 @@ class QIP:
 
 
     def print_constraints(self,
-                          only_save=False
+                          only_save=False,
+                          folder=None
                           ):
-        to_write = 'CONSTRAINTS\n'
-        to_write += '##########################################################################\n'
-
-        k = 0
-        for m in range(0, self.QIP.number_of_constraints):
-            if self.QIP.get_constraint_by_index(m) is not None:
-                to_write += f'({k}):   {self.QIP.get_constraint_by_index(m)}\n'
-                k = k + 1
-
-        if only_save:
-            with open(os.path.join(self.savefolder,'qip_constraints_'+self.QIP_date_time+'.txt'), "w") as text_file:
-                text_file.write(to_write)
-        else:
-            print(to_write)
-            with open(os.path.join(self.savefolder,'qip_constraints_'+self.QIP_date_time+'.txt'), "w") as text_file:
-                text_file.write(to_write)
+        # constraints are written one by one to the file (and printed if not only_save)
+        with open(os.path.join(folder or self.savefolder or os.getcwd(),'qip_constraints_'+self.QIP_date_time+'.txt'), "w") as text_file:
+            text_file.write('CONSTRAINTS\n')
+            text_file.write('##########################################################################\n')
+            for k, ct in enumerate(self.QIP.iter_constraints()):
+                line = f'({k}):   {ct}\n'
+                text_file.write(line)
+                if not only_save:
+                    print(line, end='')
 
 
     def print_objective(self,
-                        only_save=False
+                        only_save=False,
+                        folder=None
                         ):
-        obj = 'OBJECTIVE\n'
-        obj += '##########################################################################\n'
-        obj += str(self.QIP.get_objective_expr())
-
-        if only_save:
-            with open(os.path.join(self.savefolder,'qip_objective_'+self.QIP_date_time+'.txt'), "w") as text_file:
-                text_file.write(obj)
+        # objective terms are written one by one to the file (and printed if not only_save), one term per line
+        objective = self.QIP.get_objective_expr()
+        with open(os.path.join(folder or self.savefolder or os.getcwd(),'qip_objective_'+self.QIP_date_time+'.txt'), "w") as text_file:
+            text_file.write('OBJECTIVE\n')
+            text_file.write('##########################################################################\n')
+            terms = objective.iter_terms() if not objective.is_quad_expr() else objective.linear_part.iter_terms()
+            lines = (f'{coef:+}{var}\n' for var, coef in terms)
+            if objective.is_quad_expr():
+                lines = chain(lines, (f'{coef:+}{pair.first}*{pair.second}\n' for pair, coef in objective.iter_quads()))
+            for line in chain(lines, [f'{objective.constant:+}\n'] if objective.constant else []):
+                text_file.write(line)
+                if not only_save:
+                    print(line, end='')
+
+
+    def estimate_export_size(self,
+                             export_format):
+        # rough size in MB of the model exported in export_format (see export_model), e.g., to decide if it is worth it
+        if self.backend == 'cplex':
+            cplex = self.QIP.get_cplex()
+            entries = (cplex.variables.get_num() + cplex.linear_constraints.get_num() +
+                       cplex.linear_constraints.get_num_nonzeros() + cplex.objective.get_num_quadratic_nonzeros())
         else:
-            print(obj)
-            with open(os.path.join(self.savefolder,'qip_objective_'+self.QIP_date_time+'.txt'), "w") as text_file:
-                text_file.write(obj)
+            objective = self.QIP.objective_expr
+            entries = (self.QIP.number_of_variables + self.QIP.number_of_constraints +
+                       sum(ct.left_expr.size + ct.right_expr.size for ct in self.QIP.iter_constraints()) +
+                       (objective.number_of_quadratic_terms if objective.is_quad_expr() else 0))
+        file_format, _, compression = export_format.partition('.')
+        bytes_per_entry = EXPORT_BYTES_PER_ENTRY[file_format][1 if self.model_names else 0]
+        return entries*bytes_per_entry*(EXPORT_COMPRESSION_RATIO if compression else 1)/2**20
+
+
+    def export_model(self,
+                     export_formats,
+                     folder=None):
+
+        '''
+        Exports the built model to folder (default: savefolder or the current working directory) in each of the
+        export_formats: 'txt' (constraints and objective as text, see print_constraints and print_objective) or a
+        format written by CPLEX, i.e., 'lp', 'mps' or 'sav', optionally compressed with a suffix '.gz' or '.bz2',
+        e.g., 'mps.gz'. The estimated size of each file is logged before it is written. With a backend other than
+        cplex, only 'txt' and (uncompressed) 'lp' written by docplex are available.
+        '''
+
+        if not self.QIP_built:
+            raise ValueError('QIP build-status:{QIP_built}, first call .build()!')
+        folder = folder or self.savefolder or os.getcwd()
+        paths = []
+        for export_format in export_formats:
+            file_format, _, compression = export_format.partition('.')
+            if file_format not in EXPORT_BYTES_PER_ENTRY or compression not in ['', 'gz', 'bz2']:
+                raise ValueError(f'Export format:{export_format} is not one of txt, lp, mps, sav (optionally with .gz or .bz2)!')
+            if self.backend != 'cplex' and export_format not in ['txt', 'lp']:
+                raise ValueError(f'Export format:{export_format} requires backend cplex, with backend {self.backend} use txt or lp!')
+            logging.info(f'Export model as {export_format}: estimated size {round(self.estimate_export_size(export_format),1)} MB')
+            start = time.perf_counter()
+            if file_format == 'txt':
+                self.print_constraints(only_save=True, folder=folder)
+                self.print_objective(only_save=True, folder=folder)
+                paths += [os.path.join(folder,name+'_'+self.QIP_date_time+'.txt') for name in ['qip_constraints', 'qip_objective']]
+            else:
+                paths.append(os.path.join(folder,'qip_model_'+self.QIP_date_time+'.'+export_format))
+                if self.backend == 'cplex':
+                    self.QIP.get_cplex().write(paths[-1])
+                else:
+                    self.QIP.export_as_lp(paths[-1])
+            logging.info(f'Exported model as {export_format} in {round(time.perf_counter()-start,2)} sec')
+        return paths
 
 
     def build(self):
@@ -484,77 +1131,170 @@ class QIP:
         logging.info(self.log_sep)
 
         # define QIP variables
-        self.define_QIP_variables()
+        with self.profiler.phase('define_QIP_variables'):
+            self.define_QIP_variables()
 
         # add paper variable x constraints
-        self.add_paper_constraints()
+        with self.profiler.phase('add_paper_constraints'):
+            self.add_paper_constraints()
 
         # add bidder variable y constraints
-        self.add_bidder_constraints()
+        with self.profiler.phase('add_bidder_constraints'):
+            self.add_bidder_constraints()
 
         # add author variable z constraints
-        self.add_author_constraints()
+        with self.profiler.phase('add_author_constraints'):
+            self.add_author_constraints()
 
         # add topic variable q constraints
-        self.add_topic_constraints()
+        with self.profiler.phase('add_topic_constraints'):
+            self.add_topic_constraints()
+
+        # add symmetry breaking constraints for interchangeable tracks
+        if self.symmetry_breaking:
+            with self.profiler.phase('add_symmetry_breaking_constraints'):
+                self.add_symmetry_breaking_constraints()
 
         # add objective
-        self.add_objective()
+        with self.profiler.phase('add_objective'):
+            self.add_objective()
 
         self.QIP_built = True
         logging.info('Succesfully Built QIP')
-        self.log_build_details()
+        with self.profiler.phase('log_build_details'):
+            self.log_build_details()
+            if self.sparse_model:
+                self.log_sparsity_details()
 
-        if self.save_results:
-            self.print_constraints(only_save=True)
-            self.print_objective(only_save=True)
+        if self.save_results and self.model_export:
+            with self.profiler.phase('save_model'):
+                self.export_model(self.model_export)
 
 
     def add_topic_constraints(self):
 
         # a topic-"bidder" cannot be in more than one track per session
-        for t in self.topic_ids:
-            for j in self.session_ids:
+        keys = list(product(self.active_topic_ids, self.session_ids))
+        self.add_constraints((self.QIP.sum_vars(self.q[(t, j, k)] for k in self.track_ids) <= 1 for t,j in keys),
+                             (f'TOPIC{t}_SESSION{j}_CAN_ONLY_BE_IN_SINGLE_TRACK' for t,j in keys))
+        self.constraint_counts['topic'] = len(keys)
+
+
+    def add_symmetry_breaking_constraints(self):
+        # Tracks within a session are interchangeable, i.e., each schedule has |track_ids|! equivalent copies.
+        # Papers allowed in session j are ordered p_0,p_1,... as in paper_ids and tracks are ordered k_0,k_1,... as in track_ids.
+        n_constraints = 0
+        for j in self.session_ids:
+            session_paper_ids = self.session_track_paper_ids[(j, self.track_ids[0])]
+
+            if self.symmetry_breaking == 'lowest_paper':
+                # tracks are ordered by the lowest paper index they contain, i.e., paper p_m can only be in track k_i
+                # if track k_{i-1} contains a paper p_l with l<m (O(|papers|^2) nonzeros per session)
+                for i in range(1, len(self.track_ids)):
+                    k, k_previous = self.track_ids[i], self.track_ids[i-1]
+                    self.add_constraints((self.x[(p, j, k)] <= self.QIP.sum_vars(self.x[(l, j, k_previous)] for l in session_paper_ids[:m])
+                                          for m, p in enumerate(session_paper_ids)),
+                                         (f'SYMMETRY_SESSION{j}_TRACK{k}_PAPER{p}_LOWEST_PAPER' for p in session_paper_ids))
+                    n_constraints += len(session_paper_ids)
+
+            elif self.symmetry_breaking == 'weighted_order':
+                # tracks are ordered by the weighted sum of paper positions, i.e., sum_m (m+1)*x_{p_m,j,k_i} is
+                # nondecreasing in i (O(|papers|) nonzeros per session, ties are not broken)
+                weights = list(range(1, len(session_paper_ids)+1))
+                for i in range(1, len(self.track_ids)):
+                    k, k_previous = self.track_ids[i], self.track_ids[i-1]
+                    C_previous = self.QIP.scal_prod([self.x[(p, j, k_previous)] for p in session_paper_ids], weights)
+                    C = self.QIP.scal_prod([self.x[(p, j, k)] for p in session_paper_ids], weights)
+                    self.QIP.add_constraint(ct=C_previous <= C,
+                                            ctname=f'SYMMETRY_SESSION{j}_TRACK{k}_WEIGHTED_ORDER')
+                    n_constraints += 1
 
-                C = self.QIP.sum(self.q[(t, j, k)] for k in self.track_ids)
+            else:
+                raise NotImplementedError(f'symmetry_breaking:{self.symmetry_breaking} not implemented!')
+        self.constraint_counts['symmetry'] = n_constraints
 
-                self.QIP.add_constraint(ct=(C<=1),
-                                        ctname=f'TOPIC{t}_SESSION{j}_CAN_ONLY_BE_IN_SINGLE_TRACK')
 
+    def canonicalize_allocation(self, allocation):
+        # Permute the tracks within each session of an arbitrary allocation {paper_id:(session_id,track_id)} such
+        # that it satisfies the symmetry breaking constraints, e.g., to use it as MIP start.
+        if not self.symmetry_breaking:
+            return allocation
 
-    def add_paper_constraints(self):
+        canonical_allocation = OrderedDict()
+        for j in self.session_ids:
+            position = {p: m for m, p in enumerate(self.session_track_paper_ids[(j, self.track_ids[0])])}
+            track_keys = {}
+            for k in self.track_ids:
+                positions = [position[p] for p, v in allocation.items() if v == (j,k)]
+                if self.symmetry_breaking == 'lowest_paper':
+                    track_keys[k] = min(positions) if positions else len(position)
+                else:
+                    track_keys[k] = sum(m+1 for m in positions)
+            canonical_tracks = sorted(self.track_ids, key=lambda k: track_keys[k])
+            track_map = {k: self.track_ids[i] for i, k in enumerate(canonical_tracks)}
+            for p, (j_p, k_p) in allocation.items():
+                if j_p == j:
+                    canonical_allocation[p] = (j, track_map[k_p])
+        return canonical_allocation
+
+
+    def relabel_tracks(self):
+        # The symmetry breaking model determines the tracks only up to a permutation within each session. Map the
+        # canonical tracks back to track labels such that within each session track_ids[0] has the highest attendance.
+        self.track_labels = OrderedDict()
+        for j in self.session_ids:
+            canonical_tracks = sorted(self.track_ids, key=lambda k: -self.attendance[(j,k)])
+            for i, k in enumerate(canonical_tracks):
+                self.track_labels[(j,k)] = self.track_ids[i]
+
+        if self._allocation is None:
+            # solution of .solve(): move the slots of the result
+            slot_of = {key: s for s, key in enumerate(self.session_track_tuple_ids)}
+            self.result.relabel([slot_of[(j, self.track_labels[(j,k)])] for j,k in self.session_track_tuple_ids])
+            return
+        self.allocation = OrderedDict((p, (j, self.track_labels[(j,k)])) for p, (j,k) in self.allocation.items())
+        schedule = OrderedDict(((j, self.track_labels[(j,k)]), papers) for (j,k), papers in self.schedule.items())
+        self.schedule = OrderedDict((key, schedule[key]) for key in self.session_track_tuple_ids if key in schedule)
+        self.attendance = OrderedDict(((j, self.track_labels[(j,k)]), self.attendance[(j,k)]) for j,k in self.session_track_tuple_ids)
+        self.attendance = OrderedDict((key, self.attendance[key]) for key in self.session_track_tuple_ids)
 
-        # Each paper p appears exactly once in a (session,track) tuple
-        for p in self.paper_ids:
 
-             C = self.QIP.sum(self.x[(p, j, k)] for j,k in self.session_track_tuple_ids)
+    def add_paper_constraints(self):
 
-             self.QIP.add_constraint(ct=(C==1),
-                                     ctname=f'PAPER{p}_ALLOC_EXACTLY_ONCE')
+        # Each paper p appears exactly once in a (session,track) tuple
+        cts = self.add_constraints((self.QIP.sum_vars(self.x[(p, j, k)] for j,k in self.paper_session_track_ids[p]) == 1 for p in self.paper_ids),
+                                   (f'PAPER{p}_ALLOC_EXACTLY_ONCE' for p in self.paper_ids))
+        self.paper_constraints = OrderedDict(zip(self.paper_ids, cts))
 
         # Each Track has exactly n_papers_per_track papers
-        for j,k in self.session_track_tuple_ids:
-
-            C = self.QIP.sum(self.x[(p, j, k)] for p in self.paper_ids)
-
-            if self.paper_distribution == 'upper_bound':
-                self.QIP.add_constraint(ct=C<=self.track_session_capacity,
-                                        ctname=f'SESSION{j}_TRACK{k}_HAS_<=_{self.track_session_capacity}_PAPERS')
-
-            elif self.paper_distribution == 'exact':
-                self.QIP.add_constraint(ct=C==self.track_session_capacity,
-                                        ctname=f'SESSION{j}_TRACK{k}_HAS_==_{self.track_session_capacity}_PAPERS')
-            else:
-                raise NotImplementedError(f'paper_distribution:{self.paper_distribution} not implemented!')
+        if self.paper_distribution not in ['upper_bound', 'exact']:
+            raise NotImplementedError(f'paper_distribution:{self.paper_distribution} not implemented!')
+        self.capacity_constraints = OrderedDict(zip(self.session_track_tuple_ids, self.add_capacity_constraints(self.session_track_tuple_ids)))
+        self.constraint_counts['paper'] = len(self.paper_constraints) + len(self.capacity_constraints)
 
         # Time Conflicts: paper p cannot be presented in session j
-        for j,p in self.T.keys():
-            for k in self.track_ids:
-                self.QIP.add_constraint(ct=self.x[(p, j, k)] == 0,
-                                        ctname=f'PAPER{p}_CANNOT_BE_IN_SESSION{j}')
+        # (in a sparse model the corresponding x variables are not created at all)
+        n_constraints = 0
+        if not self.sparse_model:
+            keys = [(p, j, k) for j,p in self.T.keys() for k in self.track_ids]
+            self.add_constraints((self.x[key] == 0 for key in keys),
+                                 (f'PAPER{p}_CANNOT_BE_IN_SESSION{j}' for p,j,k in keys))
+            n_constraints = len(keys)
+        self.constraint_counts['time_conflict'] = n_constraints
 
         # Add specific paper constraints
+        n_constraints = self.QIP.number_of_constraints
         self._add_specific_paper_constraints()
+        self.constraint_counts['specific'] = self.QIP.number_of_constraints - n_constraints
+
+
+    def add_capacity_constraints(self, session_track_tuple_ids):
+        C = [self.QIP.sum_vars(self.x[(p, j, k)] for p in self.session_track_paper_ids[(j,k)]) for j,k in session_track_tuple_ids]
+        if self.paper_distribution == 'upper_bound':
+            return self.add_constraints((c <= self.track_session_capacity for c in C),
+                                        (f'SESSION{j}_TRACK{k}_HAS_<=_{self.track_session_capacity}_PAPERS' for j,k in session_track_tuple_ids))
+        return self.add_constraints((c == self.track_session_capacity for c in C),
+                                    (f'SESSION{j}_TRACK{k}_HAS_==_{self.track_session_capacity}_PAPERS' for j,k in session_track_tuple_ids))
 
 
     def _add_specific_paper_constraints(self):
@@ -573,73 +1313,205 @@ class QIP:
 
 
 
+    def extract_slots(self, Sol):
+        # slot (position in session_track_tuple_ids) of each paper, -1 if not allocated, x values are fetched in one call
+        keys = list(self.x.keys())
+        paper_position = {p: n for n, p in enumerate(self.paper_ids)}
+        slot_of = {key: s for s, key in enumerate(self.session_track_tuple_ids)}
+        slots = np.full(len(self.paper_ids), -1, dtype=np.int32)
+        for i in np.flatnonzero(np.asarray(Sol.get_values(list(self.x.values()))) > 0.5).tolist():
+            p, j, k = keys[i]
+            slots[paper_position[p]] = slot_of[(j,k)]
+        return slots
+
+
     def calc_attendance(self):
-        for j,k in self.session_track_tuple_ids:
-            self.attendance[(j,k)]=int(sum([self.y[(b, j, k)].solution_value for b in self.bidder_ids]))
+        if self.presolver is not None:
+            # expand the classes, i.e., attendance of the original bidders in the schedule
+            attendance = self.score(allocation=self.allocation)['Attendance']
+            self.result.set_attendance([attendance[key] for key in self.session_track_tuple_ids])
+            return
+        # number of bidders with y==1 per slot, y values are fetched in one call
+        keys = list(self.y.keys())
+        slot_of = {key: s for s, key in enumerate(self.session_track_tuple_ids)}
+        attending = np.flatnonzero(np.asarray(self.QIP.solution.get_values(list(self.y.values()))) > 0.5).tolist()
+        self.result.set_attendance(np.bincount(np.array([slot_of[keys[i][1:]] for i in attending], dtype=np.int64), minlength=len(self.session_track_tuple_ids)))
+
+
+    def score(self,
+              allocation=None,
+              return_attending=False):
+        # objective terms, attendance and constraint violations of an arbitrary allocation (default: the solution)
+        return self.get_scorer().score(allocation=self.allocation if allocation is None else allocation,
+                                       return_attending=return_attending)
+
+
+    def get_scorer(self):
+        if self.scorer is None:
+            # with the original bidders and topics, i.e., exact also if presolve
+            bidder_ids, topic_ids, U, Q = self.original_inputs()
+            self.scorer = ScheduleScorer(session_ids=self.session_ids,
+                                         track_ids=self.track_ids,
+                                         paper_ids=self.paper_ids,
+                                         bidder_ids=bidder_ids,
+                                         topic_ids=topic_ids,
+                                         track_session_capacity=self.track_session_capacity,
+                                         paper_distribution=self.paper_distribution,
+                                         U=U,
+                                         M=self.M,
+                                         T=self.T,
+                                         Q=Q,
+                                         bidder_cost=self.bidder_cost,
+                                         topic_cost=self.topic_cost,
+                                         topic_utility=self.topic_utility)
+        return self.scorer
 
 
 
     def add_bidder_constraints(self):
         # Bidder can only be present in one track simulataneously
-        for b in self.bidder_ids:
-            for j in self.session_ids:
-
-                C = self.QIP.sum(self.y[(b, j, k)] for k in self.track_ids)
-
-                self.QIP.add_constraint(ct=(C<=1),
-                                        ctname=f'BIDDER{b}_SESSION{j}_CAN_ONLY_BE_IN_SINGLE_TRACK')
+        keys = list(product(self.active_bidder_ids, self.session_ids))
+        self.add_constraints((self.QIP.sum_vars(self.y[(b, j, k)] for k in self.track_ids) <= 1 for b,j in keys),
+                             (f'BIDDER{b}_SESSION{j}_CAN_ONLY_BE_IN_SINGLE_TRACK' for b,j in keys))
+        self.constraint_counts['bidder'] = len(keys)
 
 
     def add_author_constraints(self):
+        if self.author_formulation == 'compact':
+            self.add_compact_author_constraints()
+            return
+        elif self.author_formulation != 'presence':
+            raise NotImplementedError(f'author_formulation:{self.author_formulation} not implemented!')
+
         # Author must be in session,track where his paper is allocated to
-        for a,p in self.M.keys():
-            for j in self.session_ids:
-                for k in self.track_ids:
-                    self.QIP.add_constraint(ct=self.z[(a, j, k)] >= self.x[(p, j, k)],
-                                            ctname=f'AUTHOR{a}_PAPER{p}_SESSION{j}_TRACK{j}_PRESENCE')
+        keys = [(a, p, j, k) for a,p in self.M.keys() for j,k in self.paper_session_track_ids[p]]
+        self.add_constraints((self.z[(a, j, k)] >= self.x[(p, j, k)] for a,p,j,k in keys),
+                             (f'AUTHOR{a}_PAPER{p}_SESSION{j}_TRACK{j}_PRESENCE' for a,p,j,k in keys))
+        n_constraints = len(keys)
 
         # An author cannot be in more than one track per session
-        for a in self.author_ids:
-            for j in self.session_ids:
-
-                C = self.QIP.sum(self.z[(a, j, k)] for k in self.track_ids)
-
-                self.QIP.add_constraint(ct=(C<=1),
-                                        ctname=f'AUTHOR{a}_SESSION{j}_CAN_ONLY_BE_IN_SINGLE_TRACK')
+        keys = list(product(self.active_author_ids, self.session_ids))
+        self.add_constraints((self.QIP.sum_vars(self.z[(a, j, k)] for k in self.track_ids) <= 1 for a,j in keys),
+                             (f'AUTHOR{a}_SESSION{j}_CAN_ONLY_BE_IN_SINGLE_TRACK' for a,j in keys))
+        n_constraints += len(keys)
+        self.constraint_counts['author'] = n_constraints
+
+
+    def add_compact_author_constraints(self):
+        # An author cannot present in more than one track per session, with rows per author and subsession instead
+        # of per author, paper and subsession. Authors with a single paper need no rows and no z variables.
+
+        # two papers p,q: if p is in track k of session j, q is in no other track of session j (the row of track k'
+        # excludes q in k and p in k'), no z variables
+        keys = [(a, j, k) for a, papers in self.author_paper_ids.items() if len(papers) == 2 for j,k in self.session_track_tuple_ids
+                if (papers[0], j, k) in self.x]
+        self.add_constraints((self.x[(self.author_paper_ids[a][0], j, k)] +
+                              self.QIP.sum_vars(self.x[(self.author_paper_ids[a][1], j, l)] for l in self.track_ids if l != k and (self.author_paper_ids[a][1], j, l) in self.x) <= 1
+                              for a,j,k in keys),
+                             (f'AUTHOR{a}_SESSION{j}_TRACK{k}_PAPER_PAIR' for a,j,k in keys))
+        n_constraints = len(keys)
+
+        # three or more papers: the papers of the author in track k of session j need z_{a,j,k}, i.e., at most
+        # min(papers, track_session_capacity) papers, and the author is in at most one track per session
+        author_ids = [a for a, papers in self.author_paper_ids.items() if len(papers) >= 3]
+        keys = [(a, j, k) for a in author_ids for j,k in self.session_track_tuple_ids]
+        self.add_constraints((self.QIP.sum_vars(self.x[(p, j, k)] for p in self.author_paper_ids[a] if (p, j, k) in self.x) <=
+                              min(len(self.author_paper_ids[a]), self.track_session_capacity)*self.z[(a, j, k)]
+                              for a,j,k in keys),
+                             (f'AUTHOR{a}_SESSION{j}_TRACK{k}_PRESENCE' for a,j,k in keys))
+        n_constraints += len(keys)
+
+        keys = list(product(author_ids, self.session_ids))
+        self.add_constraints((self.QIP.sum_vars(self.z[(a, j, k)] for k in self.track_ids) <= 1 for a,j in keys),
+                             (f'AUTHOR{a}_SESSION{j}_CAN_ONLY_BE_IN_SINGLE_TRACK' for a,j in keys))
+        n_constraints += len(keys)
+        self.constraint_counts['author'] = n_constraints
 
 
     def add_objective(self):
 
         # create summation index only for U(b,p)>0
         for b,p in self.U.keys():
-            for j,k in self.session_track_tuple_ids:
+            for j,k in self.paper_session_track_ids[p]:
                 self.objective1_ids.append((p,j,k,b))
 
         # create summation index for bidder cost
-        for b in self.bidder_ids:
+        for b in self.active_bidder_ids:
             for j,k in self.session_track_tuple_ids:
                 self.objective2_ids.append((b,j,k))
 
         # create summation index only for Q(p,t)>0
         for p,t in self.Q.keys():
-            for j,k in self.session_track_tuple_ids:
+            for j,k in self.paper_session_track_ids[p]:
                 self.objective3_ids.append((p,j,k,t))
 
         # create summation index for topic cost
-        for t in self.topic_ids:
+        for t in self.active_topic_ids:
             for j,k in self.session_track_tuple_ids:
                 self.objective4_ids.append((t,j,k))
 
-        # set quadratic objective
-        objective1 = self.QIP.sum(self.x[(p, j, k)]*self.y[(b, j, k)]*self.U[(b,p)] for p,j,k,b in self.objective1_ids)
+        # the objective is built in one pass from (variable, coefficient) lists, i.e., without intermediate expressions
+        # (if presolve, the costs and the topic utility of a class are multiplied by its weight)
+        objective2 = [(self.y[(b, j, k)], -self.bidder_cost*self.bidder_weights[b]) for b,j,k in self.objective2_ids]
+
+        objective4 = [(self.q[(t, j, k)], -self.topic_cost*self.topic_weights[t]) for t,j,k in self.objective4_ids]
+
+        if self.formulation == 'quadratic':
+            # set quadratic objective
+            objective1 = [(self.x[(p, j, k)], self.y[(b, j, k)], self.U[(b,p)]) for p,j,k,b in self.objective1_ids]
+
+            objective3 = [(self.x[(p, j, k)], self.q[(t, j, k)], self.topic_utility*self.topic_weights[t]) for p,j,k,t in self.objective3_ids]
+
+            linear_terms = objective2 + objective4
+            objective = QuadExpr(self.QIP, quads=objective1+objective3,
+                                 linexpr=self.QIP.scal_prod([var for var, _ in linear_terms], [coef for _, coef in linear_terms]))
+
+        elif self.formulation == 'linear':
+            # set linear objective, i.e., replace the products x*y and x*q by continuous product variables w and v
+            self.add_linearization_constraints()
+
+            objective1 = [(self.w[(p, j, k, b)], self.U[(b,p)]) for p,j,k,b in self.objective1_ids]
+
+            objective3 = [(self.v[(p, j, k, t)], self.topic_utility*self.topic_weights[t]) for p,j,k,t in self.objective3_ids]
+
+            linear_terms = objective1 + objective2 + objective3 + objective4
+            objective = self.QIP.scal_prod([var for var, _ in linear_terms], [coef for _, coef in linear_terms])
+
+        else:
+            raise NotImplementedError(f'formulation:{self.formulation} not implemented!')
+
+        self.QIP.maximize(objective)
+
 
-        objective2 = self.QIP.sum(self.bidder_cost*self.y[(b, j, k)] for b,j,k in self.objective2_ids)
+    def add_linearization_constraints(self):
+        # McCormick linearization of binary products: since the objective is maximized, w<=x and w<=y suffice for
+        # positive objective coefficients, w>=x+y-1 is only needed for negative ones.
+        self.w = {}  # continuous QIP product variable w_{p,j,k,b} in [0,1] with w_{p,j,k,b}==x_{p,j,k}*y_{b,j,k}
+        self.v = {}  # continuous QIP product variable v_{p,j,k,t} in [0,1] with v_{p,j,k,t}==x_{p,j,k}*q_{t,j,k}
 
-        objective3 = self.QIP.sum(self.x[(p, j, k)]*self.q[(t, j, k)]*self.topic_utility for p,j,k,t in self.objective3_ids)
+        n_constraints = self.add_product_variables(self.w, self.y, 'W', 'BIDDER', self.objective1_ids)
+        n_constraints += self.add_product_lower_bounds(self.w, self.y, 'W', 'BIDDER', [(p, j, k, b) for p,j,k,b in self.objective1_ids if self.U[(b,p)] < 0])
 
-        objective4 = self.QIP.sum(self.topic_cost*self.q[(t, j, k)] for t,j,k in self.objective4_ids)
+        n_constraints += self.add_product_variables(self.v, self.q, 'V', 'TOPIC', self.objective3_ids)
+        if self.topic_utility < 0:
+            n_constraints += self.add_product_lower_bounds(self.v, self.q, 'V', 'TOPIC', self.objective3_ids)
+        self.constraint_counts['linearization'] = n_constraints
 
-        self.QIP.maximize(objective1-objective2+objective3-objective4)
 
+    def add_product_variables(self, products, others, prefix, entity, keys):
+        # linearization variables products[(p,j,k,e)]==x_{p,j,k}*others[(e,j,k)] with the upper bounds x and others
+        products.update(self.QIP.continuous_var_dict(keys, lb=0, ub=1, name=self._name(prefix.lower())))
+        self.add_constraints((products[(p, j, k, e)] <= self.x[(p, j, k)] for p,j,k,e in keys),
+                             (f'{prefix}_PAPER{p}_SESSION{j}_TRACK{k}_{entity}{e}_UB_X' for p,j,k,e in keys))
+        self.add_constraints((products[(p, j, k, e)] <= others[(e, j, k)] for p,j,k,e in keys),
+                             (f'{prefix}_PAPER{p}_SESSION{j}_TRACK{k}_{entity}{e}_UB_{"Y" if prefix == "W" else "Q"}' for p,j,k,e in keys))
+        return 2*len(keys)
 
 
+    def add_product_lower_bounds(self, products, others, prefix, entity, keys):
+        # products[(p,j,k,e)]>=x_{p,j,k}+others[(e,j,k)]-1 is only needed for negative objective coefficients
+        keys = [key for key in keys if (prefix, key) not in self.product_lower_bounds]
+        cts = self.add_constraints((products[(p, j, k, e)] >= self.x[(p, j, k)] + others[(e, j, k)] - 1 for p,j,k,e in keys),
+                                   (f'{prefix}_PAPER{p}_SESSION{j}_TRACK{k}_{entity}{e}_LB' for p,j,k,e in keys))
+        self.product_lower_bounds.update(zip(((prefix, key) for key in keys), cts))
+        return len(keys)
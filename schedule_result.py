@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Compact result of a solve: the slot of each paper and the attendance per slot as arrays, saved as a single .npz file.
+
+@author: jakob
+"""
+
+
+# Libs
+from collections import OrderedDict
+from itertools import product
+import numpy as np
+
+
+# %%
+class ScheduleResult:
+
+    '''
+    This implements the class ScheduleResult.
+    A slot is the position of a (session_id,track_id) tuple in product(session_ids,track_ids). slots[n] is the slot of
+    paper_ids[n] (-1 if the paper is not allocated) and slot_attendance[s] the attendance of slot s. The dicts
+    allocation {paper_id:(session_id,track_id)}, schedule {(session_id,track_id):[paper_id]} and attendance
+    {(session_id,track_id):attendance} of the class QIP are built from the arrays on first access.
+    '''
+
+    __slots__ = ['session_ids', 'track_ids', 'paper_ids', 'slots', 'slot_attendance', '_allocation', '_schedule', '_attendance']
+
+    def __init__(self,
+                 session_ids,
+                 track_ids,
+                 paper_ids,
+                 slots,
+                 slot_attendance=None):
+
+        self.session_ids = list(session_ids)
+        self.track_ids = list(track_ids)
+        self.paper_ids = list(paper_ids)
+        self.slots = np.asarray(slots, dtype=np.int32)
+        self.slot_attendance = np.zeros(len(self.session_ids)*len(self.track_ids), dtype=np.int64) if slot_attendance is None else np.asarray(slot_attendance)
+        self._clear_views()
+
+
+    @classmethod
+    def from_allocation(cls, session_ids, track_ids, paper_ids, allocation, attendance=None):
+        # e.g. for the engines which set the allocation {paper_id:(session_id,track_id)} and attendance as dicts
+        slot_of = {key: s for s, key in enumerate(product(session_ids, track_ids))}
+        return cls(session_ids=session_ids,
+                   track_ids=track_ids,
+                   paper_ids=paper_ids,
+                   slots=[slot_of[allocation[p]] if p in allocation else -1 for p in paper_ids],
+                   slot_attendance=None if attendance is None else [attendance.get(key, 0) for key in slot_of])
+
+
+    def _clear_views(self):
+        self._allocation = None
+        self._schedule = None
+        self._attendance = None
+
+
+    def slot_key(self, s):
+        return (self.session_ids[s // len(self.track_ids)], self.track_ids[s % len(self.track_ids)])
+
+
+    def _allocated_order(self):
+        # allocated papers ordered by slot and within each slot by paper_ids
+        allocated = np.flatnonzero(self.slots >= 0)
+        return allocated[np.argsort(self.slots[allocated], kind='stable')].tolist()
+
+
+    @property
+    def allocation(self):
+        if self._allocation is None:
+            self._allocation = OrderedDict((self.paper_ids[n], self.slot_key(int(self.slots[n]))) for n in self._allocated_order())
+        return self._allocation
+
+
+    @property
+    def schedule(self):
+        if self._schedule is None:
+            self._schedule = OrderedDict()
+            for n in self._allocated_order():
+                self._schedule.setdefault(self.slot_key(int(self.slots[n])), []).append(self.paper_ids[n])
+        return self._schedule
+
+
+    @property
+    def attendance(self):
+        if self._attendance is None:
+            self._attendance = OrderedDict((self.slot_key(s), a) for s, a in enumerate(self.slot_attendance.tolist()))
+        return self._attendance
+
+
+    def set_attendance(self, slot_attendance):
+        self.slot_attendance = np.asarray(slot_attendance)
+        self._attendance = None
+
+
+    def relabel(self, new_slots):
+        # move slot s to new_slots[s], e.g., to permute the tracks within each session
+        new_slots = np.asarray(new_slots, dtype=np.int32)
+        self.slots = np.where(self.slots >= 0, new_slots[self.slots], -1).astype(np.int32)
+        slot_attendance = np.empty_like(self.slot_attendance)
+        slot_attendance[new_slots] = self.slot_attendance
+        self.slot_attendance = slot_attendance
+        self._clear_views()
+
+
+    def save(self, path):
+        # ids are saved as arrays, i.e., they must be all integers or all strings (loaded without pickle)
+        np.savez(path,
+                 session_ids=np.array(self.session_ids),
+                 track_ids=np.array(self.track_ids),
+                 paper_ids=np.array(self.paper_ids),
+                 slots=self.slots,
+                 slot_attendance=self.slot_attendance)
+
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(session_ids=arrays['session_ids'].tolist(),
+                       track_ids=arrays['track_ids'].tolist(),
+                       paper_ids=arrays['paper_ids'].tolist(),
+                       slots=arrays['slots'],
+                       slot_attendance=arrays['slot_attendance'])
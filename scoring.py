@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized scoring of arbitrary allocations, e.g., hand-edited schedules, without solving the QIP.
+
+@author: jakob
+"""
+
+
+# Libs
+from collections import OrderedDict
+import numpy as np
+
+
+# %%
+class ScheduleScorer:
+
+    '''
+    This implements the class ScheduleScorer.
+    The inputs are the same as for the class QIP. U, Q, M and T are converted once into sparse index arrays, such
+    that an allocation {paper_id:(session_id,track_id)} is scored with a few NumPy operations. The implied optimal
+    y and q variables are computed in closed form, i.e., a bidder (topic) attends the track with the highest
+    utility per session if it beats the bidder (topic) cost.
+    '''
+
+    def __init__(self,
+                 session_ids,
+                 track_ids,
+                 paper_ids,
+                 bidder_ids,
+                 topic_ids,
+                 track_session_capacity,
+                 paper_distribution,
+                 U,
+                 M,
+                 T,
+                 Q,
+                 bidder_cost,
+                 topic_cost,
+                 topic_utility):
+
+        self.session_ids = session_ids
+        self.track_ids = track_ids
+        self.paper_ids = paper_ids
+        self.bidder_ids = bidder_ids
+        self.topic_ids = topic_ids
+        self.track_session_capacity = track_session_capacity
+        self.paper_distribution = paper_distribution
+        self.bidder_cost = bidder_cost
+        self.topic_cost = topic_cost
+        self.topic_utility = topic_utility
+
+        self.paper_index = {p: i for i, p in enumerate(paper_ids)}
+        self.session_index = {j: i for i, j in enumerate(session_ids)}
+        self.track_index = {k: i for i, k in enumerate(track_ids)}
+        bidder_index = {b: i for i, b in enumerate(bidder_ids)}
+        topic_index = {t: i for i, t in enumerate(topic_ids)}
+        self.author_ids = list(OrderedDict.fromkeys(a for a,p in M.keys()))
+        author_index = {a: i for i, a in enumerate(self.author_ids)}
+
+        # sparse (entity, paper, value) arrays
+        self.bid_bidders = np.array([bidder_index[b] for b,p in U.keys()], dtype=np.int64)
+        self.bid_papers = np.array([self.paper_index[p] for b,p in U.keys()], dtype=np.int64)
+        self.bid_values = np.array(list(U.values()), dtype=float)
+        self.paper_topic_topics = np.array([topic_index[t] for p,t in Q.keys()], dtype=np.int64)
+        self.paper_topic_papers = np.array([self.paper_index[p] for p,t in Q.keys()], dtype=np.int64)
+        self.paper_topic_values = np.full(len(Q), float(topic_utility))
+        self.paper_author_authors = np.array([author_index[a] for a,p in M.keys()], dtype=np.int64)
+        self.paper_author_papers = np.array([self.paper_index[p] for a,p in M.keys()], dtype=np.int64)
+
+        # forbidden[paper, session]==True iff T(j,p)==1
+        self.forbidden = np.zeros((len(paper_ids), len(session_ids)), dtype=bool)
+        for j,p in T.keys():
+            if p in self.paper_index and j in self.session_index:
+                self.forbidden[self.paper_index[p], self.session_index[j]] = True
+
+
+    def allocation_arrays(self, allocation):
+        # allocation -> session index and track index per paper index (-1 if the paper is not allocated)
+        session_of = np.full(len(self.paper_ids), -1, dtype=np.int64)
+        track_of = np.full(len(self.paper_ids), -1, dtype=np.int64)
+        for p, (j,k) in allocation.items():
+            if p not in self.paper_index:
+                raise ValueError(f'Paper{p} is not in paper_ids!')
+            if j not in self.session_index or k not in self.track_index:
+                raise ValueError(f'Paper{p} is allocated to unknown Session{j} Track{k}!')
+            session_of[self.paper_index[p]] = self.session_index[j]
+            track_of[self.paper_index[p]] = self.track_index[k]
+        return session_of, track_of
+
+
+    def _best_tracks(self, entities, papers, values, session_of, track_of, cost):
+        # sums per (entity,session,track) over allocated papers and the best track per (entity,session) if it beats
+        # the cost. Returns entity, session and track indices as well as the sums of the attending (entity,session)
+        allocated = session_of[papers] >= 0
+        n_sessions, n_tracks = len(self.session_ids), len(self.track_ids)
+        keys = (entities[allocated]*n_sessions + session_of[papers[allocated]])*n_tracks + track_of[papers[allocated]]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=values[allocated], minlength=len(keys))
+
+        # sort by (entity,session) and decreasing sum, the first entry per (entity,session) is the best track
+        entity_sessions = keys // n_tracks
+        order = np.lexsort((-sums, entity_sessions))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = entity_sessions[order][1:] != entity_sessions[order][:-1]
+        best = order[first]
+        best = best[sums[best] - cost > 0]
+        return entity_sessions[best] // n_sessions, entity_sessions[best] % n_sessions, keys[best] % n_tracks, sums[best]
+
+
+    def score(self,
+              allocation,
+              return_attending=False):
+
+        '''
+        Scores an allocation {paper_id:(session_id,track_id)}. Returns an OrderedDict with the objective value,
+        its four terms (bidder utility, bidder cost, topic utility, topic cost), the attendance per
+        (session_id,track_id) and the constraint violations. If return_attending is True, the sets of (b,j,k) with
+        y_{b,j,k}==1 and (t,j,k) with q_{t,j,k}==1 are added.
+        '''
+
+        session_of, track_of = self.allocation_arrays(allocation)
+        n_tracks = len(self.track_ids)
+
+        bidders, bidder_sessions, bidder_tracks, bidder_sums = self._best_tracks(self.bid_bidders, self.bid_papers, self.bid_values,
+                                                                                 session_of, track_of, self.bidder_cost)
+        topics, topic_sessions, topic_tracks, topic_sums = self._best_tracks(self.paper_topic_topics, self.paper_topic_papers, self.paper_topic_values,
+                                                                             session_of, track_of, self.topic_cost)
+
+        bidder_utility = bidder_sums.sum()
+        bidder_cost = self.bidder_cost*len(bidders)
+        topic_utility = topic_sums.sum()
+        topic_cost = self.topic_cost*len(topics)
+
+        attendance = np.bincount(bidder_sessions*n_tracks + bidder_tracks, minlength=len(self.session_ids)*n_tracks)
+        papers = np.bincount(session_of[session_of >= 0]*n_tracks + track_of[session_of >= 0], minlength=len(self.session_ids)*n_tracks)
+
+        result = OrderedDict()
+        result['Objective_Value'] = float(bidder_utility - bidder_cost + topic_utility - topic_cost)
+        result['Bidder_Utility'] = float(bidder_utility)
+        result['Bidder_Cost'] = float(bidder_cost)
+        result['Topic_Utility'] = float(topic_utility)
+        result['Topic_Cost'] = float(topic_cost)
+        result['Attendance'] = OrderedDict(((j,k), int(attendance[self.session_index[j]*n_tracks + self.track_index[k]]))
+                                           for j in self.session_ids for k in self.track_ids)
+        result['Violations'] = self.violations(session_of, track_of, papers)
+        result['Feasible'] = not any(result['Violations'].values())
+        if return_attending:
+            result['Bidder_Attending'] = set(zip([self.bidder_ids[b] for b in bidders],
+                                                 [self.session_ids[j] for j in bidder_sessions],
+                                                 [self.track_ids[k] for k in bidder_tracks]))
+            result['Topic_Attending'] = set(zip([self.topic_ids[t] for t in topics],
+                                                [self.session_ids[j] for j in topic_sessions],
+                                                [self.track_ids[k] for k in topic_tracks]))
+        return result
+
+
+    def violations(self, session_of, track_of, papers):
+        # violated constraints of Section 3.2.2 (capacity, time conflicts and author single-track rule)
+        n_tracks = len(self.track_ids)
+        allocated = session_of >= 0
+        violations = OrderedDict()
+        violations['Unallocated_Papers'] = [self.paper_ids[i] for i in np.nonzero(~allocated)[0]]
+
+        if self.paper_distribution == 'exact':
+            violated = np.nonzero(papers != self.track_session_capacity)[0]
+        else:
+            violated = np.nonzero(papers > self.track_session_capacity)[0]
+        violations['Capacity'] = [(self.session_ids[s // n_tracks], self.track_ids[s % n_tracks], int(papers[s])) for s in violated]
+
+        conflicts = np.nonzero(allocated)[0]
+        conflicts = conflicts[self.forbidden[conflicts, session_of[conflicts]]]
+        violations['Time_Conflicts'] = [(self.paper_ids[i], self.session_ids[session_of[i]]) for i in conflicts]
+
+        # (author,session) with papers in more than one track
+        authored = allocated[self.paper_author_papers]
+        keys = np.unique((self.paper_author_authors[authored]*len(self.session_ids) + session_of[self.paper_author_papers[authored]])*n_tracks
+                         + track_of[self.paper_author_papers[authored]])
+        author_sessions, n_used_tracks = np.unique(keys // n_tracks, return_counts=True)
+        violations['Author_Conflicts'] = [(self.author_ids[a // len(self.session_ids)], self.session_ids[a % len(self.session_ids)])
+                                          for a in author_sessions[n_used_tracks > 1]]
+        return violations
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed on-disk cache of solved schedules, keyed by a stable hash of the instance and the parameters.
+
+@author: jakob
+"""
+
+
+# Libs
+from collections import OrderedDict
+from contextlib import contextmanager
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zipfile
+
+# own modules
+from schedule_result import ScheduleResult
+from checkpoint import write_json_atomic
+
+# components of the key of an entry, an entry with the same ids and parameters is a near hit
+DATA_COMPONENTS = ['U', 'M', 'T', 'Q']
+# QIP parameters which do not change the schedule
+IGNORED_QIP_PARAMETERS = ['log_output', 'checkpoint', 'resume']
+# a lock file older than this (in seconds) was left by a killed run
+STALE_LOCK_SECONDS = 60
+
+
+# %%
+def _sorted(items):
+    # ids of an instance are all integers or all strings, otherwise sort by repr
+    try:
+        return sorted(items)
+    except TypeError:
+        return sorted(items, key=repr)
+
+
+def stable_hash(value):
+    # sha256 of the JSON of value, dicts are hashed as sorted lists of items, i.e., independent of the insertion order
+    if isinstance(value, dict):
+        value = _sorted(value.items())
+    data = json.dumps(value, separators=(',', ':'), sort_keys=True, default=lambda v: v.item() if hasattr(v, 'item') else repr(v))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class SolveCache:
+
+    '''
+    This implements the class SolveCache.
+    Schedules are stored in the folder path as ScheduleResult (.npz) with their solve details. An entry is keyed by the
+    hash of its components, i.e., the hashes of the id lists ('ids'), of the costs, capacity, model options and QIP
+    parameters ('parameters') and of U, M, T and Q. A lookup is a hit if all components are equal and a near hit if
+    only (some of) U, M, T and Q differ, then the most recently used such entry is returned. The least recently used
+    entries are evicted if the entries exceed max_size_mb. The entries and the hit/miss statistics are kept in
+    index.json. Each lookup and store holds the lock file index.json.lock while it reads, changes and writes the index
+    and entry files are written to a temporary file and renamed, i.e., several runs can share the cache.
+    '''
+
+    def __init__(self,
+                 path,
+                 max_size_mb=500):
+
+        self.path = path
+        self.max_size_mb = max_size_mb
+        os.makedirs(self.path, exist_ok=True)
+        self.index_path = os.path.join(self.path, 'index.json')
+        self.lock_path = self.index_path + '.lock'
+        self._load_index()
+        self.statistics = OrderedDict((name, 0) for name in self.index['Statistics']) # of this run
+
+
+    @staticmethod
+    def key(components):
+        return stable_hash(list(components.items()))
+
+
+    def _entry_file(self, key):
+        return os.path.join(self.path, key+'.npz')
+
+
+    def _count(self, name):
+        self.statistics[name] += 1
+        self.index['Statistics'][name] += 1
+
+
+    def _load_index(self):
+        # reloaded before each lookup and store, since other runs may use the same cache
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f, object_pairs_hook=OrderedDict)
+        else:
+            self.index = OrderedDict([('Entries', OrderedDict()),
+                                      ('Statistics', OrderedDict([('Hits', 0), ('Near_Hits', 0), ('Misses', 0), ('Evictions', 0)]))])
+
+
+    def _save_index(self):
+        write_json_atomic(self.index_path, self.index)
+
+
+    @contextmanager
+    def _locked(self):
+        # exclusive lock of the index (portable: creating the lock file fails if it exists)
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > STALE_LOCK_SECONDS:
+                        os.remove(self.lock_path)
+                except OSError:
+                    # released in the meantime
+                    pass
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.remove(self.lock_path)
+
+
+    def get(self, components):
+
+        '''
+        Looks up the entry of components {name: hash}. Returns the lookup ('hit', 'near_hit' or 'miss'), the
+        ScheduleResult and solve details of the entry (None if miss) and the names of the components which differ.
+        '''
+
+        with self._locked():
+            self._load_index()
+            entries = self.index['Entries']
+            key = self.key(components)
+            lookup, changed = 'miss', []
+            if key in entries:
+                lookup = 'hit'
+            else:
+                similar = [k for k, entry in entries.items() if all(entry['Components'][name] == components[name] for name in components if name not in DATA_COMPONENTS)]
+                if similar:
+                    key = max(similar, key=lambda k: entries[k]['Last_Access'])
+                    lookup = 'near_hit'
+                    changed = [name for name in DATA_COMPONENTS if entries[key]['Components'][name] != components[name]]
+
+            result, details = None, None
+            if lookup != 'miss':
+                try:
+                    result = ScheduleResult.load(self._entry_file(key))
+                    details = entries[key]['Solve_Details']
+                    entries[key]['Last_Access'] = time.time()
+                except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+                    # entry file was deleted or is unreadable
+                    entries.pop(key)
+                    if os.path.exists(self._entry_file(key)):
+                        os.remove(self._entry_file(key))
+                    result, details = None, None
+                    lookup, changed = 'miss', []
+            self._count({'hit': 'Hits', 'near_hit': 'Near_Hits', 'miss': 'Misses'}[lookup])
+            self._save_index()
+        return lookup, result, details, changed
+
+
+    def put(self, components, result, details):
+        # store the schedule and evict least recently used entries (except the new one) if the cache is too large
+        key = self.key(components)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                result.save(f)
+            with self._locked():
+                self._load_index()
+                os.replace(tmp_path, self._entry_file(key))
+                self.index['Entries'][key] = OrderedDict([('Components', components),
+                                                          ('Solve_Details', details),
+                                                          ('Size', os.path.getsize(self._entry_file(key))),
+                                                          ('Last_Access', time.time())])
+                entries = self.index['Entries']
+                # entry files which are not in the index, e.g., of a run killed between the rename and the index update
+                for orphan in glob.glob(os.path.join(self.path, '*.npz')):
+                    if os.path.basename(orphan)[:-len('.npz')] not in entries:
+                        os.remove(orphan)
+                while self.size_mb() > self.max_size_mb and len(entries) > 1:
+                    lru = min((k for k in entries if k != key), key=lambda k: entries[k]['Last_Access'])
+                    entries.pop(lru)
+                    if os.path.exists(self._entry_file(lru)):
+                        os.remove(self._entry_file(lru))
+                    self._count('Evictions')
+                self._save_index()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+    def size_mb(self):
+        return sum(entry['Size'] for entry in self.index['Entries'].values())/2**20
+
+
+    def log_statistics(self):
+        total = self.index['Statistics']
+        logging.info(f'Solve cache {self.path}: {len(self.index["Entries"])} entries, {round(self.size_mb(),2)}/{self.max_size_mb} MB')
+        logging.info(f'Solve cache this run: hits:{self.statistics["Hits"]} near hits:{self.statistics["Near_Hits"]} misses:{self.statistics["Misses"]} evictions:{self.statistics["Evictions"]}')
+        logging.info(f'Solve cache total: hits:{total["Hits"]} near hits:{total["Near_Hits"]} misses:{total["Misses"]} evictions:{total["Evictions"]}')
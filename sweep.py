@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Parameter sweep over bidder_cost, topic_cost and topic_utility on a QIP which is built only once.
+
+@author: jakob
+"""
+
+
+# Libs
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import pickle as pkl
+import os
+import time
+import pandas as pd
+
+# own modules
+from qip import QIP
+from portfolio import set_cplex_parameter
+
+
+# %%
+def snake_order(values):
+    # all combinations of the lists in values ordered such that consecutive combinations differ in a single value
+    if not values:
+        return [()]
+    rest = snake_order(values[1:])
+    return [(value,)+point for i, value in enumerate(values[0]) for point in (rest if i % 2 == 0 else rest[::-1])]
+
+
+def sweep_worker(worker, QIP_kwargs, points, threads=None):
+    # build the QIP once and solve it for each (bidder_cost,topic_cost,topic_utility) in points, where only the
+    # objective coefficients are changed and each solve is warm-started from the solution of the previous point
+    bidder_cost, topic_cost, topic_utility = points[0]
+    QIP_instance = QIP(**dict(QIP_kwargs, bidder_cost=bidder_cost, topic_cost=topic_cost, topic_utility=topic_utility))
+    QIP_instance.build()
+    if threads is not None:
+        set_cplex_parameter(QIP_instance.QIP, 'threads', threads)
+
+    results = []
+    for bidder_cost, topic_cost, topic_utility in points:
+        QIP_instance.set_costs(bidder_cost=bidder_cost, topic_cost=topic_cost, topic_utility=topic_utility)
+        start = time.perf_counter()
+        try:
+            QIP_instance.solve()
+        except Exception as error: # e.g. no feasible solution within the time limit
+            logging.info(f'Sweep point {(bidder_cost, topic_cost, topic_utility)} failed: {error}')
+        solve_time = time.perf_counter() - start
+
+        details = QIP_instance.QIP.get_solve_details()
+        solved = bool(QIP_instance.allocation)
+        result = OrderedDict([('bidder_cost', bidder_cost),
+                              ('topic_cost', topic_cost),
+                              ('topic_utility', topic_utility)])
+        score = QIP_instance.score() if solved else {}
+        for key in ['Objective_Value', 'Bidder_Utility', 'Bidder_Cost', 'Topic_Utility', 'Topic_Cost']:
+            result[key] = score.get(key)
+        result['Attendance'] = sum(QIP_instance.attendance.values()) if solved else None
+        result['Status'] = details.status if details is not None else None
+        result['Relative_Gap'] = details.mip_relative_gap if details is not None and solved else None
+        result['Solve_Time'] = solve_time
+        result['Warm_Start_Objective'] = QIP_instance.heuristic_details['Objective_Value'] if QIP_instance.heuristic_details else None
+        result['Worker'] = worker
+        result['Schedule'] = dict(QIP_instance.schedule) if solved else None
+        results.append(result)
+    return results
+
+
+# %%
+class ParameterSweep:
+
+    '''
+    This implements the class ParameterSweep.
+    It solves the QIP for every combination of the given bidder_costs, topic_costs and topic_utilities. The QIP is
+    built only once (per worker) and for each grid point only the objective coefficients are changed (see
+    QIP.set_costs). The grid points are solved in snake order, i.e., consecutive points differ in a single
+    parameter, and each solve is warm-started from the solution of the previous point. With n_workers>1 the snake
+    order is split into contiguous chunks which are solved in parallel worker processes (the cores are split evenly
+    among the workers). All other arguments are passed to the class QIP, missing parameter lists default to the
+    value of the corresponding QIP argument.
+    .run() returns a table (pandas DataFrame) with the objective terms, attendance and solve time per grid point.
+    '''
+
+    def __init__(self,
+                 bidder_costs=None,
+                 topic_costs=None,
+                 topic_utilities=None,
+                 n_workers=1,
+                 **kwargs):
+
+        self.bidder_costs = bidder_costs if bidder_costs is not None else [kwargs['bidder_cost']]
+        self.topic_costs = topic_costs if topic_costs is not None else [kwargs['topic_cost']]
+        self.topic_utilities = topic_utilities if topic_utilities is not None else [kwargs['topic_utility']]
+        self.n_workers = n_workers
+        self.save_results = kwargs.get('save_results', False)
+        self.savefolder = kwargs.get('savefolder') or os.getcwd()
+        self.QIP_kwargs = dict(kwargs, save_results=False, savefolder=None, profiler=None, cache=None)
+        self.points = snake_order([self.bidder_costs, self.topic_costs, self.topic_utilities])
+        self.results = None # pandas DataFrame, index: (bidder_cost,topic_cost,topic_utility)
+        self.schedules = OrderedDict() # (bidder_cost,topic_cost,topic_utility) -> schedule
+
+
+    def run(self):
+        logging.info('')
+        logging.info('PARAMETER SWEEP')
+        logging.info(f'{len(self.points)} grid points | bidder_costs:{self.bidder_costs} | topic_costs:{self.topic_costs} | topic_utilities:{self.topic_utilities} | workers:{self.n_workers}')
+
+        start = time.perf_counter()
+        n_workers = max(1, min(self.n_workers, len(self.points)))
+        if n_workers == 1:
+            results = sweep_worker(0, self.QIP_kwargs, self.points)
+        else:
+            chunk_size = -(-len(self.points) // n_workers)
+            chunks = [self.points[i:i+chunk_size] for i in range(0, len(self.points), chunk_size)]
+            threads = max(1, os.cpu_count() // len(chunks))
+            with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+                futures = [pool.submit(sweep_worker, worker, self.QIP_kwargs, chunk, threads) for worker, chunk in enumerate(chunks)]
+                results = [result for future in futures for result in future.result()]
+        sweep_time = time.perf_counter() - start
+
+        self.schedules = OrderedDict(((result['bidder_cost'], result['topic_cost'], result['topic_utility']), result.pop('Schedule')) for result in results)
+        self.results = pd.DataFrame(results).set_index(['bidder_cost', 'topic_cost', 'topic_utility']).sort_index()
+        logging.info(f'Parameter sweep finished in {round(sweep_time,2)} sec')
+        logging.info('\n'+self.results.to_string())
+
+        if self.save_results:
+            date_time = datetime.now().strftime("%d_%m_%Y_%H-%M-%S")
+            os.makedirs(self.savefolder, exist_ok=True)
+            self.results.to_csv(os.path.join(self.savefolder,'sweep_results_'+date_time+'.csv'))
+            pkl.dump(self.schedules, open(os.path.join(self.savefolder,'sweep_schedules_'+date_time+'.pkl'),'wb'))
+
+        return self.results
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the author conflict formulations ('presence' and 'compact' in QIP.add_author_constraints) on small synthetic
+instances with prolific authors: both accept exactly the schedules without author conflicts and have the same
+optimum. Run with: python -m pytest test_author_formulations.py
+
+@author: jakob
+"""
+
+import logging
+import random
+from collections import OrderedDict
+import pytest
+
+# own modules
+from create_random_instance import synthetic_instance
+from verify_author_formulations import build, is_feasible, random_allocation, track_session_capacity
+
+SEEDS = [1, 2, 3]
+
+
+@pytest.fixture(params=SEEDS)
+def data(request):
+    logging.disable(logging.INFO)
+    data = synthetic_instance(n_sessions=2, n_tracks=2, track_session_capacity=track_session_capacity, n_bidders=4,
+                              n_authors=4, n_topics=3, seed=request.param)
+    data['T'] = {}
+    data['greedy'] = OrderedDict(data['allocation'])
+    data['seed'] = request.param
+    yield data
+    logging.disable(logging.NOTSET)
+
+
+def test_same_feasible_schedules(data):
+    presence, compact = build(data, 'presence'), build(data, 'compact')
+    scorer = presence.get_scorer()
+    rng = random.Random(data['seed'])
+    n_feasible = 0
+    for _ in range(200):
+        allocation = random_allocation(data, rng)
+        feasible = not scorer.score(allocation)['Violations']['Author_Conflicts']
+        n_feasible += feasible
+        assert is_feasible(presence, allocation) == feasible
+        assert is_feasible(compact, allocation) == feasible
+    # both sides of the equivalence are checked
+    assert 0 < n_feasible < 200
+
+
+def test_same_optimum(data):
+    presence, compact = build(data, 'presence'), build(data, 'compact')
+    presence.solve()
+    compact.solve()
+    for QIP_instance in [presence, compact]:
+        assert 'optimal' in QIP_instance.QIP.get_solve_details().status
+    assert presence.QIP.objective_value == pytest.approx(compact.QIP.objective_value, abs=1e-6)
+    assert is_feasible(compact, presence.allocation)
+    assert is_feasible(presence, compact.allocation)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Verification of the author conflict formulations ('presence' and 'compact' in QIP.add_author_constraints): on synthetic
+instances with prolific authors (feasible by construction), both formulations must accept exactly the same schedules, i.e., the schedules
+without author conflicts (as reported by the ScheduleScorer), the schedule solved with one formulation must be
+feasible in the other and both must have the same optimal objective value (if both are solved to optimality).
+Exits with code 1 if a difference is found.
+
+@author: jakob
+"""
+
+import logging
+import random
+import sys
+from collections import OrderedDict
+import pandas as pd
+
+# own modules
+from qip import QIP
+from create_random_instance import synthetic_instance
+from heuristics import greedy_allocation
+
+# %%  Set Input Parameters
+
+track_session_capacity = 2
+# (sessions, tracks, bidders, authors, topics), few authors, i.e., many authors with 2 or more papers
+sizes = [(2, 4, 3, 10, 3), (2, 4, 3, 12, 3), (2, 4, 3, 14, 3)]
+seeds = [1, 2, 3]
+n_allocations = 200 # random schedules checked per instance
+solve = True # also compare the optimal objective values
+
+QIP_parameters = {'log_output': False,
+                  'time_limit': 30, # in seconds
+                  'mip_relative_gap': 0.0,
+                  'integrality_tol': None,
+                  'feasibility_tol': None,
+                  }
+
+# %% Verification
+
+def build(data, author_formulation):
+    QIP_instance = QIP(session_ids=data['session_ids'],
+                       track_ids=data['track_ids'],
+                       paper_ids=data['paper_ids'],
+                       bidder_ids=data['bidder_ids'],
+                       author_ids=data['author_ids'],
+                       topic_ids=data['topic_ids'],
+                       track_session_capacity=track_session_capacity,
+                       paper_distribution='exact',
+                       U=data['U'],
+                       M=data['M'],
+                       T=data['T'],
+                       Q=data['Q'],
+                       bidder_cost=5,
+                       topic_cost=25,
+                       topic_utility=100,
+                       QIP_parameters=QIP_parameters,
+                       save_results=False,
+                       author_formulation=author_formulation)
+    QIP_instance.build()
+    return QIP_instance
+
+
+def is_feasible(QIP_instance, allocation):
+    # the schedule with y=q=0 and the implied z satisfies all constraints of the model (only author constraints can fail)
+    values = {QIP_instance.x[(p, j, k)]: 1 for p, (j,k) in allocation.items()}
+    for a,p in QIP_instance.M.keys():
+        key = (a,)+allocation[p]
+        if key in QIP_instance.z:
+            values[QIP_instance.z[key]] = 1
+    solution = QIP_instance.QIP.new_solution(values)
+    return len(solution.find_unsatisfied_constraints(QIP_instance.QIP)) == 0
+
+
+def solve_objective(QIP_instance):
+    # objective value (None if no solution, e.g. infeasible) and solve status
+    try:
+        QIP_instance.solve()
+    except Exception:
+        return None, str(QIP_instance.QIP.get_solve_status())
+    return round(QIP_instance.QIP.objective_value, 6), QIP_instance.QIP.get_solve_details().status
+
+
+def random_allocation(data, rng):
+    # half of the schedules are random, half are the greedy (or hidden) schedule with two papers swapped
+    subsessions = [(j,k) for j in data['session_ids'] for k in data['track_ids'] for _ in range(track_session_capacity)]
+    if rng.random() < 0.5:
+        allocation = OrderedDict(data['greedy'])
+        p, q = rng.sample(data['paper_ids'], 2)
+        allocation[p], allocation[q] = allocation[q], allocation[p]
+        return allocation
+    rng.shuffle(subsessions)
+    return OrderedDict(zip(data['paper_ids'], subsessions))
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    results = []
+    for (n_sessions, n_tracks, n_bidders, n_authors, n_topics), seed in [(size, seed) for size in sizes for seed in seeds]:
+        data = synthetic_instance(n_sessions=n_sessions, n_tracks=n_tracks, track_session_capacity=track_session_capacity,
+                                  n_bidders=n_bidders, n_authors=n_authors, n_topics=n_topics, seed=seed)
+        data['T'] = {} # time conflicts are not part of the comparison
+        data['greedy'] = greedy_allocation(session_ids=data['session_ids'], track_ids=data['track_ids'], paper_ids=data['paper_ids'],
+                                           track_session_capacity=track_session_capacity, U=data['U'], M=data['M'], T=data['T'], Q=data['Q'],
+                                           bidder_cost=5, topic_cost=25, topic_utility=100) or OrderedDict(data['allocation'])
+        presence, compact = build(data, 'presence'), build(data, 'compact')
+        scorer = presence.get_scorer()
+
+        rng = random.Random(seed)
+        n_feasible, n_mismatches = 0, 0
+        for _ in range(n_allocations):
+            allocation = random_allocation(data, rng)
+            feasible = not scorer.score(allocation)['Violations']['Author_Conflicts']
+            n_feasible += feasible
+            n_mismatches += not (is_feasible(presence, allocation) == is_feasible(compact, allocation) == feasible)
+
+        result = OrderedDict([('Papers', len(data['paper_ids'])),
+                              ('Authors', n_authors),
+                              ('Seed', seed),
+                              ('Author_Rows_Presence', presence.constraint_counts['author']),
+                              ('Author_Rows_Compact', compact.constraint_counts['author']),
+                              ('Z_Presence', len(presence.z)),
+                              ('Z_Compact', len(compact.z)),
+                              ('Schedules', n_allocations),
+                              ('Author_Feasible', n_feasible),
+                              ('Mismatches', n_mismatches)])
+        if solve:
+            result['Objective_Presence'], result['Status_Presence'] = solve_objective(presence)
+            result['Objective_Compact'], result['Status_Compact'] = solve_objective(compact)
+            if 'optimal' in result['Status_Presence'] and 'optimal' in result['Status_Compact']:
+                result['Mismatches'] += result['Objective_Presence'] != result['Objective_Compact']
+            result['Mismatches'] += bool(presence.allocation) and not is_feasible(compact, presence.allocation)
+            result['Mismatches'] += bool(compact.allocation) and not is_feasible(presence, compact.allocation)
+            result['Mismatches'] += 'INFEASIBLE' in result['Status_Presence'] and bool(compact.allocation)
+            result['Mismatches'] += 'INFEASIBLE' in result['Status_Compact'] and bool(presence.allocation)
+        results.append(result)
+
+    logging.disable(logging.NOTSET)
+    df = pd.DataFrame(results)
+    print(df.to_string())
+    if df['Mismatches'].sum() > 0:
+        print('AUTHOR FORMULATIONS DIFFER')
+        sys.exit(1)
+    print('AUTHOR FORMULATIONS AGREE')
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Verification of the bid scaling of ingest.py: small CSV exports are ingested with each bid scaling and the bids in U
+are compared with the expected values, in particular the smallest bid of the file must be kept in U (scaled to
+min_bid) if no bid_range is given and bids at the lower end of bid_range must be dropped.
+Exits with code 1 if a difference is found.
+
+@author: jakob
+"""
+
+import logging
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+import pandas as pd
+
+# own modules
+from ingest import CSVIngest
+from instance_io import load_instance, load_arrays
+
+# %%  Set Input Parameters
+
+# (bidder, paper, bid) with bids on a 1-5 scale
+bids = [('B1', 'P1', 1), ('B1', 'P2', 3), ('B1', 'P3', 5), ('B2', 'P1', 2), ('B2', 'P2', 1)]
+# case: (CSVIngest arguments, expected U {(bidder, paper): bid})
+cases = OrderedDict([('global', ({}, {('B1','P1'): 1, ('B1','P2'): 50.5, ('B1','P3'): 100, ('B2','P1'): 25.75, ('B2','P2'): 1})),
+                     ('global min_bid=10', ({'min_bid': 10}, {('B1','P1'): 10, ('B1','P2'): 55, ('B1','P3'): 100, ('B2','P1'): 32.5, ('B2','P2'): 10})),
+                     ('bid_range=(1,5)', ({'bid_range': (1, 5)}, {('B1','P2'): 50, ('B1','P3'): 100, ('B2','P1'): 25})),
+                     ('bid_range=(0,5)', ({'bid_range': (0, 5)}, {('B1','P1'): 20, ('B1','P2'): 60, ('B1','P3'): 100, ('B2','P1'): 40, ('B2','P2'): 20})),
+                     ('bidder', ({'bid_scaling': 'bidder'}, {('B1','P1'): 1, ('B1','P2'): 50.5, ('B1','P3'): 100, ('B2','P1'): 100, ('B2','P2'): 100/25.75}))])
+
+# %% Verification
+
+def write_exports(folder):
+    papers = sorted(set(p for _, p, _ in bids))
+    pd.DataFrame({'paper': papers, 'title': [f'Title {p}' for p in papers]}).to_csv(os.path.join(folder, 'papers.csv'), index=False)
+    pd.DataFrame(bids, columns=['bidder', 'paper', 'bid']).to_csv(os.path.join(folder, 'bids.csv'), index=False)
+    pd.DataFrame([(p, 'A1') for p in papers], columns=['paper', 'author']).to_csv(os.path.join(folder, 'authors.csv'), index=False)
+
+
+def ingest_U(folder, kwargs):
+    # U of the ingested bundle with the external bidder and paper ids
+    path = os.path.join(folder, 'instance.npz')
+    CSVIngest(papers_path=os.path.join(folder, 'papers.csv'),
+              bids_path=os.path.join(folder, 'bids.csv'),
+              authors_path=os.path.join(folder, 'authors.csv'),
+              session_ids=[1, 2],
+              track_ids=[1, 2],
+              **kwargs).run(path)
+    instance, arrays = load_instance(path), load_arrays(path)
+    bidders, papers = arrays['bidder_external'].tolist(), arrays['paper_external'].tolist()
+    return {(bidders[b-1], papers[p-1]): u for (b,p), u in instance['U'].items()}
+
+
+if __name__ == '__main__':
+    logging.disable(logging.INFO)
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        write_exports(folder)
+        for case, (kwargs, expected) in cases.items():
+            U = ingest_U(folder, kwargs)
+            n_mismatches = int(U.keys() != expected.keys()) + sum(abs(U[key]-expected[key]) > 1e-9 for key in U.keys() & expected.keys())
+            results.append(OrderedDict([('Case', case),
+                                        ('Bids', len(bids)),
+                                        ('U', len(U)),
+                                        ('Smallest_U', min(U.values())),
+                                        ('Mismatches', n_mismatches)]))
+
+    logging.disable(logging.NOTSET)
+    df = pd.DataFrame(results)
+    print(df.to_string())
+    if df['Mismatches'].sum() > 0:
+        print('BID SCALING DIFFERS')
+        sys.exit(1)
+    print('BID SCALING AS EXPECTED')